@@ -8,13 +8,19 @@ import subprocess
 import tkinter as tk
 from tkinter import filedialog, messagebox
 
+LANGUAGE = "bg"
+# "auto" lets the server detect the language of each file
+LANGUAGES = ("bg", "en", "ru", "auto")
+
 server_process = None
 timer_running = False
 start_time = None
 
-def start_whisper_server():
+def start_whisper_server(language=LANGUAGE):
     """
     Start the CPU-only Whisper server in a separate process.
+    `language` is only the server default: every request sends the
+    language picked in the window.
     Returns the process object.
     """
     if getattr(sys, 'frozen', False):
@@ -43,7 +49,7 @@ def start_whisper_server():
         "-m", model_path,
         "--convert",
         "-t", "24",
-        "-l", "bg"
+        "-l", language
     ]
     cmd.extend(extra_args)
 
@@ -67,16 +73,18 @@ def restart_whisper_server(*args):
 
     server_process = start_whisper_server()
 
-def transcribe_audio(audio_path, model_path="ggml-large-v3-turbo-q8_0.bin", host="127.0.0.1", port=8080):
+def transcribe_audio(audio_path, model_path="ggml-large-v3-turbo-q8_0.bin", host="127.0.0.1", port=8080,
+                     language=LANGUAGE):
     """
-    Send an audio file to the Whisper server for transcription.
+    Send an audio file to the Whisper server for transcription in
+    `language` ("auto" lets the server detect it).
     """
     url = f"http://{host}:{port}/inference"
     with open(audio_path, 'rb') as audio_file:
         files = {
             "file": audio_file,
             "model": (None, model_path),
-            "language": (None, "bg")
+            "language": (None, language)
         }
         response = requests.post(url, files=files)
     if response.status_code == 200:
@@ -131,14 +139,14 @@ def update_timer():
         transcription_text.insert(tk.END, timer_text + remaining_text)
         app.after(1000, update_timer)
 
-def transcription_worker(audio_path):
+def transcription_worker(audio_path, language):
     """
     Worker function to run in a separate thread.
     Calls the transcription service, then stops the timer and updates the GUI.
     """
     global timer_running
     try:
-        result = transcribe_audio(audio_path)
+        result = transcribe_audio(audio_path, language=language)
         text = result.get("text", "No transcription available.")
     except Exception as e:
         text = f"Error: {e}"
@@ -178,7 +186,7 @@ def start_transcription():
     app.after(1000, update_timer)
 
     # Start transcription on a separate thread.
-    thread = threading.Thread(target=transcription_worker, args=(audio_path,))
+    thread = threading.Thread(target=transcription_worker, args=(audio_path, language_var.get()))
     thread.daemon = True
     thread.start()
 
@@ -224,6 +232,14 @@ browse_btn.pack(side=tk.LEFT, padx=5)
 transcribe_btn = tk.Button(top_frame, text="Transcribe", bg=button_bg, fg=dark_fg, activebackground=button_hover_bg, command=start_transcription)
 transcribe_btn.pack(side=tk.LEFT, padx=5)
 
+language_label = tk.Label(top_frame, text="Language:", fg=dark_fg, bg=dark_bg)
+language_label.pack(side=tk.LEFT, padx=5)
+
+language_var = tk.StringVar(value=LANGUAGE)
+language_menu = tk.OptionMenu(top_frame, language_var, *LANGUAGES)
+language_menu.config(bg=button_bg, fg=dark_fg, activebackground=button_hover_bg, highlightthickness=0)
+language_menu.pack(side=tk.LEFT, padx=5)
+
 save_btn = tk.Button(top_frame, text="Save Output", bg=button_bg, fg=dark_fg, activebackground=button_hover_bg, command=save_output)
 save_btn.pack(side=tk.LEFT, padx=5)
 
@@ -1,97 +1,163 @@
 import os
-import sys
 import time
-import requests
+import queue
 import threading
 import webbrowser
-import subprocess
 import tkinter as tk
 from tkinter import filedialog, messagebox
 
-server_process = None
+import metrics
+import startup
+from whisper_server import DEFAULT_LANGUAGE, DEFAULT_MODEL, cache_params, transcribe_audio
+from server_pool import HYBRID, HybridPool, ServerPool, hybrid_pool, whisper_launchers
+from autotune import load_settings, pool_options
+from chunked_transcription import transcribe_long_audio
+from transcript_cache import TranscriptCache
+from transcript_writers import open_writer, segments_from_result
+from transcript_view import TranscriptView
+from language_routing import AUTO, LANGUAGES, detect_language
+from scheduler import INTERACTIVE
+
+startup.mark("imported")
+
+# Threads, server count and pinning from `python autotune.py` (or core-count defaults).
+# The servers are started once the window is up, or with
+# WHISPER_LAZY_START=1 only when the first transcription is requested.
+tuned_settings = load_settings("cpu")
+server_pool = ServerPool(whisper_launchers(), active="cpu", **pool_options(tuned_settings))
+LAZY_START = os.environ.get("WHISPER_LAZY_START") == "1"
+servers_started = False
+transcript_cache = TranscriptCache()
 timer_running = False
 start_time = None
-
-def start_whisper_server(device="cpu"):
+live_transcriber = None
+job_progress = ""
+last_result = None
+
+# Worker threads never touch Tk: they queue (kind, value) updates that
+# drain_ui_updates() applies on the Tk thread
+ui_updates = queue.Queue()
+UI_UPDATES_PER_TICK = 200
+
+# With WHISPER_JOB_SERVICE=http://host:8000 set, files are submitted to a
+# shared job_service.py instance instead of servers started by this window.
+JOB_SERVICE_URL = os.environ.get("WHISPER_JOB_SERVICE")
+job_client = None
+if JOB_SERVICE_URL:
+    from job_service import JobClient
+    job_client = JobClient(JOB_SERVICE_URL)
+
+# WHISPER_METRICS_PORT=9100 serves Prometheus metrics from this window;
+# STT_JSON_LOG=<path> appends per-stage timings as JSON lines.
+metrics.configure_json_log()
+if os.environ.get("WHISPER_METRICS_PORT"):
+    metrics.start_metrics_server(int(os.environ["WHISPER_METRICS_PORT"]))
+
+def start_servers():
     """
-    Start the Whisper server in a separate process (CPU or GPU).
-    Returns the process object.
+    Start the server pool with the selected device and worker count, once.
+    Returns at once; the models load in the background.
     """
-    if getattr(sys, 'frozen', False):
-        base_path = os.path.dirname(sys.executable)
-    else:
-        base_path = os.path.dirname(os.path.abspath(__file__))
-
-    internal_path = os.path.join(base_path, "_internal")
-    if os.path.exists(internal_path):
-        base_path = internal_path
-
-    ffmpeg_path = os.path.join(internal_path, "ffmpeg", "bin")
-    os.environ["PATH"] += os.pathsep + ffmpeg_path
-
-    if device == "gpu":
-        exe_name = "whisper-server-gpu.exe"
-        build_folder = "build_gpu"
-        extra_args = ["--ov-e-device", "CUDA"]
+    global servers_started, server_pool
+    if servers_started or job_client is not None:
+        return
+    servers_started = True
+    if device_var.get() == HYBRID:
+        server_pool = hybrid_pool(dict(pool_options(tuned_settings), size=get_worker_count()))
     else:
-        exe_name = "whisper-server-cpu.exe"
-        build_folder = "build_cpu"
-        extra_args = []
-
-    server_exe = os.path.join(base_path, "Release", build_folder, exe_name)
-    model_path = os.path.join(base_path, "Release", build_folder, "models", "ggml-large-v3-turbo-q8_0.bin")
-
-    cmd = [
-        server_exe,
-        "--host", "127.0.0.1",
-        "--port", "8080",
-        "-m", model_path,
-        "--convert",
-        "-t", "24",
-        "-l", "bg"
-    ]
+        server_pool.active = device_var.get()
+        server_pool.size = get_worker_count()
+    server_pool.start()
 
-    cmd.extend(extra_args)
+def restart_whisper_server(*args):
+    """
+    Route new work to the selected device (cpu/gpu). The pool promotes its
+    warm standby server for that device instead of cold-starting one.
+    Switching to or from CPU+GPU replaces the servers, so it waits until
+    no transcription is running. Before the servers are started the
+    choice is simply used at start.
+    """
+    global servers_started, server_pool
+    if not servers_started:
+        return
+    device = device_var.get()
+    hybrid = isinstance(server_pool, HybridPool)
+    if not hybrid and device != HYBRID:
+        server_pool.switch(device)
+        return
+    if hybrid == (device == HYBRID):
+        return
+    if timer_running or live_transcriber is not None:
+        messagebox.showerror("Error", "Wait for the running transcription to finish before changing devices.")
+        device_var.set(HYBRID if hybrid else server_pool.active)
+        return
+    server_pool.stop()
+    server_pool = ServerPool(whisper_launchers(), active="cpu", **pool_options(tuned_settings))
+    servers_started = False
+    start_servers()
 
-    creation_flags = 0
-    if sys.platform.startswith("win"):
-        creation_flags = subprocess.CREATE_NO_WINDOW
+def resize_server_pool(*args):
+    """
+    Apply the number of parallel workers selected in the spinbox.
+    """
+    if servers_started:
+        server_pool.resize(get_worker_count())
 
-    return subprocess.Popen(cmd, creationflags=creation_flags)
+def get_worker_count():
+    """
+    Read the number of parallel server workers from the spinbox.
+    """
+    try:
+        return max(1, int(workers_var.get()))
+    except (tk.TclError, ValueError):
+        return 1
 
-def restart_whisper_server(*args):
+def readiness():
     """
-    Terminate existing server (if any) and start a new one
-    with the selected device (cpu/gpu).
+    (text, colour) for the readiness indicator.
     """
-    global server_process
-    device = device_var.get()
+    if job_client is not None:
+        return f"Job service {JOB_SERVICE_URL}", "#4caf50"
+    if not servers_started:
+        return "Servers start on first use", "#bbbbbb"
+    if isinstance(server_pool, HybridPool):
+        ready = {backend.name.upper(): backend.ready_count() for backend in server_pool.backends}
+        if any(ready.values()):
+            return "Ready: " + ", ".join(f"{count} {name}" for name, count in ready.items()), "#4caf50"
+        return "Loading models on CPU and GPU...", "#ff9800"
+    counts = server_pool.occupancy()
+    ready = counts.get("active_ready", 0) + counts.get("active_busy", 0)
+    device = server_pool.active.upper()
+    if ready:
+        return f"Ready: {ready}/{server_pool.size} {device}", "#4caf50"
+    if counts.get("active_failed", 0) and counts.get("active_failed", 0) == sum(
+            count for key, count in counts.items() if key.startswith("active_")):
+        return f"{device} servers failed to start", "#f44336"
+    return f"Loading model on {device}...", "#ff9800"
+
+def update_readiness():
+    """
+    Refresh the readiness indicator twice a second.
+    """
+    text, colour = readiness()
+    ready_var.set(text)
+    ready_label.config(fg=colour)
+    if text.startswith(("Ready", "Job service")) and startup.mark("ready"):
+        app.destroy()
+        return
+    app.after(500, update_readiness)
 
-    if server_process is not None:
-        try:
-            server_process.terminate()
-        except Exception:
-            pass
-        server_process = None
-
-    server_process = start_whisper_server(device=device)
-
-def transcribe_audio(audio_path, model_path="ggml-large-v3-turbo-q8_0.bin", host="127.0.0.1", port=8080):
-    """
-    Send an audio file to the Whisper server for transcription.
-    """
-    url = f"http://{host}:{port}/inference"
-    with open(audio_path, 'rb') as audio_file:
-        files = {
-            "file": audio_file,
-            "model": (None, model_path),
-            "language": (None, "bg")
-        }
-        response = requests.post(url, files=files)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise RuntimeError(f"Server error: {response.status_code}, {response.text}")
+def on_window_shown():
+    """
+    Runs once the window is drawn: start the servers unless they are
+    started lazily.
+    """
+    if startup.mark("window"):
+        app.destroy()
+        return
+    if not LAZY_START:
+        start_servers()
+    update_readiness()
 
 def select_audio_file():
     """
@@ -110,66 +176,137 @@ def save_output():
     """
     file_path = filedialog.asksaveasfilename(
         defaultextension=".txt",
-        filetypes=[("Text Files", "*.txt")]
+        filetypes=[
+            ("Text Files", "*.txt"),
+            ("SubRip Subtitles", "*.srt"),
+            ("WebVTT Subtitles", "*.vtt"),
+            ("JSON Lines (segments)", "*.jsonl"),
+            ("Tab-separated (segments)", "*.tsv"),
+        ]
     )
     if file_path:
-        text = transcription_text.get("1.0", tk.END)
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(text)
+            if file_path.lower().endswith(".txt"):
+                text = transcript_view.text()
+                with open(file_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+            elif last_result is None:
+                messagebox.showerror("Error", "Timestamped formats need a finished file transcription.")
+                return
+            else:
+                with open_writer(file_path) as writer:
+                    writer.write_all(segments_from_result(last_result))
             messagebox.showinfo("Success", "Output saved successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"Could not save file:\n{e}")
 
+def format_elapsed(seconds):
+    hrs, rem = divmod(seconds, 3600)
+    mins, secs = divmod(rem, 60)
+    return f"{int(hrs):02d}:{int(mins):02d}:{int(secs):02d}"
+
 def update_timer():
     """
-    Update the elapsed time (HH:MM:SS) in the transcription text widget.
+    Show the elapsed time (HH:MM:SS) in the status line.
     This function will schedule itself every 1 second if timer_running is True.
     """
     if timer_running:
-        elapsed = time.time() - start_time
-        hrs, rem = divmod(elapsed, 3600)
-        mins, secs = divmod(rem, 60)
-        timer_text = f"Inference Duration: {int(hrs):02d}:{int(mins):02d}:{int(secs):02d}\n"
-        current_text = transcription_text.get("1.0", tk.END).split("\n", 1)
-        if len(current_text) > 1:
-            new_text = timer_text + current_text[1]
-        else:
-            new_text = timer_text
-        transcription_text.delete("1.0", tk.END)
-        transcription_text.insert(tk.END, new_text)
+        status_var.set(f"Inference Duration: {format_elapsed(time.time() - start_time)}{job_progress}")
         app.after(1000, update_timer)
 
-def transcription_worker(audio_path):
+def report_progress(done, total):
+    """
+    Show segment progress next to the timer.
+    """
+    global job_progress
+    job_progress = f"  (segment {done}/{total})" if total else ""
+
+def report_job_progress(status):
+    """
+    Show the job service's segment progress next to the timer.
+    """
+    global job_progress
+    if status["status"] == "queued":
+        job_progress = "  (queued)"
+    else:
+        report_progress(status["done"], status["total"])
+
+def queue_segments(segments):
+    for segment in segments_from_result({"segments": segments}):
+        ui_updates.put(("append", segment.labelled_text()))
+
+def transcription_worker(audio_path, vad=False, diarize=False, language=DEFAULT_LANGUAGE):
     """
     Worker function to run in a separate thread.
-    It calls the transcribe_audio() function and then schedules
-    an update of the GUI with the transcription result.
+    Long files handled by several workers stream their segments to the
+    view as parts finish; otherwise the segments are queued once the
+    result arrives. language "auto" detects the spoken language first.
     """
-    global timer_running
+    global timer_running, job_progress, last_result
+    streamed = False
     try:
-        result = transcribe_audio(audio_path)
-        text = result.get("text", "No transcription available.")
+        params = cache_params(vad, diarize)
+        result = transcript_cache.get(audio_path, DEFAULT_MODEL, language, params)
+        if result is None and job_client is not None:
+            job_id = job_client.submit(audio_path, vad=vad, diarize=diarize, language=language, priority=INTERACTIVE)
+            status = job_client.wait(job_id, on_progress=report_job_progress)
+            if status["status"] != "done":
+                raise RuntimeError(status["error"] or f"job {status['status']}")
+            result = job_client.result(job_id)
+            transcript_cache.put(audio_path, DEFAULT_MODEL, language, result, params)
+        elif result is None:
+            server_pool.wait_ready()
+            if server_pool.size > 1:
+                streamed = True
+                result = transcribe_long_audio(audio_path, server_pool, vad=vad, diarize=diarize, language=language,
+                                               progress=report_progress, on_segments=queue_segments)
+            else:
+                spoken = detect_language(audio_path, server_pool)[0] if language == AUTO else language
+                with server_pool.worker() as worker:
+                    result = transcribe_audio(audio_path, port=worker.port, vad=vad, diarize=diarize, language=spoken)
+                result["language"] = spoken
+            transcript_cache.put(audio_path, DEFAULT_MODEL, language, result, params)
+        last_result = result
+        if not streamed:
+            for segment in segments_from_result(result):
+                ui_updates.put(("append", segment.labelled_text()))
+        if not result.get("text", "").strip():
+            ui_updates.put(("append", "No transcription available."))
+        outcome = None
     except Exception as e:
-        text = f"Error: {e}"
+        outcome = f"Error: {e}"
 
     timer_running = False
-    app.after(0, update_transcription_text, text)
+    job_progress = ""
+    ui_updates.put(("finished", outcome))
 
-def update_transcription_text(text):
+def drain_ui_updates():
     """
-    Update the transcription text widget with the provided text,
-    ensuring the timer line remains on the top.
+    Apply queued updates on the Tk thread, a bounded number per tick so a
+    burst of segments cannot freeze the window, then reschedule itself.
     """
-    current = transcription_text.get("1.0", tk.END)
-    lines = current.split("\n")
-    if lines and lines[0].startswith("Inference Duration:"):
-        timer_line = lines[0] + "\n"
-    else:
-        timer_line = ""
-    formatted_text = text.replace("\n", " ").strip()
-    transcription_text.delete("1.0", tk.END)
-    transcription_text.insert(tk.END, timer_line + formatted_text)
+    global live_transcriber
+    for _ in range(UI_UPDATES_PER_TICK):
+        try:
+            kind, value = ui_updates.get_nowait()
+        except queue.Empty:
+            break
+        if kind in ("append", "final"):
+            transcript_view.append(value)
+        elif kind == "partial":
+            transcript_view.set_partial(value)
+        elif kind == "live_error":
+            status_var.set(value)
+        elif kind == "finished":
+            status_var.set(value or f"Finished in {format_elapsed(time.time() - start_time)}")
+
+    if live_transcriber is not None and not live_transcriber.is_running() and ui_updates.empty():
+        if live_transcriber.error is None:
+            # After a failure the status bar keeps the reason
+            status_var.set("Live transcription stopped")
+        live_transcriber = None
+        live_button.config(text="Live")
+    app.after(100, drain_ui_updates)
 
 def start_transcription():
     """
@@ -181,18 +318,67 @@ def start_transcription():
         messagebox.showerror("Error", "Please select an audio file.")
         return
 
+    start_servers()
     start_time = time.time()
     timer_running = True
-    transcription_text.delete("1.0", tk.END)
-    transcription_text.insert(tk.END, "Inference Duration: 00:00:00\nTranscription in progress...")
+    transcript_view.clear()
+    status_var.set("Inference Duration: 00:00:00  Transcription in progress...")
 
     app.after(1000, update_timer)
 
     # Start the transcription in a new thread
-    thread = threading.Thread(target=transcription_worker, args=(audio_path,))
+    thread = threading.Thread(target=transcription_worker,
+                              args=(audio_path, vad_var.get(), diarize_var.get(), language_var.get()))
     thread.daemon = True
     thread.start()
 
+def toggle_live_transcription():
+    """
+    Start or stop live transcription. A file in the audio entry is played
+    in real time as the input; with the entry empty the microphone is used.
+    Partial text is shown in grey at the end and replaced by final text.
+    With language "auto" the language is detected from the first seconds
+    of speech.
+    """
+    global live_transcriber
+    if live_transcriber is not None:
+        live_transcriber.stop()
+        live_button.config(text="Live")
+        return
+    if job_client is not None:
+        messagebox.showerror("Error", "Live transcription needs local servers (unset WHISPER_JOB_SERVICE).")
+        return
+    # Imported on first use: microphone capture loads the PortAudio library
+    from live_transcription import LiveTranscriber, MicrophoneSource, WavFileSource
+
+    audio_path = audio_entry.get()
+    try:
+        source = WavFileSource(audio_path) if audio_path else MicrophoneSource()
+    except RuntimeError as e:
+        messagebox.showerror("Error", str(e))
+        return
+
+    start_servers()
+    transcript_view.clear()
+    status_var.set("Live transcription running")
+    live_transcriber = LiveTranscriber(
+        source, server_pool,
+        on_partial=lambda text: ui_updates.put(("partial", text)),
+        on_final=lambda text: ui_updates.put(("final", text)),
+        on_error=lambda message: ui_updates.put(("live_error", message)),
+        language=language_var.get(),
+    ).start()
+    live_button.config(text="Stop Live")
+
+def update_page_label(first, last, total):
+    """
+    Show which pieces of a long transcript are on screen.
+    """
+    if total > transcript_view.page_pieces:
+        page_var.set(f"{first + 1}-{last} of {total}")
+    else:
+        page_var.set("")
+
 def open_github_model_link(event):
     webbrowser.open("https://github.com/openai/whisper")
 
@@ -209,8 +395,8 @@ app.title("Whisper Transcription")
 app.configure(bg="#092642")
 app.geometry("815x600")
 
-# Let row 1 (the transcription text) and column 0 expand
-app.grid_rowconfigure(1, weight=1)
+# Let row 2 (the transcription text) and column 0 expand
+app.grid_rowconfigure(2, weight=1)
 app.grid_columnconfigure(0, weight=1)
 
 dark_bg = "#092642"
@@ -239,6 +425,38 @@ cpu_radio.pack(side=tk.LEFT, padx=2)
 gpu_radio = tk.Radiobutton(top_frame, text="GPU", variable=device_var, value="gpu", fg=dark_fg, bg=dark_bg, selectcolor=dark_bg, command=restart_whisper_server)
 gpu_radio.pack(side=tk.LEFT, padx=2)
 
+# Both devices at once (see server_pool.HybridPool)
+hybrid_radio = tk.Radiobutton(top_frame, text="CPU+GPU", variable=device_var, value=HYBRID, fg=dark_fg, bg=dark_bg, selectcolor=dark_bg, command=restart_whisper_server)
+hybrid_radio.pack(side=tk.LEFT, padx=2)
+
+# Parallel workers (long files are split across this many servers)
+workers_label = tk.Label(top_frame, text="Workers:", fg=dark_fg, bg=dark_bg)
+workers_label.pack(side=tk.LEFT, padx=5)
+
+workers_var = tk.StringVar()
+workers_var.set(str(tuned_settings["servers"]))
+workers_spinbox = tk.Spinbox(top_frame, from_=1, to=16, width=3, textvariable=workers_var, bg=entry_bg, fg=dark_fg, buttonbackground=button_bg, command=resize_server_pool)
+workers_spinbox.pack(side=tk.LEFT, padx=2)
+
+# Skip silence / hold music before inference
+vad_var = tk.BooleanVar()
+vad_var.set(False)
+vad_check = tk.Checkbutton(top_frame, text="Skip silence", variable=vad_var, fg=dark_fg, bg=dark_bg, selectcolor=dark_bg)
+vad_check.pack(side=tk.LEFT, padx=5)
+
+# Label segments with speakers (CPU diarization alongside inference)
+diarize_var = tk.BooleanVar()
+diarize_var.set(False)
+diarize_check = tk.Checkbutton(top_frame, text="Speakers", variable=diarize_var, fg=dark_fg, bg=dark_bg, selectcolor=dark_bg)
+diarize_check.pack(side=tk.LEFT, padx=5)
+
+# Spoken language ("auto" detects it from the first seconds of speech)
+language_var = tk.StringVar()
+language_var.set(DEFAULT_LANGUAGE)
+language_menu = tk.OptionMenu(top_frame, language_var, AUTO, *LANGUAGES)
+language_menu.config(bg=button_bg, fg=dark_fg, activebackground=button_hover_bg, highlightthickness=0)
+language_menu.pack(side=tk.LEFT, padx=5)
+
 # Input Audio File label
 input_label = tk.Label(top_frame, text="Input Audio File:", fg=dark_fg, bg=dark_bg)
 input_label.pack(side=tk.LEFT, padx=15)
@@ -259,13 +477,40 @@ transcribe_btn.pack(side=tk.LEFT, padx=5)
 save_btn = tk.Button(top_frame, text="Save Output", bg=button_bg, fg=dark_fg, activebackground=button_hover_bg, command=save_output)
 save_btn.pack(side=tk.LEFT, padx=5)
 
-# --- 2) Transcription Output Text Widget (in row=1) ---
+# "Live" button (microphone, or the selected file played in real time)
+live_button = tk.Button(top_frame, text="Live", bg=button_bg, fg=dark_fg, activebackground=button_hover_bg, command=toggle_live_transcription)
+live_button.pack(side=tk.LEFT, padx=5)
+
+# --- 2) Status line: timer and progress, plus paging for long transcripts (in row=1) ---
+status_frame = tk.Frame(app, bg=dark_bg)
+status_frame.grid(row=1, column=0, columnspan=5, padx=10, sticky="we")
+
+status_var = tk.StringVar()
+status_label = tk.Label(status_frame, textvariable=status_var, fg=dark_fg, bg=dark_bg, anchor="w")
+status_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+later_btn = tk.Button(status_frame, text="Later", bg=button_bg, fg=dark_fg, activebackground=button_hover_bg, command=lambda: transcript_view.page_down())
+later_btn.pack(side=tk.RIGHT, padx=2)
+earlier_btn = tk.Button(status_frame, text="Earlier", bg=button_bg, fg=dark_fg, activebackground=button_hover_bg, command=lambda: transcript_view.page_up())
+earlier_btn.pack(side=tk.RIGHT, padx=2)
+
+page_var = tk.StringVar()
+page_label = tk.Label(status_frame, textvariable=page_var, fg=dark_fg, bg=dark_bg)
+page_label.pack(side=tk.RIGHT, padx=5)
+
+# Whether inference is available yet (see readiness())
+ready_var = tk.StringVar()
+ready_label = tk.Label(status_frame, textvariable=ready_var, fg=dark_fg, bg=dark_bg)
+ready_label.pack(side=tk.RIGHT, padx=5)
+
+# --- 3) Transcription Output Text Widget (in row=2) ---
 transcription_text = tk.Text(app, wrap="word", bg=dark_fg, fg=transcription_text_fg, insertbackground=transcription_text_fg)
-transcription_text.grid(row=1, column=0, columnspan=5, padx=10, pady=10, sticky="nsew")
+transcription_text.grid(row=2, column=0, columnspan=5, padx=10, pady=5, sticky="nsew")
+transcript_view = TranscriptView(transcription_text, on_page_change=update_page_label)
 
-# --- 3) Links frame (in row=2) ---
+# --- 4) Links frame (in row=3) ---
 link_frame = tk.Frame(app, bg=dark_bg)
-link_frame.grid(row=2, column=0, columnspan=5, pady=5)
+link_frame.grid(row=3, column=0, columnspan=5, pady=5)
 
 github_model_link = tk.Label(link_frame, text="Based on OpenAI's Whisper Transformer architecture", fg="#ffffff", bg=button_bg, cursor="hand2")
 github_model_link.pack(side=tk.LEFT, padx=5)
@@ -280,9 +525,9 @@ github_dev_link.pack(side=tk.LEFT, padx=5)
 github_dev_link.bind("<Button-1>", open_github_dev_link)
 
 if __name__ == "__main__":
-    server_process = start_whisper_server(device_var.get())
+    app.after_idle(on_window_shown)
+    app.after(100, drain_ui_updates)
     try:
         app.mainloop()
     finally:
-        if server_process is not None:
-            server_process.terminate()
+        server_pool.stop()
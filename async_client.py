@@ -0,0 +1,241 @@
+import os
+import json
+import asyncio
+
+from audio_io import pcm_wav_payload
+from whisper_client import CONNECT_TIMEOUT, RETRY_STATUSES, MultipartStream
+from whisper_server import DEFAULT_LANGUAGE, DEFAULT_MODEL
+
+# asyncio client for whisper-server built on asyncio streams, so one event
+# loop can keep hundreds of requests in flight without a thread per request:
+#
+#   async with AsyncWhisperPool([("127.0.0.1", 8080), ("127.0.0.1", 8081)]) as pool:
+#       results = await asyncio.gather(*(pool.transcribe(p, timeout=600) for p in paths))
+
+class HTTPResponse:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body.decode("utf-8"))
+
+    @property
+    def text(self):
+        return self.body.decode("utf-8", errors="replace")
+
+class AsyncWhisperClient:
+    """
+    Keep-alive HTTP/1.1 client for one whisper-server endpoint with at most
+    `max_connections` connections open. Requests honour per-call deadlines
+    and can be cancelled; a cancelled request's connection is discarded
+    rather than returned to the pool.
+    """
+    def __init__(self, host="127.0.0.1", port=8080, max_connections=4, connect_timeout=CONNECT_TIMEOUT,
+                 retries=3, backoff=0.5):
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self._idle = []
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def inference(self, audio, fields=None, filename=None, content_type="application/octet-stream", timeout=None):
+        """
+        POST audio (path, bytes or binary file object) to /inference and
+        return the decoded JSON. `timeout` is a deadline in seconds for the
+        whole call, including waiting for a free connection and retries.
+        """
+        if filename is None:
+            filename = os.path.basename(audio) if isinstance(audio, (str, os.PathLike)) else "audio.wav"
+        body = MultipartStream(fields or {}, "file", filename, audio, content_type)
+        try:
+            if timeout is None:
+                response = await self._post_with_retries("/inference", body)
+            else:
+                response = await asyncio.wait_for(self._post_with_retries("/inference", body), timeout)
+        finally:
+            body.close()
+        if response.status == 200:
+            return response.json()
+        raise RuntimeError(f"Server error: {response.status}, {response.text}")
+
+    async def get(self, path, timeout=None):
+        return await asyncio.wait_for(self._request("GET", path), timeout)
+
+    async def _post_with_retries(self, path, body):
+        attempt = 0
+        while True:
+            try:
+                response = await self._request("POST", path, body)
+                if response.status not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if attempt >= self.retries:
+                    raise
+            attempt += 1
+            await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            body.rewind()
+
+    async def _request(self, method, path, body=None):
+        async with self._slots:
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await self._connect()
+            try:
+                response = await self._exchange(reader, writer, method, path, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection; retry once on a fresh one
+                if body is not None:
+                    body.rewind()
+                reader, writer = await self._connect()
+                try:
+                    response = await self._exchange(reader, writer, method, path, body)
+                except BaseException:
+                    writer.close()
+                    raise
+            except BaseException:
+                # Cancelled or failed mid-request: the connection state is unknown
+                writer.close()
+                raise
+            if response.headers.get("connection", "").lower() == "close":
+                writer.close()
+            else:
+                self._idle.append((reader, writer))
+            return response
+
+    async def _connect(self):
+        return await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.connect_timeout)
+
+    async def _exchange(self, reader, writer, method, path, body):
+        headers = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive"]
+        if body is not None:
+            headers.append(f"Content-Type: {body.content_type}")
+            headers.append(f"Content-Length: {len(body)}")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1"))
+        if body is not None:
+            # Reads of a file-backed body go to a worker thread so the loop
+            # keeps serving the other requests meanwhile
+            loop = asyncio.get_running_loop()
+            while True:
+                chunk = await loop.run_in_executor(None, body.read, body.chunk_size)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+        await writer.drain()
+        return await self._read_response(reader)
+
+    async def _read_response(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Server closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            headers["connection"] = "close"
+        return HTTPResponse(status, headers, body)
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+class AsyncWhisperPool:
+    """
+    Fans requests from one event loop out to many whisper-server endpoints,
+    sending each request to the endpoint with the fewest requests in flight.
+    whisper-server decodes one request at a time, so by default each
+    endpoint gets one request and the rest wait here instead of in its queue.
+    """
+    def __init__(self, endpoints, per_endpoint=1, **client_options):
+        self.clients = [AsyncWhisperClient(host, port, max_connections=per_endpoint, **client_options)
+                        for host, port in endpoints]
+        self.per_endpoint = per_endpoint
+        self._in_flight = {client: 0 for client in self.clients}
+        self._cond = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _acquire(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            while True:
+                client = min(self.clients, key=lambda c: self._in_flight[c])
+                if self._in_flight[client] < self.per_endpoint:
+                    self._in_flight[client] += 1
+                    return client
+                await self._cond.wait()
+
+    async def _release(self, client):
+        async with self._cond:
+            self._in_flight[client] -= 1
+            self._cond.notify()
+
+    async def inference(self, audio, fields=None, filename=None, content_type="application/octet-stream", timeout=None):
+        """
+        Like AsyncWhisperClient.inference(), on whichever endpoint frees up
+        first. The deadline also covers the wait for a free endpoint.
+        """
+        async def run():
+            client = await self._acquire()
+            try:
+                return await client.inference(audio, fields, filename, content_type)
+            finally:
+                await self._release(client)
+
+        if timeout is None:
+            return await run()
+        return await asyncio.wait_for(run(), timeout)
+
+    async def transcribe(self, audio_path, model_path=DEFAULT_MODEL, language=DEFAULT_LANGUAGE, timeout=None):
+        """
+        Async counterpart of whisper_server.transcribe_audio(). The file is
+        decoded to 16 kHz mono PCM WAV on a worker thread (the servers run
+        without --convert) and the result carries verbose_json segments.
+        `timeout` is a deadline for the decode and the request together.
+        """
+        async def run():
+            filename, audio, content_type = await asyncio.get_running_loop().run_in_executor(
+                None, pcm_wav_payload, audio_path)
+            fields = {"model": model_path, "language": language, "response_format": "verbose_json"}
+            return await self.inference(audio, fields, filename=filename, content_type=content_type)
+
+        # One deadline covers the decode as well as the request
+        result = await (run() if timeout is None else asyncio.wait_for(run(), timeout))
+        result["model"] = model_path
+        return result
+
+    async def close(self):
+        for client in self.clients:
+            await client.close()
@@ -0,0 +1,266 @@
+import io
+import os
+import re
+import shutil
+import wave
+import struct
+import subprocess
+import numpy as np
+
+from metrics import timed
+
+SAMPLE_RATE = 16000
+CHUNK_SAMPLES = SAMPLE_RATE * 30
+WINDOW_SECONDS = 600
+WINDOW_SEARCH_SECONDS = 20
+
+# Audio is decoded client-side to 16 kHz mono 16-bit PCM, the format
+# whisper-server reads without its --convert step (which spawns ffmpeg and
+# writes a temporary WAV per request). PyAV decodes in-process when it is
+# installed; otherwise one ffmpeg pipe per file streams PCM to us, still
+# without touching the disk.
+try:
+    import av
+except ImportError:
+    av = None
+
+def find_ffmpeg():
+    """
+    Locate an ffmpeg executable: the bundled ffmpeg/bin, the one on PATH,
+    else the imageio-ffmpeg binary.
+    """
+    from whisper_server import get_base_path
+
+    exe_name = "ffmpeg.exe" if os.name == "nt" else "ffmpeg"
+    bundled = os.path.join(get_base_path(), "ffmpeg", "bin", exe_name)
+    if os.path.exists(bundled):
+        return bundled
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        return ffmpeg
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        raise RuntimeError("ffmpeg was not found on PATH and imageio-ffmpeg is not installed.")
+
+def audio_duration(audio_path):
+    """
+    Return the duration of an audio file in seconds without decoding it.
+    """
+    if audio_path.lower().endswith(".wav"):
+        try:
+            with wave.open(audio_path, "rb") as wav:
+                return wav.getnframes() / float(wav.getframerate())
+        except wave.Error:
+            pass
+
+    if av is not None:
+        try:
+            with av.open(audio_path) as container:
+                if container.duration:
+                    return container.duration / av.time_base
+        except (av.FFmpegError, OSError):
+            pass
+
+    # ffmpeg prints the container duration while probing the input
+    proc = subprocess.run([find_ffmpeg(), "-nostdin", "-hide_banner", "-i", audio_path],
+                          capture_output=True, creationflags=_creation_flags())
+    match = re.search(rb"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", proc.stderr)
+    if not match:
+        raise RuntimeError(f"Could not read the duration of {audio_path}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def _creation_flags():
+    return getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+def _is_pcm16_mono_wav(audio_path, sample_rate):
+    if not audio_path.lower().endswith(".wav"):
+        return False
+    try:
+        with wave.open(audio_path, "rb") as wav:
+            return wav.getnchannels() == 1 and wav.getsampwidth() == 2 and wav.getframerate() == sample_rate
+    except (wave.Error, EOFError):
+        return False
+
+def _wav_data_range(audio_path):
+    """
+    (byte offset, sample count) of the data chunk of a 16-bit PCM WAV file.
+    """
+    with open(audio_path, "rb") as f:
+        header = f.read(12)
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise ValueError(f"{audio_path} is not a RIFF/WAVE file")
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise ValueError(f"{audio_path} has no data chunk")
+            chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+            if chunk_id == b"data":
+                offset = f.tell()
+                break
+            f.seek(size + (size & 1), os.SEEK_CUR)
+    # Recorders that write WAV as a stream may leave the size unset
+    return offset, max(0, min(size, os.path.getsize(audio_path) - offset) // 2)
+
+def wav_memmap(audio_path, start=0, count=None):
+    """
+    Memory-map `count` samples (default: all) from `start` of a 16-bit mono
+    PCM WAV file as a read-only int16 array. Pages are only read when
+    touched, so mapping a multi-hour file costs no memory up front.
+    """
+    offset, total = _wav_data_range(audio_path)
+    start = min(start, total)
+    count = total - start if count is None else min(count, total - start)
+    if count <= 0:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(audio_path, dtype=np.int16, mode="r", offset=offset + 2 * start, shape=(count,))
+
+def _stream_wav(audio_path, chunk_samples):
+    _, total = _wav_data_range(audio_path)
+    for start in range(0, total, chunk_samples):
+        # One short-lived mapping per block: the pages read so far are
+        # released with it instead of accumulating in the process
+        block = wav_memmap(audio_path, start, chunk_samples)
+        yield np.array(block)
+        del block
+
+def _stream_av(audio_path, sample_rate):
+    with av.open(audio_path) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+        for frame in container.decode(stream):
+            for out in resampler.resample(frame):
+                yield out.to_ndarray().reshape(-1)
+        for out in resampler.resample(None):
+            yield out.to_ndarray().reshape(-1)
+
+def _stream_ffmpeg(audio_path, sample_rate, chunk_samples):
+    cmd = [
+        find_ffmpeg(),
+        "-nostdin",
+        "-loglevel", "error",
+        "-i", audio_path,
+        "-f", "s16le",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "-"
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=_creation_flags())
+    try:
+        while True:
+            data = proc.stdout.read(chunk_samples * 2)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16)
+        stderr = proc.stderr.read()
+        if proc.wait() != 0:
+            raise RuntimeError(f"Could not decode {audio_path}: {stderr.decode(errors='replace').strip()}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+def stream_audio(audio_path, sample_rate=SAMPLE_RATE, chunk_samples=CHUNK_SAMPLES):
+    """
+    Decode any audio file to mono 16-bit PCM at the given sample rate,
+    yielding numpy int16 blocks so memory does not grow with the file length.
+    """
+    if _is_pcm16_mono_wav(audio_path, sample_rate):
+        return _stream_wav(audio_path, chunk_samples)
+    if av is not None:
+        return _stream_av(audio_path, sample_rate)
+    return _stream_ffmpeg(audio_path, sample_rate, chunk_samples)
+
+@timed("decode")
+def load_audio(audio_path, sample_rate=SAMPLE_RATE, max_seconds=None):
+    """
+    Decode any audio file to mono 16-bit PCM at the given sample rate.
+    With max_seconds only the beginning is decoded.
+    Returns a numpy int16 array.
+    """
+    limit = None if max_seconds is None else int(max_seconds * sample_rate)
+    buffer = np.empty(sample_rate * 60 if limit is None else limit, dtype=np.int16)
+    length = 0
+    blocks = stream_audio(audio_path, sample_rate)
+    for block in blocks:
+        if limit is not None and length + len(block) >= limit:
+            block = block[:limit - length]
+            buffer[length:limit] = block
+            length = limit
+            # Stops the decoder (and any ffmpeg child) early
+            blocks.close()
+            break
+        if length + len(block) > len(buffer):
+            grown = np.empty(max(2 * len(buffer), length + len(block)), dtype=np.int16)
+            grown[:length] = buffer[:length]
+            buffer = grown
+        buffer[length:length + len(block)] = block
+        length += len(block)
+    return buffer[:length]
+
+def _quietest_point(samples, lo, hi, sample_rate=SAMPLE_RATE):
+    """
+    Index of the quietest ~300 ms within samples[lo:hi].
+    """
+    frame = int(0.03 * sample_rate)
+    count = (hi - lo) // frame
+    if count < 1:
+        return hi
+    frames = samples[lo:lo + count * frame].astype(np.float32).reshape(count, frame)
+    energy = np.sqrt(np.mean(frames ** 2, axis=1))
+    if count >= 10:
+        energy = np.convolve(energy, np.ones(10) / 10, mode="same")
+    return lo + int(np.argmin(energy)) * frame + frame // 2
+
+def audio_windows(audio_path, window_seconds=WINDOW_SECONDS, search_seconds=WINDOW_SEARCH_SECONDS,
+                  sample_rate=SAMPLE_RATE):
+    """
+    Yield (start_sample, samples) windows of about window_seconds, each
+    ending at the quietest moment within +/- search_seconds of the nominal
+    cut. The file is decoded incrementally (memory-mapped for PCM WAV), and
+    no more than one window plus the search span is held at a time.
+    """
+    window = int(window_seconds * sample_rate)
+    search = min(int(search_seconds * sample_rate), window // 2)
+    buffer = np.empty(window + search, dtype=np.int16)
+    length = 0
+    start = 0
+    for block in stream_audio(audio_path, sample_rate):
+        while len(block):
+            take = min(len(block), len(buffer) - length)
+            buffer[length:length + take] = block[:take]
+            length += take
+            block = block[take:]
+            if length == len(buffer):
+                cut = _quietest_point(buffer, window - search, window + search, sample_rate)
+                yield start, buffer[:cut].copy()
+                buffer[:length - cut] = buffer[cut:length]
+                length -= cut
+                start += cut
+    if length:
+        yield start, buffer[:length].copy()
+
+def wav_bytes(samples, sample_rate=SAMPLE_RATE):
+    """
+    Wrap int16 mono samples in an in-memory WAV file.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.ascontiguousarray(samples, dtype=np.int16).tobytes())
+    return buffer.getvalue()
+
+def pcm_wav_payload(audio_path, sample_rate=SAMPLE_RATE):
+    """
+    Decode a file into a ready-to-send ("name.wav", bytes, "audio/wav")
+    payload that whisper-server accepts without --convert.
+    """
+    name = os.path.splitext(os.path.basename(audio_path))[0] + ".wav"
+    if _is_pcm16_mono_wav(audio_path, sample_rate):
+        # Already in the server's format: stream the file itself
+        return (name, audio_path, "audio/wav")
+    return (name, wav_bytes(load_audio(audio_path, sample_rate), sample_rate), "audio/wav")
@@ -0,0 +1,315 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import platform
+
+# Picks whisper-server thread count, instance count and CPU pinning for this
+# machine. The calibration result is cached per machine and model, so only
+# the first transcribe_batch.py or job_service.py start (or an explicit
+# `python autotune.py`) pays for it; the GUIs never calibrate and use the
+# cached result or the heuristic:
+#   python autotune.py --device cpu
+#   python autotune.py --device cpu --model ggml-large-v3-turbo-q5_0.bin
+#   python autotune.py --show
+#
+# Physical core detection on Windows and process pinning on macOS/Windows
+# need psutil (pip install psutil); without it all logical CPUs count as
+# cores and servers are not pinned.
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MIN_THREADS_PER_SERVER = 4
+CALIBRATION_SAMPLE = "30sec.mp3"
+
+def _parse_cpu_list(text):
+    """
+    Parse a Linux cpulist such as "0-3,8,10-11".
+    """
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+def _read(path):
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def available_cpus():
+    """
+    Logical CPUs this process may run on.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    if psutil is not None:
+        try:
+            return sorted(psutil.Process().cpu_affinity())
+        except (AttributeError, psutil.Error):
+            pass
+    return list(range(os.cpu_count() or 1))
+
+def detect_topology():
+    """
+    Return {"logical", "physical", "numa_nodes", "cores"} where `cores` lists
+    the logical CPUs of each physical core (hyper-thread siblings together),
+    ordered by NUMA node.
+    """
+    cpus = available_cpus()
+    allowed = set(cpus)
+
+    node_of = {}
+    for node_dir in sorted(glob.glob("/sys/devices/system/node/node[0-9]*")):
+        cpulist = _read(os.path.join(node_dir, "cpulist"))
+        if cpulist:
+            node = int(os.path.basename(node_dir)[4:])
+            for cpu in _parse_cpu_list(cpulist):
+                node_of[cpu] = node
+
+    cores = []
+    seen = set()
+    for cpu in cpus:
+        if cpu in seen:
+            continue
+        siblings = _read(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list")
+        group = [c for c in _parse_cpu_list(siblings) if c in allowed] if siblings else [cpu]
+        group = group or [cpu]
+        seen.update(group)
+        cores.append(group)
+
+    if len(cores) == len(cpus) and psutil is not None and not node_of:
+        # No sysfs topology (Windows/macOS): psutil knows the core count but
+        # not which logical CPUs are siblings; Windows numbers them in pairs
+        physical = psutil.cpu_count(logical=False) or len(cpus)
+        per_core = max(1, len(cpus) // physical)
+        if per_core > 1:
+            cores = [cpus[i:i + per_core] for i in range(0, len(cpus), per_core)]
+
+    cores.sort(key=lambda group: (node_of.get(group[0], 0), group[0]))
+    return {
+        "logical": len(cpus),
+        "physical": len(cores),
+        "numa_nodes": max(1, len(set(node_of.values()))),
+        "cores": cores,
+    }
+
+def physical_cores():
+    """
+    Number of physical cores available to this process.
+    """
+    try:
+        return detect_topology()["physical"]
+    except Exception:
+        return os.cpu_count() or 1
+
+def split_cores(cores, servers):
+    """
+    Split the core list into `servers` contiguous, near-equal slices and
+    return the logical CPUs of each. Cores are ordered by NUMA node, so
+    when the server count is a multiple of the node count no server spans
+    two nodes.
+    """
+    servers = max(1, min(servers, len(cores)))
+    slices = []
+    start = 0
+    for i in range(servers):
+        end = start + len(cores) // servers + (1 if i < len(cores) % servers else 0)
+        slices.append([cpu for group in cores[start:end] for cpu in group])
+        start = end
+    return slices
+
+def heuristic_settings(topology, device="cpu"):
+    """
+    Settings used before a calibration exists: one server per NUMA node
+    using every physical core, pinned to its node on multi-node machines.
+    """
+    servers = topology["numa_nodes"] if device == "cpu" else 1
+    return {
+        "device": device,
+        "threads": topology["physical"],
+        "servers": servers,
+        "affinity": split_cores(topology["cores"], servers) if servers > 1 else None,
+        "calibrated": False,
+    }
+
+def candidate_settings(topology, device="cpu"):
+    """
+    Configurations worth calibrating: powers-of-two server counts with at
+    least MIN_THREADS_PER_SERVER cores each, all physical cores shared
+    between them, pinned and (for several servers) unpinned. With SMT the
+    logical-CPU count is tried as well.
+    """
+    physical, logical = topology["physical"], topology["logical"]
+    if device != "cpu":
+        # GPU servers only use threads for sampling and I/O
+        return [{"device": device, "threads": t, "servers": 1, "affinity": None}
+                for t in sorted({min(4, physical), min(8, physical)})]
+
+    candidates = []
+    servers = 1
+    while servers == 1 or physical // servers >= MIN_THREADS_PER_SERVER:
+        for threads in sorted({physical, logical}):
+            candidates.append({"device": device, "threads": threads, "servers": servers, "affinity": None})
+            if servers > 1:
+                candidates.append({"device": device, "threads": threads, "servers": servers,
+                                   "affinity": split_cores(topology["cores"], servers)})
+        servers *= 2
+    return candidates
+
+def machine_key(topology, device, model):
+    """
+    Identify a machine/model/device combination; a change of CPU, core
+    count or model invalidates the cached calibration.
+    """
+    parts = [platform.node(), platform.machine(), platform.processor(), str(topology["logical"]),
+             str(topology["physical"]), str(topology["numa_nodes"]), device, model]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+def default_tuning_path():
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "speech-to-text", "autotune.json")
+
+def _load_cache(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_settings(settings, topology, model, path=None):
+    path = path or default_tuning_path()
+    cache = _load_cache(path)
+    cache[machine_key(topology, settings["device"], model)] = settings
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, path)
+
+def load_settings(device="cpu", model=None, path=None):
+    """
+    Return the cached calibration for this machine, or heuristic settings
+    when it has not been calibrated. Never starts a server.
+    """
+    if model is None:
+        from whisper_server import DEFAULT_MODEL
+        model = DEFAULT_MODEL
+    topology = detect_topology()
+    cached = _load_cache(path or default_tuning_path()).get(machine_key(topology, device, model))
+    return cached or heuristic_settings(topology, device)
+
+def ensure_settings(device="cpu", model=None, path=None, log=print):
+    """
+    Like load_settings(), but calibrates on a cache miss (starting servers
+    for `model`) and saves the result. When the calibration cannot run,
+    e.g. without the server build or the bundled sample, the heuristic
+    settings are saved marked calibrated="failed", so later starts do not
+    try again; `python autotune.py` calibrates anew.
+    """
+    from whisper_server import DEFAULT_MODEL
+    model = model or DEFAULT_MODEL
+    settings = load_settings(device, model, path)
+    if settings.get("calibrated"):
+        return settings
+    from server_pool import whisper_launchers
+    log(f"Calibrating {device.upper()} servers for {os.path.basename(model)}; the result is cached...")
+    try:
+        settings, topology, _ = calibrate(device, launchers=whisper_launchers(model=model), log=log)
+    except (OSError, RuntimeError) as e:
+        log(f"Calibration failed ({e}); using default settings (run autotune.py to retry)")
+        topology = detect_topology()
+        settings = dict(heuristic_settings(topology, device), calibrated="failed", error=str(e),
+                        calibrated_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    save_settings(settings, topology, model, path)
+    return settings
+
+def pool_options(settings):
+    """
+    ServerPool keyword arguments for the given settings.
+    """
+    return {"size": settings["servers"], "total_threads": settings["threads"], "affinity": settings["affinity"]}
+
+def calibrate(device="cpu", sample_path=None, launchers=None, repeat=2, base_port=8090, log=print):
+    """
+    Measure every candidate configuration on the bundled sample and return
+    the one with the highest throughput (audio seconds per wall second),
+    together with all measurements. A configuration whose servers fail to
+    start ends the calibration: the remaining ones would fail the same way.
+    """
+    from benchmark import run_config
+    from server_pool import ServerPool, whisper_launchers
+    from whisper_server import get_base_path
+
+    sample_path = sample_path or os.path.join(get_base_path(), "audio-samples", CALIBRATION_SAMPLE)
+    launchers = launchers or whisper_launchers()
+    topology = detect_topology()
+    log(f"{topology['physical']} physical cores, {topology['logical']} logical CPUs, "
+        f"{topology['numa_nodes']} NUMA node(s)")
+
+    measurements = []
+    best = None
+    for candidate in candidate_settings(topology, device):
+        pool = ServerPool({device: launchers[device]}, active=device, spares=0, standby=False,
+                          base_port=base_port, **pool_options(candidate))
+        try:
+            with pool:
+                pool.wait_ready(candidate["servers"], timeout=600)
+                # Every server handles `repeat` requests at full concurrency
+                metrics = run_config([sample_path] * candidate["servers"], pool, candidate["servers"],
+                                     repeat=repeat, warmup=candidate["servers"])
+        except TimeoutError as e:
+            log(f"  {candidate['servers']} x {candidate['threads']} threads: failed ({e})")
+            continue
+        except RuntimeError as e:
+            log(f"  {candidate['servers']} x {candidate['threads']} threads: servers did not start ({e})")
+            break
+        throughput = metrics["throughput_audio_x"] or 0.0
+        pinned = "pinned" if candidate["affinity"] else "unpinned"
+        log(f"  {candidate['servers']} server(s), {candidate['threads']} threads, {pinned}: "
+            f"{throughput:.2f}x real time, p95 {metrics['latency_p95']}s")
+        measurements.append({**candidate, "throughput_audio_x": throughput, "latency_p95": metrics["latency_p95"]})
+        if metrics["errors"] == 0 and (best is None or throughput > best["throughput_audio_x"]):
+            best = measurements[-1]
+
+    if best is None:
+        raise RuntimeError("No configuration completed the calibration")
+    settings = {key: best[key] for key in ("device", "threads", "servers", "affinity")}
+    settings.update(calibrated=True, throughput_audio_x=best["throughput_audio_x"],
+                    calibrated_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    return settings, topology, measurements
+
+def main(argv=None):
+    from whisper_server import DEFAULT_MODEL
+
+    parser = argparse.ArgumentParser(description="Calibrate whisper-server threads, instances and CPU affinity.")
+    parser.add_argument("--device", choices=["cpu", "gpu"], default="cpu")
+    parser.add_argument("--sample", help=f"calibration audio (default: audio-samples/{CALIBRATION_SAMPLE})")
+    parser.add_argument("--repeat", type=int, default=2, help="requests per server per configuration")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL, help=f"model the servers run (default: {DEFAULT_MODEL})")
+    parser.add_argument("--show", action="store_true", help="print the settings in use and exit")
+    args = parser.parse_args(argv)
+
+    if args.show:
+        print(json.dumps(load_settings(args.device, args.model), indent=2))
+        return 0
+
+    from server_pool import whisper_launchers
+    settings, topology, _ = calibrate(args.device, args.sample, launchers=whisper_launchers(model=args.model),
+                                      repeat=args.repeat)
+    save_settings(settings, topology, args.model)
+    print(f"Using {settings['servers']} server(s) with {settings['threads']} threads in total"
+          f"{' (pinned)' if settings['affinity'] else ''}; saved to {default_tuning_path()}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
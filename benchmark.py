@@ -0,0 +1,252 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import platform
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_io import audio_duration
+from server_pool import ServerPool, StaticPool
+from transcribe_batch import collect_inputs
+from whisper_server import DEFAULT_MODEL, DEFAULT_THREADS, get_base_path, start_whisper_server, transcribe_audio
+
+# Reproducible throughput/latency benchmark over audio-samples/ or a corpus:
+#   python benchmark.py --devices cpu gpu --threads 8 16 24 --concurrency 1 2 4 -o results/run1
+#   python benchmark.py --compare results/run1.json results/run2.json
+#
+# Peak RSS of the server processes needs psutil (pip install psutil); without
+# it only this client process is measured where the OS allows it.
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio-samples")
+
+def percentile(values, q):
+    """
+    Linear-interpolated percentile of a list, q in [0, 100].
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+class RssSampler:
+    """
+    Polls the resident set size of the given processes in the background
+    and remembers the peak of their sum.
+    """
+    def __init__(self, pids, interval=0.2):
+        self.pids = pids
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _rss(self):
+        if psutil is not None:
+            total = 0
+            for pid in self.pids:
+                try:
+                    total += psutil.Process(pid).memory_info().rss
+                except psutil.Error:
+                    pass
+            return total
+        try:
+            import resource
+            # ru_maxrss is in KiB on Linux; only covers this process
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def run_config(files, pool, concurrency, repeat=1, warmup=1, pids=()):
+    """
+    Transcribe every file `repeat` times with `concurrency` requests in
+    flight and return the measured metrics for this configuration.
+    """
+    durations = {path: audio_duration(path) for path in files}
+    for path in files[:warmup]:
+        with pool.worker() as worker:
+            transcribe_audio(path, host=worker.host, port=worker.port)
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(path):
+        nonlocal errors
+        t0 = time.perf_counter()
+        try:
+            with pool.worker() as worker:
+                transcribe_audio(path, host=worker.host, port=worker.port)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append((time.perf_counter() - t0, durations[path]))
+
+    jobs = [path for _ in range(repeat) for path in files]
+    with RssSampler(list(pids)) as rss:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(one, jobs))
+        wall = time.perf_counter() - started
+
+    seconds = [latency for latency, _ in latencies]
+    audio_total = sum(duration for _, duration in latencies)
+    return {
+        "requests": len(jobs),
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "audio_seconds": round(audio_total, 3),
+        # Real-time factor: processing seconds per second of audio (lower is better)
+        "rtf": round(wall / audio_total, 4) if audio_total else None,
+        "latency_p50": round(percentile(seconds, 50), 3),
+        "latency_p95": round(percentile(seconds, 95), 3),
+        "latency_p99": round(percentile(seconds, 99), 3),
+        "throughput_audio_x": round(audio_total / wall, 3) if wall else None,
+        "throughput_req_per_min": round(len(seconds) * 60 / wall, 3) if wall else None,
+        "peak_rss_mb": round(rss.peak / 2 ** 20, 1),
+    }
+
+def sweep(files, devices, thread_counts, servers_counts, concurrencies, repeat, base_port=8090, log=print):
+    """
+    Start servers for every (device, threads, servers) combination and
+    measure each concurrency level against them.
+    """
+    results = []
+    for device, threads, servers in itertools.product(devices, thread_counts, servers_counts):
+        launcher = lambda port, t, device=device: start_whisper_server(device=device, port=port, threads=t, convert=False)
+        pool = ServerPool({device: launcher}, active=device, size=servers, spares=0, standby=False,
+                          base_port=base_port, total_threads=threads * servers)
+        with pool:
+            t0 = time.perf_counter()
+            pool.wait_ready(servers, timeout=600)
+            load_seconds = time.perf_counter() - t0
+            pids = [w.process.pid for w in pool.workers if w.process is not None]
+            for concurrency in concurrencies:
+                config = {"device": device, "threads": threads, "servers": servers, "concurrency": concurrency}
+                log(f"Running {config}...")
+                metrics = run_config(files, pool, concurrency, repeat=repeat, pids=pids)
+                metrics["model_load_seconds"] = round(load_seconds, 2)
+                results.append({**config, **metrics})
+                log(f"  RTF {metrics['rtf']}  p50 {metrics['latency_p50']}s  p95 {metrics['latency_p95']}s  "
+                    f"peak RSS {metrics['peak_rss_mb']} MB")
+    return results
+
+def write_results(results, output, meta):
+    """
+    Write <output>.json (results plus machine/run metadata) and <output>.csv.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output + ".json", "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    if results:
+        with open(output + ".csv", "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+
+CONFIG_KEYS = ("device", "threads", "servers", "concurrency")
+COMPARE_METRICS = ("rtf", "latency_p50", "latency_p95", "latency_p99", "peak_rss_mb")
+
+def compare(baseline_path, candidate_path, tolerance=0.05):
+    """
+    Print per-configuration changes between two result files and return the
+    number of metrics that got worse by more than `tolerance`.
+    """
+    def load(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return {tuple(r[k] for k in CONFIG_KEYS): r for r in json.load(f)["results"]}
+
+    baseline, candidate = load(baseline_path), load(candidate_path)
+    regressions = 0
+    for key in sorted(set(baseline) & set(candidate), key=str):
+        cells = []
+        for metric in COMPARE_METRICS:
+            old, new = baseline[key].get(metric), candidate[key].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            # Every compared metric is lower-is-better
+            flag = " REGRESSION" if change > tolerance else ""
+            regressions += bool(flag)
+            cells.append(f"{metric} {old} -> {new} ({change:+.1%}){flag}")
+        print(dict(zip(CONFIG_KEYS, key)))
+        for cell in cells:
+            print(f"    {cell}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark whisper-server configurations.")
+    parser.add_argument("corpus", nargs="*", default=[SAMPLES_DIR], help="audio files, folders or globs (default: audio-samples/)")
+    parser.add_argument("--devices", nargs="+", default=["cpu"], choices=["cpu", "gpu"])
+    parser.add_argument("--threads", nargs="+", type=int, default=[DEFAULT_THREADS], help="threads per server to sweep")
+    parser.add_argument("--servers", nargs="+", type=int, default=[1], help="server counts to sweep")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1], help="requests in flight to sweep")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the corpus per configuration")
+    parser.add_argument("--endpoints", nargs="+", metavar="HOST:PORT", help="benchmark already running servers instead")
+    parser.add_argument("-o", "--output", default=os.path.join("benchmarks", time.strftime("%Y%m%d-%H%M%S")),
+                        help="output path without extension")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="compare two result JSON files")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="relative change reported as a regression")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(*args.compare, tolerance=args.tolerance) else 0
+
+    files = collect_inputs(args.corpus)
+    if not files:
+        parser.error("no audio files found")
+
+    meta = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "model": DEFAULT_MODEL,
+        "base_path": get_base_path(),
+        "files": [os.path.basename(f) for f in files],
+        "repeat": args.repeat,
+    }
+
+    if args.endpoints:
+        endpoints = [(h or "127.0.0.1", int(p)) for h, _, p in (e.rpartition(":") for e in args.endpoints)]
+        pool = StaticPool(endpoints)
+        results = []
+        for concurrency in args.concurrency:
+            metrics = run_config(files, pool, concurrency, repeat=args.repeat)
+            results.append({"device": "external", "threads": None, "servers": len(endpoints),
+                             "concurrency": concurrency, **metrics})
+            print(results[-1])
+    else:
+        results = sweep(files, args.devices, args.threads, args.servers, args.concurrency, args.repeat)
+
+    write_results(results, args.output, meta)
+    print(f"Wrote {args.output}.json and {args.output}.csv")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+import re
+import math
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from audio_io import SAMPLE_RATE, audio_duration, audio_windows, load_audio, wav_bytes
+from diarization import assign_speakers, diarize as diarize_speakers
+from vad import FRAME_SECONDS, frame_energy_db, remove_silence
+from language_routing import AUTO, detect_language
+from whisper_server import DEFAULT_LANGUAGE, DEFAULT_MODEL, WINDOWED_MIN_SECONDS, post_inference
+
+SEGMENT_SECONDS = 120
+SEARCH_SECONDS = 15
+OVERLAP_SECONDS = 1.5
+# About what 1.5 s of overlapping speech can hold
+MAX_OVERLAP_WORDS = 8
+
+class TranscriptionCancelled(Exception):
+    pass
+
+def find_split_points(samples, segment_seconds=SEGMENT_SECONDS, search_seconds=SEARCH_SECONDS, sample_rate=SAMPLE_RATE):
+    """
+    Pick cut positions (in samples) roughly every segment_seconds, each moved
+    to the quietest stretch within +/- search_seconds of the nominal cut.
+    """
+    energy = frame_energy_db(samples, sample_rate=sample_rate)
+    frame_len = int(FRAME_SECONDS * sample_rate)
+    total_frames = len(energy)
+    segment_frames = int(segment_seconds / FRAME_SECONDS)
+    search_frames = int(search_seconds / FRAME_SECONDS)
+    # Smooth over ~300 ms so a cut lands in a pause, not between two syllables
+    smooth = np.convolve(energy, np.ones(10) / 10, mode="same") if total_frames >= 10 else energy
+
+    cuts = []
+    last = 0
+    while total_frames - last > segment_frames + search_frames:
+        target = last + segment_frames
+        lo = max(last + 1, target - search_frames)
+        hi = min(total_frames - 1, target + search_frames)
+        cut = lo + int(np.argmin(smooth[lo:hi]))
+        cuts.append(cut * frame_len)
+        last = cut
+    return cuts
+
+def split_audio(samples, segment_seconds=SEGMENT_SECONDS, overlap_seconds=OVERLAP_SECONDS, sample_rate=SAMPLE_RATE):
+    """
+    Split samples on silence boundaries into segments that overlap their
+    neighbours by overlap_seconds on each side.
+    Returns a list of (start_sample, end_sample) tuples.
+    """
+    cuts = find_split_points(samples, segment_seconds=segment_seconds, sample_rate=sample_rate)
+    bounds = [0] + cuts + [len(samples)]
+    overlap = int(overlap_seconds * sample_rate)
+    segments = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        segments.append((max(0, start - overlap), min(len(samples), end + overlap)))
+    return segments
+
+def _normalize_word(word):
+    return re.sub(r"[^\w]", "", word.lower())
+
+def merge_overlapping_text(left, right, max_words=MAX_OVERLAP_WORDS):
+    """
+    Join two consecutive segment transcripts, dropping the words the
+    overlapping audio caused to appear at the end of left and again at the
+    start of right. Only a run that ends left and starts right counts, so a
+    common phrase elsewhere near the seam never removes text.
+    """
+    left_words = left.split()
+    right_words = right.split()
+    if not left_words:
+        return right.strip()
+    if not right_words:
+        return left.strip()
+
+    tail = [_normalize_word(w) for w in left_words[-max_words:]]
+    head = [_normalize_word(w) for w in right_words[:max_words]]
+    for size in range(min(len(tail), len(head)), 0, -1):
+        if tail[-size:] == head[:size] and any(tail[-size:]):
+            return " ".join(left_words + right_words[size:])
+    return " ".join(left_words + right_words)
+
+def stitch_transcripts(texts):
+    """
+    Merge the ordered segment transcripts into one text.
+    """
+    merged = ""
+    for text in texts:
+        merged = merge_overlapping_text(merged, text.replace("\n", " "))
+    return merged
+
+def transcribe_long_audio(audio_path, pool, model_path=DEFAULT_MODEL,
+                          segment_seconds=SEGMENT_SECONDS, overlap_seconds=OVERLAP_SECONDS, progress=None, vad=False,
+                          cancelled=None, on_segments=None, diarize=False, language=DEFAULT_LANGUAGE):
+    """
+    Transcribe a long file by sending its silence-aligned segments to all the
+    workers of `pool` (a server_pool.ServerPool or StaticPool) at the same
+    time, then stitching the texts in order.
+    `progress(done, total)` is called once the segment count is known and
+    as segments finish. When `cancelled()` returns True, segments not yet
+    sent are skipped and TranscriptionCancelled is raised.
+    With vad=True, silence is removed before splitting.
+    Timestamped segments are returned under "segments" and, when
+    `on_segments(list)` is given, handed over in recording order as soon as
+    every earlier part has finished, so writers can stream them to disk.
+    With diarize=True, speaker diarization runs on the same decoded audio
+    alongside the requests, and segments are labelled (and handed to
+    on_segments) once it has finished.
+    With language="auto" the language is detected once from the first
+    seconds of speech and every part is transcribed as that language.
+    Recordings longer than WINDOWED_MIN_SECONDS (without diarization, which
+    needs the whole recording) are decoded window by window
+    (audio_io.audio_windows) and only a few parts per worker are in flight,
+    so memory stays flat however long the file is; the segment total passed
+    to `progress` is then an estimate until the last window is read.
+    Returns a dict shaped like the server response.
+    """
+    if language == AUTO:
+        language, _ = detect_language(audio_path, pool, model_path=model_path)
+    diarizer = None
+    turns = None
+    if diarize or audio_duration(audio_path) <= WINDOWED_MIN_SECONDS:
+        samples = load_audio(audio_path)
+        if diarize:
+            diarizer = ThreadPoolExecutor(max_workers=1)
+            turns = diarizer.submit(diarize_speakers, samples)
+        windows = iter([(0, samples)])
+        estimate = None
+    else:
+        windows = audio_windows(audio_path)
+        estimate = int(math.ceil(audio_duration(audio_path) / segment_seconds))
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+
+    def split_windows():
+        """
+        Yield one part per silence-aligned segment of every window:
+        (index, window_start, window_samples, time_map, start, end, last).
+        """
+        index = 0
+        for window_start, window in windows:
+            time_map = None
+            if vad:
+                window, time_map = remove_silence(window)
+            bounds = split_audio(window, segment_seconds=segment_seconds, overlap_seconds=overlap_seconds)
+            for i, (start, end) in enumerate(bounds):
+                yield index, window_start, window, time_map, start, end, i == len(bounds) - 1
+                index += 1
+
+    parts = split_windows()
+    if estimate is None:
+        parts = list(parts)
+        total = [len(parts)]
+    else:
+        total = [estimate]
+    finished_parts = {}
+    next_part = [0]
+    order_lock = threading.Lock()
+
+    def timed_segments(part, result):
+        """
+        The part's segments on the recording's timeline, keeping only those
+        centred in the stretch this part owns (not the overlap shared with
+        its neighbours).
+        """
+        _, window_start, window, time_map, start, end, last = part
+        owned_start = start + overlap if start > 0 else 0
+        owned_end = end - overlap if end < len(window) else len(window)
+        kept = []
+        for segment in result.get("segments", []):
+            middle = start + (segment.get("start", 0.0) + segment.get("end", 0.0)) / 2 * SAMPLE_RATE
+            if owned_start <= middle < owned_end or (last and middle >= owned_end):
+                segment = dict(segment, start=segment.get("start", 0.0) + start / SAMPLE_RATE,
+                               end=segment.get("end", 0.0) + start / SAMPLE_RATE)
+                kept.append(segment)
+        if time_map is not None:
+            time_map.remap_segments(kept)
+        if window_start:
+            kept = [dict(segment, start=segment["start"] + window_start / SAMPLE_RATE,
+                         end=segment["end"] + window_start / SAMPLE_RATE) for segment in kept]
+        return kept
+
+    def flush():
+        """
+        Hand finished parts to on_segments strictly in order (call with
+        order_lock held). With diarization, parts wait until the speaker
+        turns are known.
+        """
+        if turns is not None and not turns.done():
+            return
+        while next_part[0] in finished_parts:
+            if turns is not None:
+                assign_speakers(finished_parts[next_part[0]], turns.result())
+            if on_segments is not None:
+                on_segments(finished_parts[next_part[0]])
+            next_part[0] += 1
+
+    def deliver(index, kept):
+        with order_lock:
+            finished_parts[index] = kept
+            flush()
+
+    done = [0]
+    done_lock = threading.Lock()
+    if progress is not None:
+        progress(0, total[0])
+
+    def run_segment(part):
+        if cancelled is not None and cancelled():
+            raise TranscriptionCancelled()
+        index, _, window, _, start, end, _ = part
+        payload = ("segment.wav", wav_bytes(window[start:end]), "audio/wav")
+        with pool.worker() as worker:
+            result = post_inference(payload, model_path=model_path, host=worker.host, port=worker.port,
+                                    language=language, fields={"response_format": "verbose_json"})
+        with metrics.stage("postprocess"):
+            deliver(index, timed_segments(part, result))
+        with done_lock:
+            done[0] += 1
+            finished = done[0]
+        if progress is not None:
+            progress(finished, max(total[0], finished))
+        return result.get("text", "")
+
+    # At most two parts per worker are queued, so windows are decoded only
+    # as fast as the servers take them
+    slots = threading.BoundedSemaphore(max(1, pool.size) * 2)
+    failed = threading.Event()
+
+    def part_done(future):
+        slots.release()
+        if not future.cancelled() and future.exception() is not None:
+            failed.set()
+
+    futures = []
+    try:
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            try:
+                for part in parts:
+                    slots.acquire()
+                    if failed.is_set():
+                        slots.release()
+                        break
+                    future = executor.submit(run_segment, part)
+                    future.add_done_callback(part_done)
+                    futures.append(future)
+                else:
+                    total[0] = len(futures)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                if hasattr(parts, "close"):
+                    parts.close()
+        texts = [future.result() for future in futures]
+        if progress is not None and estimate is not None:
+            progress(len(futures), len(futures))
+        if turns is not None:
+            turns.result()
+            with order_lock:
+                flush()
+    finally:
+        if diarizer is not None:
+            diarizer.shutdown(wait=False)
+
+    with metrics.stage("postprocess"):
+        text = stitch_transcripts(texts)
+    return {"text": text, "segments": [segment for index in range(len(futures)) for segment in finished_parts[index]],
+            "language": language, "model": model_path}
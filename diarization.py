@@ -0,0 +1,301 @@
+import importlib.util
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from metrics import timed
+from vad import detect_speech
+
+WINDOW_SECONDS = 1.5
+HOP_SECONDS = 0.75
+FRAME_SECONDS = 0.025
+FRAME_HOP_SECONDS = 0.01
+N_FFT = 512
+N_MELS = 40
+N_MFCC = 20
+MAX_SPEAKERS = 8
+MAX_CLUSTER_WINDOWS = 1500
+MIN_SEPARATION = 3.0
+MIN_CLUSTER_WINDOWS = 3
+BLOCK_FRAMES = 6000
+
+# Speaker diarization that runs fully offline on the CPU. Speaker
+# embeddings come from Resemblyzer's bundled voice encoder when it is
+# installed (pip install resemblyzer; the weights ship with the package);
+# otherwise MFCC statistics computed with NumPy are used. Windows of speech
+# are grouped by spectral clustering, which also estimates the number of
+# speakers when it is not given. Resemblyzer pulls in torch, so it is
+# only imported when speakers are first requested.
+HAVE_RESEMBLYZER = importlib.util.find_spec("resemblyzer") is not None
+
+_encoder = None
+
+def _mel_filterbank(sample_rate=SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS):
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10 ** (mel / 2595.0) - 1.0)
+
+    mel_points = np.linspace(hz_to_mel(0.0), hz_to_mel(sample_rate / 2), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mel_points) / sample_rate).astype(int)
+    filters = np.zeros((n_mels, n_fft // 2 + 1), dtype=np.float32)
+    for i in range(1, n_mels + 1):
+        left, center, right = bins[i - 1], bins[i], bins[i + 1]
+        if center > left:
+            filters[i - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            filters[i - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+    return filters
+
+def _dct_matrix(n_out=N_MFCC, n_in=N_MELS):
+    n = np.arange(n_in)
+    k = np.arange(n_out)[:, None]
+    return (np.cos(np.pi * k * (2 * n + 1) / (2 * n_in)) * np.sqrt(2.0 / n_in)).astype(np.float32)
+
+def mfcc(samples, sample_rate=SAMPLE_RATE):
+    """
+    MFCCs (frames x N_MFCC) of int16 samples, computed in blocks so the
+    power spectrum of a long recording is never held in memory at once.
+    """
+    frame_len = int(FRAME_SECONDS * sample_rate)
+    hop = int(FRAME_HOP_SECONDS * sample_rate)
+    n_frames = max(0, 1 + (len(samples) - frame_len) // hop)
+    if n_frames == 0:
+        return np.zeros((0, N_MFCC), dtype=np.float32)
+
+    window = np.hamming(frame_len).astype(np.float32)
+    filters = _mel_filterbank(sample_rate)
+    dct = _dct_matrix()
+    signal = samples.astype(np.float32) / 32768.0
+    out = np.empty((n_frames, N_MFCC), dtype=np.float32)
+    for first in range(0, n_frames, BLOCK_FRAMES):
+        count = min(BLOCK_FRAMES, n_frames - first)
+        index = (first + np.arange(count))[:, None] * hop + np.arange(frame_len)
+        frames = signal[index] * window
+        power = np.abs(np.fft.rfft(frames, N_FFT)) ** 2
+        out[first:first + count] = np.log(power @ filters.T + 1e-10) @ dct.T
+    return out
+
+def speech_windows(regions, sample_rate=SAMPLE_RATE):
+    """
+    (start, end) sample ranges of fixed-length windows covering the speech
+    regions; regions shorter than a window become one window.
+    """
+    window = int(WINDOW_SECONDS * sample_rate)
+    hop = int(HOP_SECONDS * sample_rate)
+    windows = []
+    for start, end in regions:
+        if end - start <= window:
+            windows.append((start, end))
+            continue
+        position = start
+        while position + window < end:
+            windows.append((position, position + window))
+            position += hop
+        windows.append((end - window, end))
+    return windows
+
+def window_features(samples, windows, sample_rate=SAMPLE_RATE):
+    """
+    Raw per-window speaker features: voice-encoder embeddings, or the mean
+    and spread of each MFCC except c0 (loudness).
+    """
+    global _encoder
+    if HAVE_RESEMBLYZER:
+        if _encoder is None:
+            from resemblyzer import VoiceEncoder
+            _encoder = VoiceEncoder("cpu", verbose=False)
+        signal = samples.astype(np.float32) / 32768.0
+        return np.array([_encoder.embed_utterance(signal[start:end]) for start, end in windows])
+    features = mfcc(samples, sample_rate)
+    hop = int(FRAME_HOP_SECONDS * sample_rate)
+    rows = []
+    for start, end in windows:
+        frames = features[start // hop:max(start // hop + 1, end // hop)]
+        rows.append(np.concatenate([frames[:, 1:].mean(axis=0), frames[:, 1:].std(axis=0)]))
+    return np.array(rows, dtype=np.float32)
+
+def embed(features):
+    """
+    Unit-length embeddings for cosine affinity. MFCC statistics are
+    standardized per recording first so no single coefficient dominates.
+    """
+    if not HAVE_RESEMBLYZER:
+        features = (features - features.mean(axis=0)) / (features.std(axis=0) + 1e-6)
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.maximum(norms, 1e-9)
+
+def separation(a, b):
+    """
+    RMS over dimensions of the difference of means in units of the pooled
+    standard deviation; around 1 for two halves of one voice. A side with
+    a single window has no spread of its own and borrows the other's.
+    """
+    var_a = a.var(axis=0) if len(a) > 1 else b.var(axis=0)
+    var_b = b.var(axis=0) if len(b) > 1 else var_a
+    pooled = np.sqrt((var_a + var_b) / 2) + 1e-6
+    return float(np.sqrt(np.mean(((a.mean(axis=0) - b.mean(axis=0)) / pooled) ** 2)))
+
+def merge_similar(features, labels, min_separation=MIN_SEPARATION, min_windows=MIN_CLUSTER_WINDOWS):
+    """
+    Merge the least separated pair of clusters until every pair is at least
+    min_separation apart. Spectral clustering always splits something, so
+    this is what lets a single-speaker recording stay one speaker.
+    Clusters of fewer than min_windows windows are too small to measure and
+    are first folded into the nearest larger cluster.
+    """
+    labels = labels.copy()
+    clusters, counts = np.unique(labels, return_counts=True)
+    large = clusters[counts >= min_windows]
+    if 0 < len(large) < len(clusters):
+        scaled = (features - features.mean(axis=0)) / (features.std(axis=0) + 1e-6)
+        centers = np.array([scaled[labels == c].mean(axis=0) for c in large])
+        for c in clusters[counts < min_windows]:
+            members = labels == c
+            distances = ((scaled[members][:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+            labels[members] = large[distances.argmin(axis=1)]
+    while True:
+        clusters = list(np.unique(labels))
+        if len(clusters) < 2:
+            return labels
+        scores = [(separation(features[labels == a], features[labels == b]), a, b)
+                  for i, a in enumerate(clusters) for b in clusters[i + 1:]]
+        score, a, b = min(scores)
+        if score >= min_separation:
+            return labels
+        labels[labels == b] = a
+
+def _kmeans(points, k, iterations=50, seed=0):
+    """
+    k-means with k-means++ seeding; returns a label per point.
+    """
+    rng = np.random.default_rng(seed)
+    centers = [points[rng.integers(len(points))]]
+    for _ in range(1, k):
+        distances = np.min([np.sum((points - c) ** 2, axis=1) for c in centers], axis=0)
+        total = distances.sum()
+        centers.append(points[rng.choice(len(points), p=distances / total)] if total > 0 else points[rng.integers(len(points))])
+    centers = np.array(centers)
+    labels = np.zeros(len(points), dtype=int)
+    for iteration in range(iterations):
+        distances = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+        if iteration > 0 and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for j in range(k):
+            if np.any(labels == j):
+                centers[j] = points[labels == j].mean(axis=0)
+    return labels
+
+def spectral_cluster(embeddings, num_speakers=None, max_speakers=MAX_SPEAKERS, keep=0.3):
+    """
+    Cluster unit-length embeddings. The cosine affinity matrix is pruned to
+    each row's strongest `keep` fraction, and the number of speakers is
+    taken from the largest eigengap of its normalized Laplacian unless
+    given.
+    """
+    n = len(embeddings)
+    if n < 3:
+        return np.zeros(n, dtype=int)
+    affinity = np.clip(embeddings @ embeddings.T, 0.0, 1.0)
+    kept = max(2, int(keep * n))
+    threshold = -np.partition(-affinity, kept - 1, axis=1)[:, kept - 1:kept]
+    affinity = np.where(affinity >= threshold, affinity, 0.0)
+    affinity = np.maximum(affinity, affinity.T)
+
+    degree = affinity.sum(axis=1)
+    inv_sqrt = 1.0 / np.sqrt(np.maximum(degree, 1e-9))
+    laplacian = np.eye(n) - inv_sqrt[:, None] * affinity * inv_sqrt[None, :]
+    eigenvalues, eigenvectors = np.linalg.eigh(laplacian)
+
+    if num_speakers is None:
+        limit = min(max_speakers, n - 1)
+        gaps = np.diff(eigenvalues[:limit + 1])
+        num_speakers = int(np.argmax(gaps)) + 1
+    num_speakers = max(1, min(num_speakers, n))
+    if num_speakers == 1:
+        return np.zeros(n, dtype=int)
+
+    spectral = eigenvectors[:, :num_speakers]
+    spectral = spectral / np.maximum(np.linalg.norm(spectral, axis=1, keepdims=True), 1e-9)
+    return _kmeans(spectral, num_speakers)
+
+def _smooth(labels, width=3):
+    """
+    Majority vote over neighbouring windows to remove single-window flicker.
+    """
+    if len(labels) < width:
+        return labels
+    smoothed = labels.copy()
+    half = width // 2
+    for i in range(half, len(labels) - half):
+        values, counts = np.unique(labels[i - half:i + half + 1], return_counts=True)
+        smoothed[i] = values[np.argmax(counts)]
+    return smoothed
+
+@timed("diarize")
+def diarize(samples, sample_rate=SAMPLE_RATE, num_speakers=None, regions=None):
+    """
+    Return speaker turns as (start_seconds, end_seconds, speaker) tuples,
+    speakers named SPEAKER_1, SPEAKER_2, ... in order of first appearance.
+    """
+    if regions is None:
+        regions = detect_speech(samples, sample_rate)
+    windows = speech_windows(regions, sample_rate)
+    if not windows:
+        return []
+    features = window_features(samples, windows, sample_rate)
+    embeddings = embed(features)
+
+    # Cluster a bounded, evenly spaced subset, then give every window the
+    # label of the nearest cluster centre
+    if len(embeddings) > MAX_CLUSTER_WINDOWS:
+        subset = np.linspace(0, len(embeddings) - 1, MAX_CLUSTER_WINDOWS).astype(int)
+    else:
+        subset = np.arange(len(embeddings))
+    subset_labels = spectral_cluster(embeddings[subset], num_speakers)
+    centers = np.array([embeddings[subset][subset_labels == j].mean(axis=0) for j in np.unique(subset_labels)])
+    labels = np.argmax(embeddings @ centers.T, axis=1)
+    if num_speakers is None:
+        labels = merge_similar(features, labels)
+    labels = _smooth(labels)
+
+    names = {}
+    turns = []
+    for (start, end), label in zip(windows, labels):
+        speaker = names.setdefault(label, f"SPEAKER_{len(names) + 1}")
+        start, end = start / sample_rate, end / sample_rate
+        if turns and turns[-1][2] == speaker and start <= turns[-1][1] + HOP_SECONDS:
+            turns[-1] = (turns[-1][0], max(turns[-1][1], end), speaker)
+        else:
+            if turns and start < turns[-1][1]:
+                # Overlapping windows of different speakers: split the overlap
+                middle = (start + turns[-1][1]) / 2
+                turns[-1] = (turns[-1][0], middle, turns[-1][2])
+                start = middle
+            turns.append((start, end, speaker))
+    return turns
+
+def assign_speakers(segments, turns):
+    """
+    Set segment["speaker"] (dicts with start/end in seconds) to the speaker
+    whose turns overlap it the most, or the nearest turn if none does.
+    """
+    if not turns:
+        return segments
+    for segment in segments:
+        start, end = segment.get("start", 0.0), segment.get("end", 0.0)
+        overlap = {}
+        for turn_start, turn_end, speaker in turns:
+            if turn_start >= end:
+                break
+            shared = min(end, turn_end) - max(start, turn_start)
+            if shared > 0:
+                overlap[speaker] = overlap.get(speaker, 0.0) + shared
+        if overlap:
+            segment["speaker"] = max(overlap, key=overlap.get)
+        else:
+            middle = (start + end) / 2
+            segment["speaker"] = min(turns, key=lambda t: min(abs(t[0] - middle), abs(t[1] - middle)))[2]
+    return segments
@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from audio_io import SAMPLE_RATE, stream_audio, wav_bytes
+from chunked_transcription import transcribe_long_audio
+from language_routing import AUTO, detect_language
+from server_pool import StaticPool
+from whisper_server import DEFAULT_LANGUAGE, DEFAULT_MODEL, PROMPT_WORDS, WINDOWED_MIN_SECONDS, post_inference
+
+BLOCK_SECONDS = 30
+OVERLAP_SECONDS = 5
+STATE_VERSION = 1
+
+# Re-transcription of recordings that keep growing or were edited:
+#   python incremental_transcription.py capture.wav --server 127.0.0.1:8080 -o capture.txt
+#   python incremental_transcription.py capture.wav --server 127.0.0.1:8080 -o capture.txt --watch 60
+#
+# The decoded audio is fingerprinted in 30-second blocks. The fingerprints
+# and the transcript are kept per file, and on the next run only blocks
+# whose fingerprint changed (or that are new) are sent to the server, with
+# a few seconds of unchanged audio on each side and the preceding words as
+# the prompt. Their segments replace the old ones for that stretch. A
+# refresh of an appended recording therefore costs the new minutes plus
+# the last, previously partial block. Edits that shift the audio (cuts,
+# inserts) make everything after them differ and are re-transcribed.
+
+def default_state_dir():
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "speech-to-text", "incremental")
+
+def block_fingerprint(samples):
+    return hashlib.blake2b(samples.tobytes(), digest_size=16).hexdigest()
+
+def blocks(audio_path, block_samples):
+    """
+    Yield consecutive blocks of exactly block_samples decoded samples (the
+    last one shorter), whatever block sizes the decoder produces.
+    """
+    buffer = np.empty(block_samples, dtype=np.int16)
+    length = 0
+    for chunk in stream_audio(audio_path):
+        while len(chunk):
+            take = min(len(chunk), block_samples - length)
+            buffer[length:length + take] = chunk[:take]
+            length += take
+            chunk = chunk[take:]
+            if length == block_samples:
+                yield buffer.copy()
+                length = 0
+    if length:
+        yield buffer[:length].copy()
+
+def scan(audio_path, old_fingerprints, block_samples, max_dirty_samples):
+    """
+    Decode the file once and compare its block fingerprints with the stored
+    ones. Returns (fingerprints, total_samples, kept), where `kept` maps the
+    index of every changed block, and of the unchanged blocks next to them
+    (for overlap context), to its samples; kept is None when more than
+    max_dirty_samples changed and the file is better transcribed in full.
+    """
+    fingerprints = []
+    kept = {}
+    dirty_samples = 0
+    total = 0
+    previous = None
+    previous_dirty = False
+    for index, block in enumerate(blocks(audio_path, block_samples)):
+        fingerprint = block_fingerprint(block)
+        fingerprints.append(fingerprint)
+        total += len(block)
+        dirty = index >= len(old_fingerprints) or old_fingerprints[index] != fingerprint
+        if kept is not None:
+            if dirty:
+                dirty_samples += len(block)
+                kept[index] = block
+                if previous is not None:
+                    kept.setdefault(index - 1, previous)
+                if dirty_samples > max_dirty_samples:
+                    kept = None
+            elif previous_dirty:
+                kept[index] = block
+        previous, previous_dirty = block, dirty
+    return fingerprints, total, kept
+
+def dirty_regions(fingerprints, old_fingerprints):
+    """
+    (first, end) block ranges whose fingerprints differ from the stored ones.
+    """
+    regions = []
+    for index, fingerprint in enumerate(fingerprints):
+        if index < len(old_fingerprints) and old_fingerprints[index] == fingerprint:
+            continue
+        if regions and regions[-1][1] == index:
+            regions[-1][1] = index + 1
+        else:
+            regions.append([index, index + 1])
+    return [tuple(region) for region in regions]
+
+def splice(segments, new_segments, start, end):
+    """
+    Replace the transcript between start and end seconds: old segments
+    centred in that stretch give way to the new segments centred in it.
+    """
+    def inside(segment):
+        return start <= (segment["start"] + segment["end"]) / 2 < end
+
+    kept = [s for s in segments if not inside(s)] + [s for s in new_segments if inside(s)]
+    return sorted(kept, key=lambda s: s["start"])
+
+def prompt_before(segments, seconds, prompt_words=PROMPT_WORDS):
+    words = " ".join(s.get("text", "").strip() for s in segments if s["end"] <= seconds).split()
+    return " ".join(words[-prompt_words:])
+
+class IncrementalTranscriber:
+    """
+    Keeps per-file block fingerprints and transcripts in `state_dir` and
+    brings a file's transcript up to date by transcribing only what changed
+    since the last run (see the module comment). Work goes to the servers
+    of `pool` (a server_pool pool), changed stretches in parallel.
+    """
+    def __init__(self, pool, model_path=DEFAULT_MODEL, language=DEFAULT_LANGUAGE, state_dir=None,
+                 block_seconds=BLOCK_SECONDS, overlap_seconds=OVERLAP_SECONDS, max_dirty_seconds=WINDOWED_MIN_SECONDS):
+        self.pool = pool
+        self.model_path = model_path
+        self.language = language
+        self.state_dir = state_dir or default_state_dir()
+        self.block_samples = int(block_seconds * SAMPLE_RATE)
+        self.overlap = int(overlap_seconds * SAMPLE_RATE)
+        self.max_dirty_samples = int(max_dirty_seconds * SAMPLE_RATE)
+        os.makedirs(self.state_dir, exist_ok=True)
+
+    def _state_path(self, audio_path):
+        key = json.dumps({"path": os.path.abspath(audio_path), "model": os.path.basename(self.model_path),
+                          "language": self.language, "block": self.block_samples}, sort_keys=True)
+        return os.path.join(self.state_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def load_state(self, audio_path):
+        try:
+            with open(self._state_path(audio_path), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return state if state.get("version") == STATE_VERSION else None
+
+    def save_state(self, audio_path, state):
+        path = self._state_path(audio_path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def forget(self, audio_path):
+        try:
+            os.remove(self._state_path(audio_path))
+        except OSError:
+            pass
+
+    def _transcribe_region(self, kept, first, end, language, prompt):
+        """
+        Transcribe blocks first..end-1 with overlap context from their
+        neighbours. Returns segments on the file's timeline.
+        """
+        before = kept[first - 1][-self.overlap:] if first - 1 in kept and self.overlap else np.zeros(0, np.int16)
+        after = kept[end][:self.overlap] if end in kept and self.overlap else np.zeros(0, np.int16)
+        audio = np.concatenate([before] + [kept[i] for i in range(first, end)] + [after])
+        offset = (first * self.block_samples - len(before)) / SAMPLE_RATE
+        fields = {"response_format": "verbose_json"}
+        if prompt:
+            fields["prompt"] = prompt
+        with self.pool.worker() as worker:
+            result = post_inference(("region.wav", wav_bytes(audio), "audio/wav"), model_path=self.model_path,
+                                    host=worker.host, port=worker.port, language=language, fields=fields)
+        return [dict(s, start=s.get("start", 0.0) + offset, end=s.get("end", 0.0) + offset)
+                for s in result.get("segments", [])]
+
+    def transcribe(self, audio_path):
+        """
+        Return the up-to-date result ({"text", "segments", "language",
+        "model", "incremental"}) for the file; "incremental" reports the
+        seconds transcribed and reused and the number of changed stretches.
+        """
+        stat = os.stat(audio_path)
+        state = self.load_state(audio_path)
+        if state and state["size"] == stat.st_size and state["mtime_ns"] == stat.st_mtime_ns:
+            return self._result(state, transcribed=0.0, regions=0)
+
+        old_fingerprints = state["fingerprints"] if state else []
+        segments = state["segments"] if state else []
+        with metrics.stage("fingerprint"):
+            # Nothing to reuse on a first run, so no samples are kept
+            fingerprints, total, kept = scan(audio_path, old_fingerprints, self.block_samples,
+                                             self.max_dirty_samples if state else 0)
+
+        language = state.get("detected") if state else None
+        if language is None:
+            language = detect_language(audio_path, self.pool, self.model_path)[0] if self.language == AUTO else self.language
+
+        regions = dirty_regions(fingerprints, old_fingerprints)
+        total_seconds = total / SAMPLE_RATE
+        if kept is None:
+            # New or largely changed file: the chunked path spreads it over the pool
+            result = transcribe_long_audio(audio_path, self.pool, model_path=self.model_path, language=language)
+            segments = result["segments"]
+            transcribed = total_seconds
+        else:
+            def run(region):
+                first, end = region
+                start = first * self.block_samples / SAMPLE_RATE
+                return self._transcribe_region(kept, first, end, language, prompt_before(segments, start))
+
+            with ThreadPoolExecutor(max_workers=max(1, min(len(regions), self.pool.size))) as executor:
+                results = list(executor.map(run, regions))
+            transcribed = 0.0
+            for (first, end), new_segments in zip(regions, results):
+                start = first * self.block_samples / SAMPLE_RATE
+                # The stretch after the last block is open-ended: nothing old lies there
+                stop = float("inf") if end == len(fingerprints) else end * self.block_samples / SAMPLE_RATE
+                segments = splice(segments, new_segments, start, stop)
+                transcribed += min(stop, total_seconds) - start
+            # A file that got shorter loses the transcript past its new end
+            segments = [s for s in segments if s["start"] < total_seconds]
+
+        state = {"version": STATE_VERSION, "source": os.path.abspath(audio_path), "size": stat.st_size,
+                 "mtime_ns": stat.st_mtime_ns, "samples": total, "fingerprints": fingerprints,
+                 "segments": segments, "detected": language if self.language == AUTO else None,
+                 "language": language, "updated": time.time()}
+        self.save_state(audio_path, state)
+        metrics.log_event("incremental", path=audio_path, regions=len(regions), transcribed_seconds=round(transcribed, 1),
+                          audio_seconds=round(total_seconds, 1))
+        return self._result(state, transcribed=transcribed, regions=len(regions))
+
+    def _result(self, state, transcribed, regions):
+        segments = state["segments"]
+        total_seconds = state["samples"] / SAMPLE_RATE
+        return {"text": " ".join(s.get("text", "").strip() for s in segments if s.get("text", "").strip()),
+                "segments": segments, "language": state["language"], "model": self.model_path,
+                "incremental": {"transcribed_seconds": transcribed,
+                                "reused_seconds": max(0.0, total_seconds - transcribed), "regions": regions}}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep the transcript of a growing or edited recording up to date.")
+    parser.add_argument("input", help="audio file")
+    parser.add_argument("--server", nargs="+", default=["127.0.0.1:8080"], metavar="HOST:PORT",
+                        help="running whisper-server(s)")
+    parser.add_argument("-o", "--output", help="transcript file (default: <input>.txt)")
+    parser.add_argument("-l", "--language", default=DEFAULT_LANGUAGE, help="language code or 'auto'")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL, help="model the servers run (keys the saved state)")
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="check the file again every SECONDS")
+    parser.add_argument("--reset", action="store_true", help="forget the saved state and start over")
+    args = parser.parse_args(argv)
+
+    endpoints = []
+    for server in args.server:
+        host, _, port = server.rpartition(":")
+        endpoints.append((host or "127.0.0.1", int(port)))
+    transcriber = IncrementalTranscriber(StaticPool(endpoints), model_path=args.model, language=args.language)
+    if args.reset:
+        transcriber.forget(args.input)
+    output = args.output or os.path.splitext(args.input)[0] + ".txt"
+
+    written = None
+    try:
+        while True:
+            started = time.time()
+            result = transcriber.transcribe(args.input)
+            info = result["incremental"]
+            if result["text"] != written:
+                tmp_path = output + ".part"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(result["text"] + "\n")
+                os.replace(tmp_path, output)
+                written = result["text"]
+            print(f"{info['transcribed_seconds']:.0f}s transcribed, {info['reused_seconds']:.0f}s reused "
+                  f"({info['regions']} changed stretch(es)) in {time.time() - started:.1f}s")
+            if not args.watch:
+                return 0
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,599 @@
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import argparse
+import threading
+import requests
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+from audio_io import audio_duration
+from autotune import ensure_settings, pool_options
+from chunked_transcription import TranscriptionCancelled, transcribe_long_audio
+from language_routing import LanguageRouter, language_launchers
+from model_manager import choose_model, load_report
+from scheduler import BULK, NORMAL, PRIORITIES, Scheduler, priority_rank
+from server_pool import HYBRID, ServerPool, hybrid_pool, whisper_launchers
+from whisper_server import DEFAULT_LANGUAGE, DEFAULT_MODEL
+
+# Local transcription service shared by GUIs and tools:
+#   python job_service.py --port 8000 --servers 2
+#   python job_service.py --language-model en=ggml-large-v3-turbo-q8_0.bin   (extra pool warmed for English)
+#   python job_service.py --variant ggml-large-v3-turbo-q5_0.bin --latency-budget 300
+#
+#   POST   /jobs              {"path": "C:/rec/a.mp3", "language": "auto", "vad": false, "diarize": false,
+#                              "model": "ggml-...bin" or "latency_budget": 120,
+#                              "priority": "interactive" | "normal" | "bulk", "deadline": 600 (seconds from now)}
+#          /jobs?filename=a.mp3  with the audio as the request body   -> {"id": ...}
+#   GET    /jobs              list of jobs
+#   GET    /jobs/<id>         status and progress (segments done/total)
+#   GET    /jobs/<id>/result  transcription result
+#   DELETE /jobs/<id>         cancel
+#   GET    /metrics           Prometheus metrics (stage timings, counters, pool occupancy)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+def default_data_dir():
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "speech-to-text", "jobs")
+
+class JobStore:
+    """
+    SQLite-backed job table, so queued and interrupted jobs survive a
+    restart of the service.
+    """
+    COLUMNS = ("id", "path", "options", "status", "done", "total", "error", "result", "created", "started", "finished")
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, path TEXT, options TEXT, status TEXT, "
+            "done INTEGER, total INTEGER, error TEXT, result TEXT, created REAL, started REAL, finished REAL, "
+            "priority INTEGER, deadline REAL)"
+        )
+        # Tables created before priorities existed get the columns, filled in from the options
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "priority" not in existing:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER")
+            self._db.execute("ALTER TABLE jobs ADD COLUMN deadline REAL")
+            for job_id, options in self._db.execute("SELECT id, options FROM jobs").fetchall():
+                options = json.loads(options or "{}")
+                self._db.execute("UPDATE jobs SET priority = ?, deadline = ? WHERE id = ?",
+                                 (PRIORITIES.get(options.get("priority"), PRIORITIES[NORMAL]), options.get("deadline"), job_id))
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, deadline, created)")
+        # Jobs cut off by a restart go back to the queue
+        self._db.execute("UPDATE jobs SET status = ?, done = 0 WHERE status = ?", (QUEUED, RUNNING))
+        self._db.commit()
+
+    def _row(self, row):
+        job = dict(zip(self.COLUMNS, row))
+        job["options"] = json.loads(job["options"] or "{}")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def add(self, path, options):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, path, options, status, done, total, created, priority, deadline) "
+                "VALUES (?, ?, ?, ?, 0, 0, ?, ?, ?)",
+                (job_id, path, json.dumps(options), QUEUED, time.time(),
+                 priority_rank(options.get("priority", NORMAL)), options.get("deadline")),
+            )
+            self._db.commit()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def list(self, limit=200):
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs ORDER BY created DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def claim_next(self, bulk=True):
+        """
+        Mark the most urgent queued job as running and return it, or None:
+        overdue jobs first, then by priority class, earliest deadline and
+        age. bulk=False leaves bulk jobs in the queue.
+        """
+        now = time.time()
+        where = "status = ?" if bulk else "status = ? AND priority != ?"
+        params = (QUEUED,) if bulk else (QUEUED, PRIORITIES[BULK])
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE {where} "
+                "ORDER BY deadline IS NULL OR deadline > ?, priority, deadline IS NULL, deadline, created LIMIT 1",
+                (*params, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE jobs SET status = ?, started = ? WHERE id = ?", (RUNNING, time.time(), row[0]))
+            self._db.commit()
+        job = self._row(row)
+        job["status"] = RUNNING
+        return job
+
+    def update(self, job_id, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"], ensure_ascii=False)
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job. Returns the job's new status, or
+        None if it does not exist.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row[0] in (QUEUED, RUNNING):
+                self._db.execute("UPDATE jobs SET status = ?, finished = ? WHERE id = ?", (CANCELLED, time.time(), job_id))
+                self._db.commit()
+                return CANCELLED
+            return row[0]
+
+class JobRunner:
+    """
+    Runs queued jobs on the shared server pool (running `model`),
+    `concurrency` at a time, with one runner kept free of bulk jobs.
+    Each pool sits behind a scheduler.Scheduler, so the parts of running
+    jobs get workers by priority class, deadline and audio length.
+    With a language_routing.LanguageRouter, each job goes to the pool for
+    its (detected) language instead. `model_pools` maps model file names
+    to warmed pools; a job names one of them, or gives a latency budget
+    (default: `latency_budget`) and the most accurate model expected to
+    meet it is taken from the model_manager report.
+    """
+    def __init__(self, store, pool, concurrency=1, poll_interval=0.5, router=None, model=DEFAULT_MODEL,
+                 model_pools=None, report=None, latency_budget=None):
+        self.store = store
+        self.pool = pool
+        self.model = model
+        self.router = router
+        self.model_pools = model_pools or {}
+        self.report = report or {}
+        self.latency_budget = latency_budget
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._schedulers = {}
+        self._bulk_running = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._loop, daemon=True) for _ in range(self.concurrency)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def notify(self):
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            with self._lock:
+                # Bulk work never takes the last runner, so an interactive
+                # job is started as soon as it arrives
+                job = self.store.claim_next(bulk=self.concurrency == 1 or self._bulk_running < self.concurrency - 1)
+                bulk = job is not None and job["options"].get("priority") == BULK
+                self._bulk_running += bulk
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self._bulk_running -= bulk
+
+    def scheduler(self, pool):
+        with self._lock:
+            if id(pool) not in self._schedulers:
+                self._schedulers[id(pool)] = Scheduler(pool)
+            return self._schedulers[id(pool)]
+
+    def choose_model(self, path, options):
+        """
+        The model a job asked for or that fits its latency budget, or None
+        for the default routing.
+        """
+        model = options.get("model")
+        if model:
+            if model not in self.model_pools:
+                raise ValueError(f"Model {model} is not loaded (available: {', '.join(sorted(self.model_pools))})")
+            return model
+        budget = options.get("latency_budget") or self.latency_budget
+        if budget and len(self.model_pools) > 1:
+            return choose_model(self.report, audio_duration(path), float(budget), available=self.model_pools)
+        return None
+
+    def _run(self, job):
+        job_id = job["id"]
+        options = job["options"]
+
+        def progress(done, total):
+            self.store.update(job_id, done=done, total=total)
+
+        def cancelled():
+            current = self.store.get(job_id)
+            return current is None or current["status"] == CANCELLED or self._stopping.is_set()
+
+        metrics.observe("job_queue", time.time() - job["created"], job=job_id)
+        started = time.time()
+        try:
+            self.pool.wait_ready()
+            language, pool, model_path = options.get("language") or DEFAULT_LANGUAGE, self.pool, self.model
+            if self.router is not None:
+                language, pool, model_path = self.router.route(job["path"], language)
+            model = self.choose_model(job["path"], options)
+            if model is not None:
+                pool, model_path = self.model_pools[model], model
+            if pool is not self.pool:
+                pool.wait_ready()
+            # Parts of this job compete for workers with those of other jobs
+            pool = self.scheduler(pool).view(options.get("priority") or NORMAL, options.get("deadline"),
+                                             audio_duration(job["path"]))
+            result = transcribe_long_audio(job["path"], pool, model_path=model_path, progress=progress,
+                                           cancelled=cancelled, vad=bool(options.get("vad")),
+                                           diarize=bool(options.get("diarize")), language=language)
+        except TranscriptionCancelled:
+            if self._stopping.is_set() and self.store.get(job_id)["status"] == RUNNING:
+                # Shutting down: leave it for the next start
+                self.store.update(job_id, status=QUEUED, done=0)
+            else:
+                metrics.JOBS.inc(status=CANCELLED)
+            return
+        except Exception as e:
+            self.store.update(job_id, status=FAILED, error=str(e), finished=time.time())
+            metrics.JOBS.inc(status=FAILED)
+            metrics.log_event("job_failed", job=job_id, path=job["path"], error=str(e))
+            return
+        finally:
+            # Uploaded audio is only needed until the job is settled
+            if options.get("spooled") and self.store.get(job_id)["status"] != QUEUED:
+                try:
+                    os.remove(job["path"])
+                except OSError:
+                    pass
+        if self.store.get(job_id)["status"] == RUNNING:
+            self.store.update(job_id, status=DONE, result=result, finished=time.time())
+            metrics.JOBS.inc(status=DONE)
+            metrics.log_event("job_done", job=job_id, path=job["path"], model=model_path, language=language,
+                              seconds=round(time.time() - started, 3))
+
+class JobService:
+    """
+    HTTP front end over JobStore/JobRunner.
+    """
+    def __init__(self, store, runner, spool_dir, host="127.0.0.1", port=8000):
+        self.store = store
+        self.runner = runner
+        self.spool_dir = spool_dir
+        os.makedirs(spool_dir, exist_ok=True)
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_text(self, status, text, content_type):
+                body = text.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                service.handle_get(self)
+
+            def do_POST(self):
+                service.handle_post(self)
+
+            def do_DELETE(self):
+                service.handle_delete(self)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+
+    @staticmethod
+    def public(job, with_result=False):
+        view = {key: job[key] for key in ("id", "path", "status", "done", "total", "error", "created", "started", "finished")}
+        view["progress"] = job["done"] / job["total"] if job["total"] else 0.0
+        view["priority"] = job["options"].get("priority", NORMAL)
+        if with_result:
+            view["result"] = job["result"]
+        return view
+
+    def handle_get(self, request):
+        parts = urlparse(request.path).path.strip("/").split("/")
+        if parts == ["health"]:
+            request.send_json(200, {"status": "ok"})
+        elif parts == ["metrics"]:
+            request.send_text(200, metrics.render(), metrics.CONTENT_TYPE)
+        elif parts == ["jobs"]:
+            request.send_json(200, [self.public(job) for job in self.store.list()])
+        elif len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.store.get(parts[1])
+            if job is None:
+                request.send_json(404, {"error": "no such job"})
+            elif len(parts) == 2:
+                request.send_json(200, self.public(job))
+            elif parts[2] == "result":
+                if job["status"] != DONE:
+                    request.send_json(409, {"error": f"job is {job['status']}", "status": job["status"]})
+                else:
+                    request.send_json(200, job["result"])
+            else:
+                request.send_json(404, {"error": "not found"})
+        else:
+            request.send_json(404, {"error": "not found"})
+
+    def handle_post(self, request):
+        url = urlparse(request.path)
+        if url.path.rstrip("/") != "/jobs":
+            request.send_json(404, {"error": "not found"})
+            return
+        length = int(request.headers.get("Content-Length", 0))
+        content_type = request.headers.get("Content-Type", "")
+        if content_type.startswith("application/json"):
+            try:
+                payload = json.loads(request.rfile.read(length) or b"{}")
+            except ValueError:
+                request.send_json(400, {"error": "invalid JSON"})
+                return
+            if not isinstance(payload, dict):
+                request.send_json(400, {"error": "the JSON body must be an object"})
+                return
+            path = payload.pop("path", None)
+            if not path or not os.path.isfile(path):
+                request.send_json(400, {"error": "'path' must name an audio file readable by the service"})
+                return
+            options = payload
+            if "deadline" in options:
+                try:
+                    options["deadline"] = time.time() + float(options["deadline"])
+                except (TypeError, ValueError):
+                    request.send_json(400, {"error": "'deadline' must be a number of seconds"})
+                    return
+        else:
+            # Raw upload: spool the body to disk in chunks
+            query = parse_qs(url.query)
+            filename = os.path.basename(query.get("filename", ["upload.wav"])[0])
+            path = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}-{filename}")
+            with open(path, "wb") as f:
+                remaining = length
+                while remaining > 0:
+                    chunk = request.rfile.read(min(remaining, 1024 * 1024))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            options = {"vad": query.get("vad", ["false"])[0] == "true",
+                       "diarize": query.get("diarize", ["false"])[0] == "true",
+                       "language": query.get("language", [DEFAULT_LANGUAGE])[0], "spooled": True}
+            if "model" in query:
+                options["model"] = query["model"][0]
+            if "latency_budget" in query:
+                try:
+                    options["latency_budget"] = float(query["latency_budget"][0])
+                except ValueError:
+                    request.send_json(400, {"error": "'latency_budget' must be a number of seconds"})
+                    return
+            if "priority" in query:
+                options["priority"] = query["priority"][0]
+            if "deadline" in query:
+                try:
+                    options["deadline"] = time.time() + float(query["deadline"][0])
+                except ValueError:
+                    request.send_json(400, {"error": "'deadline' must be a number of seconds"})
+                    return
+        try:
+            priority_rank(options.setdefault("priority", NORMAL))
+        except (TypeError, ValueError) as e:
+            request.send_json(400, {"error": str(e)})
+            return
+        job_id = self.store.add(os.path.abspath(path), options)
+        self.runner.notify()
+        request.send_json(202, {"id": job_id, "status": QUEUED})
+
+    def handle_delete(self, request):
+        parts = urlparse(request.path).path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "jobs":
+            request.send_json(404, {"error": "not found"})
+            return
+        status = self.store.cancel(parts[1])
+        if status is None:
+            request.send_json(404, {"error": "no such job"})
+        else:
+            request.send_json(200, {"id": parts[1], "status": status})
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+
+class JobClient:
+    """
+    Small client for the job service.
+    """
+    def __init__(self, url="http://127.0.0.1:8000"):
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+
+    def submit(self, audio_path, vad=False, upload=False, diarize=False, language=DEFAULT_LANGUAGE,
+               model=None, latency_budget=None, priority=NORMAL, deadline=None):
+        """
+        Queue a file. With upload=True the audio is sent in the request
+        body, for services running on another machine. `model` picks one
+        of the service's loaded models; `latency_budget` (seconds) lets the
+        service pick instead. `priority` is "interactive", "normal" or
+        "bulk"; `deadline` is in seconds from now.
+        """
+        options = {"vad": vad, "diarize": diarize, "language": language, "priority": priority}
+        if model:
+            options["model"] = model
+        if latency_budget:
+            options["latency_budget"] = latency_budget
+        if deadline is not None:
+            options["deadline"] = deadline
+        if upload:
+            params = {key: str(value).lower() if isinstance(value, bool) else value for key, value in options.items()}
+            with open(audio_path, "rb") as f:
+                response = self.session.post(f"{self.url}/jobs", data=f,
+                                             params={"filename": os.path.basename(audio_path), **params},
+                                             headers={"Content-Type": "application/octet-stream"})
+        else:
+            response = self.session.post(f"{self.url}/jobs", json={"path": os.path.abspath(audio_path), **options})
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def status(self, job_id):
+        response = self.session.get(f"{self.url}/jobs/{job_id}")
+        response.raise_for_status()
+        return response.json()
+
+    def result(self, job_id):
+        response = self.session.get(f"{self.url}/jobs/{job_id}/result")
+        response.raise_for_status()
+        return response.json()
+
+    def cancel(self, job_id):
+        response = self.session.delete(f"{self.url}/jobs/{job_id}")
+        response.raise_for_status()
+        return response.json()["status"]
+
+    def wait(self, job_id, poll_interval=1.0, on_progress=None, timeout=None):
+        """
+        Poll until the job leaves the queue/running states; returns the
+        final status dict.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            status = self.status(job_id)
+            if on_progress is not None:
+                on_progress(status)
+            if status["status"] not in (QUEUED, RUNNING):
+                return status
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError(f"Job {job_id} still {status['status']} after {timeout}s")
+            time.sleep(poll_interval)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local transcription job service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--servers", type=int, help="whisper-server workers (default: autotuned)")
+    parser.add_argument("--device", choices=["cpu", "gpu", HYBRID], default="cpu",
+                        help="hybrid runs CPU and GPU servers side by side, routing by measured speed")
+    parser.add_argument("--threads", type=int, help="total threads shared by the workers (default: autotuned)")
+    parser.add_argument("--jobs", type=int, default=4,
+                        help="jobs processed at the same time; their parts share the servers by priority")
+    parser.add_argument("--data-dir", default=default_data_dir(), help="job database and upload spool")
+    parser.add_argument("--language-model", action="append", default=[], metavar="LANG=MODEL",
+                        help="keep a server warmed with MODEL for LANG (repeatable); jobs are routed by detected language")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"model of the main pool (default: {DEFAULT_MODEL})")
+    parser.add_argument("--variant", action="append", default=[], metavar="MODEL",
+                        help="keep a server warmed with another model (repeatable) that jobs can choose")
+    parser.add_argument("--latency-budget", type=float, metavar="SECONDS",
+                        help="default latency budget; jobs without a model get the most accurate one that meets it")
+    parser.add_argument("--json-log", metavar="PATH", help="append per-stage timings and job events as JSON lines")
+    parser.add_argument("--trace", action="store_true", help="emit OpenTelemetry spans (needs opentelemetry-api)")
+    args = parser.parse_args(argv)
+
+    metrics.configure_json_log(args.json_log)
+    if args.trace and not metrics.enable_tracing():
+        print("OpenTelemetry is not installed; --trace ignored")
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    store = JobStore(os.path.join(args.data_dir, "jobs.sqlite3"))
+    device = "cpu" if args.device == HYBRID else args.device
+    if args.servers and args.threads:
+        options = {"size": args.servers, "total_threads": args.threads, "affinity": None}
+    else:
+        options = pool_options(ensure_settings(device, args.model))
+        if args.servers or args.threads:
+            options = {"size": args.servers or options["size"],
+                       "total_threads": args.threads or options["total_threads"], "affinity": None}
+    language_models = dict(entry.split("=", 1) for entry in args.language_model)
+    variants = [model for model in dict.fromkeys(args.variant) if model != args.model]
+    if language_models or variants:
+        # Every pool gets an equal share of the threads
+        options["total_threads"] = max(1, options["total_threads"] // (len(language_models) + len(variants) + 1))
+        options["affinity"] = None
+    if args.device == HYBRID:
+        pool = hybrid_pool(options, model=args.model, base_port=8080).start()
+    else:
+        pool = ServerPool(whisper_launchers(model=args.model), active=args.device, spares=0, standby=False,
+                          base_port=8080, **options).start()
+    language_pools = {
+        language: ServerPool(language_launchers({language: model}, device=device), active=language, size=1,
+                             spares=0, standby=False, base_port=8180 + 100 * i,
+                             total_threads=options["total_threads"]).start()
+        for i, (language, model) in enumerate(sorted(language_models.items()))
+    }
+    model_pools = {args.model: pool}
+    for i, model in enumerate(variants):
+        model_pools[model] = ServerPool(whisper_launchers(model=model), active=device, size=1, spares=0,
+                                        standby=False, base_port=8580 + 100 * i,
+                                        total_threads=options["total_threads"]).start()
+    report = load_report(device)
+    if args.latency_budget and variants and not report:
+        print("No model measurements yet (python model_manager.py --evaluate); using the main model")
+    router = LanguageRouter(language_pools, pool, models=language_models, default_model=args.model) if language_pools else None
+    runner = JobRunner(store, pool, concurrency=args.jobs, router=router, model=args.model, model_pools=model_pools,
+                       report=report, latency_budget=args.latency_budget).start()
+    service = JobService(store, runner, os.path.join(args.data_dir, "spool"), args.host, args.port)
+    print(f"Job service on http://{args.host}:{args.port} ({pool.size} {args.device.upper()} worker(s))")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runner.stop()
+        pool.stop()
+        for language_pool in language_pools.values():
+            language_pool.stop()
+        for model_pool in model_pools.values():
+            if model_pool is not pool:
+                model_pool.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
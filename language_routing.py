@@ -0,0 +1,129 @@
+import numpy as np
+
+from audio_io import SAMPLE_RATE, load_audio, wav_bytes
+from vad import detect_speech
+from whisper_server import DEFAULT_LANGUAGE, DEFAULT_MODEL, post_inference, start_whisper_server, transcribe_audio
+
+AUTO = "auto"
+DETECT_SCAN_SECONDS = 60
+DETECT_SPEECH_SECONDS = 15
+MIN_PROBABILITY = 0.5
+LANGUAGES = ("bg", "en", "ru")
+
+# whisper-server reports detected languages by their full names
+LANGUAGE_CODES = {
+    "bulgarian": "bg", "english": "en", "russian": "ru", "ukrainian": "uk", "serbian": "sr",
+    "macedonian": "mk", "german": "de", "french": "fr", "spanish": "es", "italian": "it",
+    "greek": "el", "turkish": "tr", "romanian": "ro", "polish": "pl", "czech": "cs",
+}
+
+def language_code(name):
+    """
+    ISO 639-1 code for a language name or code as whisper reports it.
+    """
+    if not name:
+        return None
+    name = name.strip().lower()
+    return name if len(name) == 2 else LANGUAGE_CODES.get(name)
+
+def detection_sample(audio_path, scan_seconds=DETECT_SCAN_SECONDS, speech_seconds=DETECT_SPEECH_SECONDS):
+    """
+    Up to `speech_seconds` of speech from the beginning of the file. Only
+    the first `scan_seconds` are decoded, and leading silence or music is
+    skipped so the detector hears someone talking.
+    """
+    samples = load_audio(audio_path, max_seconds=scan_seconds)
+    regions = detect_speech(samples)
+    if not regions:
+        return samples[:int(speech_seconds * SAMPLE_RATE)]
+    pieces = []
+    wanted = int(speech_seconds * SAMPLE_RATE)
+    for start, end in regions:
+        pieces.append(samples[start:min(end, start + wanted)])
+        wanted -= len(pieces[-1])
+        if wanted <= 0:
+            break
+    return np.concatenate(pieces)
+
+def detect_language(audio_path, pool, model_path=DEFAULT_MODEL, fallback=DEFAULT_LANGUAGE):
+    """
+    Identify the spoken language from the first seconds of speech. Returns
+    (code, probability); the fallback language with probability None when
+    the server could not tell.
+    """
+    return detect_samples_language(detection_sample(audio_path), pool, model_path, fallback)
+
+def detect_samples_language(samples, pool, model_path=DEFAULT_MODEL, fallback=DEFAULT_LANGUAGE):
+    """
+    detect_language() for already decoded 16 kHz samples, such as the
+    first seconds of a live capture.
+    """
+    if len(samples) == 0:
+        return fallback, None
+    payload = ("detect.wav", wav_bytes(samples), "audio/wav")
+    with pool.worker() as worker:
+        # detect_language makes whisper-server stop after the language-ID
+        # pass instead of decoding the clip
+        result = post_inference(payload, model_path=model_path, host=worker.host, port=worker.port, language=AUTO,
+                                fields={"detect_language": "true", "response_format": "verbose_json"})
+    code = language_code(result.get("detected_language") or result.get("language"))
+    probability = result.get("detected_language_probability")
+    if code is None or (probability is not None and probability < MIN_PROBABILITY):
+        return fallback, probability
+    return code, probability
+
+class LanguageRouter:
+    """
+    Sends each file to the pool warmed for its language.
+
+    `pools` maps a language code to a server pool (for instance one running
+    a model fine-tuned for that language, see language_launchers()); files
+    in any other language go to `default_pool`, which runs `default_model`.
+    Detection runs on `detect_pool` (default: default_pool), so it never
+    waits behind long jobs of a language-specific pool. Servers are never restarted when the
+    language changes between files.
+    """
+    def __init__(self, pools, default_pool, detect_pool=None, models=None, fallback=DEFAULT_LANGUAGE,
+                 default_model=DEFAULT_MODEL):
+        self.pools = dict(pools)
+        self.default_pool = default_pool
+        self.detect_pool = detect_pool or default_pool
+        self.models = models or {}
+        self.fallback = fallback
+        self.default_model = default_model
+
+    def route(self, audio_path, language=AUTO):
+        """
+        Return (language, pool, model_path) for a file. `language` other
+        than "auto" skips detection.
+        """
+        if language == AUTO:
+            language, _ = detect_language(audio_path, self.detect_pool, model_path=self.default_model,
+                                          fallback=self.fallback)
+        return language, self.pools.get(language, self.default_pool), self.models.get(language, self.default_model)
+
+    def transcribe(self, audio_path, language=AUTO, **kwargs):
+        """
+        Detect the language if needed and transcribe on the matching pool.
+        Extra keyword arguments go to whisper_server.transcribe_audio().
+        The result carries the language it was transcribed as.
+        """
+        language, pool, model_path = self.route(audio_path, language)
+        with pool.worker() as worker:
+            result = transcribe_audio(audio_path, model_path=model_path, host=worker.host, port=worker.port,
+                                      language=language, **kwargs)
+        result["language"] = language
+        return result
+
+def language_launchers(models, device="cpu", convert=False):
+    """
+    ServerPool launchers for language-specific models: {language: model file
+    name in Release/build_<device>/models}. Each server is started with its
+    language preset.
+    """
+    return {
+        language: (lambda port, threads, language=language, model=model:
+                   start_whisper_server(device=device, port=port, threads=threads, convert=convert,
+                                        language=language, model=model))
+        for language, model in models.items()
+    }
@@ -0,0 +1,328 @@
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+
+from audio_io import SAMPLE_RATE, stream_audio, wav_bytes
+from chunked_transcription import MAX_OVERLAP_WORDS, merge_overlapping_text
+from language_routing import AUTO, detect_samples_language
+from server_pool import StaticPool
+from vad import FRAME_SECONDS, energy_speech_frames
+from whisper_server import DEFAULT_LANGUAGE, DEFAULT_MODEL, post_inference
+
+BLOCK_SECONDS = 0.25
+STEP_SECONDS = 2.0
+WINDOW_SECONDS = 15.0
+OVERLAP_SECONDS = 1.0
+PAUSE_SECONDS = 0.6
+DETECT_SPEECH_SECONDS = 5.0
+RETRIES = 3
+RETRY_BACKOFF_SECONDS = 1.0
+
+# Microphone capture is optional (pip install sounddevice); a file source
+# played at real-time speed stands in for a capture device on machines
+# without one:
+#   python live_transcription.py --input audio-samples/30sec.mp3 --server 127.0.0.1:8080
+try:
+    import sounddevice
+except ImportError:
+    sounddevice = None
+
+class WavFileSource:
+    """
+    Plays an audio file as if it were a live input device, delivering
+    blocks at real-time pace (or `speed` times faster).
+    """
+    def __init__(self, audio_path, block_seconds=BLOCK_SECONDS, speed=1.0):
+        self.audio_path = audio_path
+        self.block = int(block_seconds * SAMPLE_RATE)
+        self.speed = speed
+        self._stopped = threading.Event()
+
+    def blocks(self):
+        start = time.time()
+        sent = 0
+        pending = np.zeros(0, dtype=np.int16)
+        for decoded in stream_audio(self.audio_path):
+            pending = np.concatenate([pending, decoded])
+            while len(pending) >= self.block:
+                if self._stopped.is_set():
+                    return
+                block, pending = pending[:self.block], pending[self.block:]
+                sent += len(block)
+                delay = start + sent / SAMPLE_RATE / self.speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                yield block
+        if len(pending) and not self._stopped.is_set():
+            yield pending
+
+    def stop(self):
+        self._stopped.set()
+
+class MicrophoneSource:
+    """
+    Captures 16 kHz mono audio from an input device via sounddevice.
+    """
+    def __init__(self, device=None, block_seconds=BLOCK_SECONDS):
+        if sounddevice is None:
+            raise RuntimeError("Microphone capture needs the sounddevice package (pip install sounddevice)")
+        self.device = device
+        self.block = int(block_seconds * SAMPLE_RATE)
+        self._stopped = threading.Event()
+
+    def blocks(self):
+        with sounddevice.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype="int16",
+                                     blocksize=self.block, device=self.device) as stream:
+            while not self._stopped.is_set():
+                data, _ = stream.read(self.block)
+                yield data.reshape(-1).copy()
+
+    def stop(self):
+        self._stopped.set()
+
+class LiveTranscriber:
+    """
+    Sliding-window live transcription.
+
+    Captured audio accumulates in a buffer that starts at the last committed
+    point. Every `step_seconds` the buffer is transcribed and reported
+    through on_partial(text). When the speaker pauses, or the buffer reaches
+    `window_seconds`, the text up to the cut is finalized through
+    on_final(text) and the buffer restarts there, keeping `overlap_seconds`
+    of audio as context. If inference falls behind, intermediate partials
+    are skipped so the text never lags more than one request behind the audio.
+    A failed request (server restarting, connection refused) is reported
+    through on_error(message) and retried with exponential backoff; after
+    `retries` failures in a row capture stops and on_error gets the reason.
+    With language="auto" nothing is shown until DETECT_SPEECH_SECONDS of
+    speech are captured; the language is detected from them once and used
+    for the rest of the session.
+    """
+    def __init__(self, source, pool, on_partial=None, on_final=None, model_path=DEFAULT_MODEL,
+                 language=DEFAULT_LANGUAGE, step_seconds=STEP_SECONDS, window_seconds=WINDOW_SECONDS,
+                 overlap_seconds=OVERLAP_SECONDS, pause_seconds=PAUSE_SECONDS, on_error=None,
+                 retries=RETRIES, backoff=RETRY_BACKOFF_SECONDS):
+        self.source = source
+        self.pool = pool
+        self.on_partial = on_partial or (lambda text: None)
+        self.on_final = on_final or (lambda text: None)
+        self.on_error = on_error or (lambda message: None)
+        self.retries = retries
+        self.backoff = backoff
+        self.error = None
+        self.model_path = model_path
+        self.language = language
+        self.step = int(step_seconds * SAMPLE_RATE)
+        self.window = int(window_seconds * SAMPLE_RATE)
+        self.overlap = int(overlap_seconds * SAMPLE_RATE)
+        self.pause_frames = int(pause_seconds / FRAME_SECONDS)
+
+        self.final_text = ""
+        self.latencies = []
+        self._buffer = np.zeros(0, dtype=np.int16)
+        self._overlap_samples = 0
+        self._lock = threading.Lock()
+        self._new_audio = threading.Event()
+        self._capture_done = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._capture_loop, daemon=True),
+            threading.Thread(target=self._inference_loop, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop capturing; whatever is still buffered is finalized.
+        """
+        self.source.stop()
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _capture_loop(self):
+        try:
+            for block in self.source.blocks():
+                with self._lock:
+                    self._buffer = np.concatenate([self._buffer, block])
+                self._new_audio.set()
+        finally:
+            self._capture_done.set()
+            self._new_audio.set()
+
+    def _with_retries(self, request):
+        for attempt in range(self.retries + 1):
+            try:
+                return request()
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                self.on_error(f"Server request failed ({e}); retrying in {delay:.0f}s")
+                time.sleep(delay)
+
+    def _transcribe(self, samples):
+        payload = ("live.wav", wav_bytes(samples), "audio/wav")
+
+        def request():
+            with self.pool.worker() as worker:
+                result = post_inference(payload, model_path=self.model_path, host=worker.host,
+                                        port=worker.port, language=self.language)
+            return result.get("text", "").replace("\n", " ").strip()
+
+        return self._with_retries(request)
+
+    def _resolve_language(self, samples, finished):
+        """
+        Replace "auto" with the detected language once enough speech has
+        been captured (or the window is full). Returns False while still
+        waiting for speech; silence before it is dropped.
+        """
+        speech = energy_speech_frames(samples)
+        full = len(samples) >= self.window
+        if not finished and speech.sum() * FRAME_SECONDS < DETECT_SPEECH_SECONDS and not (full and speech.any()):
+            if full:
+                with self._lock:
+                    self._buffer = self._buffer[len(samples) - self.overlap:]
+                    self._overlap_samples = 0
+            return False
+        frame_len = int(FRAME_SECONDS * SAMPLE_RATE)
+        voiced = samples[:len(speech) * frame_len].reshape(len(speech), frame_len)[speech].reshape(-1)
+        self.language = self._with_retries(lambda: detect_samples_language(voiced, self.pool, self.model_path)[0])
+        return True
+
+    def _find_cut(self, samples, start=0):
+        """
+        Sample index to finalize up to: the middle of the last pause after
+        `start`, or the whole window (minus overlap) when the buffer is full.
+        None keeps waiting.
+        """
+        frame_len = int(FRAME_SECONDS * SAMPLE_RATE)
+        first = start // frame_len
+        speech = energy_speech_frames(samples)
+        silent_run = 0
+        for i in range(len(speech) - 1, first - 1, -1):
+            if not speech[i]:
+                silent_run += 1
+                continue
+            if silent_run >= self.pause_frames:
+                return (i + 1 + silent_run // 2) * frame_len
+            silent_run = 0
+        if len(samples) >= self.window:
+            return len(samples) - self.overlap
+        return None
+
+    def _emit_final(self, text):
+        tail = " ".join(self.final_text.split()[-MAX_OVERLAP_WORDS:])
+        merged = merge_overlapping_text(tail, text)
+        new_text = merged[len(tail):].strip() if tail and merged.startswith(tail) else text
+        if new_text:
+            self.final_text = (self.final_text + " " + new_text).strip()
+            self.on_final(new_text)
+
+    def _inference_loop(self):
+        try:
+            self._process()
+        except Exception as e:
+            # Stop capturing instead of leaving the microphone open with nobody listening
+            self.error = e
+            self.source.stop()
+            self.on_partial("")
+            self.on_error(f"Live transcription stopped: {e}")
+
+    def _process(self):
+        last_size = 0
+        while True:
+            self._new_audio.wait()
+            self._new_audio.clear()
+            with self._lock:
+                samples = self._buffer
+            finished = self._capture_done.is_set()
+            if not finished and len(samples) - last_size < self.step:
+                continue
+            if self.language == AUTO and not self._resolve_language(samples, finished):
+                with self._lock:
+                    last_size = len(self._buffer)
+                continue
+
+            captured_at = time.time()
+            cut = len(samples) if finished else self._find_cut(samples, self._overlap_samples)
+            if cut is not None and cut > self._overlap_samples:
+                # Pure silence or hold music below the speech threshold is not sent at all
+                if energy_speech_frames(samples[self._overlap_samples:cut]).any():
+                    self._emit_final(self._transcribe(samples[:cut]))
+                # Keep a little audio before the cut as context for the next window
+                keep_from = max(0, cut - self.overlap)
+                with self._lock:
+                    self._buffer = self._buffer[keep_from:]
+                    self._overlap_samples = cut - keep_from
+                last_size = len(samples) - keep_from
+            elif len(samples) > self._overlap_samples:
+                self.on_partial(self._transcribe(samples))
+                last_size = len(samples)
+            self.latencies.append(time.time() - captured_at)
+
+            if finished:
+                self.on_partial("")
+                return
+            with self._lock:
+                pending = len(self._buffer) - last_size
+            if pending >= self.step:
+                self._new_audio.set()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live transcription from a microphone or a file played in real time.")
+    parser.add_argument("--input", help="audio file to play as the input device (default: microphone)")
+    parser.add_argument("--device", help="sounddevice input device name or index")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed for --input")
+    parser.add_argument("--server", default="127.0.0.1:8080", metavar="HOST:PORT")
+    parser.add_argument("-l", "--language", default=DEFAULT_LANGUAGE, help="language code or 'auto'")
+    parser.add_argument("--step", type=float, default=STEP_SECONDS, help="seconds between partial updates")
+    parser.add_argument("--window", type=float, default=WINDOW_SECONDS, help="longest stretch before forcing a final")
+    args = parser.parse_args(argv)
+
+    host, _, port = args.server.rpartition(":")
+    pool = StaticPool([(host or "127.0.0.1", int(port))])
+    if args.input:
+        source = WavFileSource(args.input, speed=args.speed)
+    else:
+        device = int(args.device) if args.device and args.device.isdigit() else args.device
+        source = MicrophoneSource(device)
+
+    def on_partial(text):
+        sys.stdout.write("\r\033[K" + text[-120:])
+        sys.stdout.flush()
+
+    def on_final(text):
+        sys.stdout.write("\r\033[K" + text + "\n")
+        sys.stdout.flush()
+
+    def on_error(message):
+        sys.stdout.write("\r\033[K")
+        print(message, file=sys.stderr)
+
+    transcriber = LiveTranscriber(source, pool, on_partial, on_final, step_seconds=args.step,
+                                  window_seconds=args.window, on_error=on_error, language=args.language).start()
+    try:
+        while transcriber.is_running():
+            transcriber.join(0.5)
+    except KeyboardInterrupt:
+        transcriber.stop()
+        transcriber.join()
+    if transcriber.latencies:
+        latencies = sorted(transcriber.latencies)
+        print(f"\nUpdate latency: median {latencies[len(latencies) // 2]:.2f}s, max {latencies[-1]:.2f}s")
+    return 1 if transcriber.error else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
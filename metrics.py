@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import weakref
+import functools
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Process-wide pipeline metrics with no dependencies:
+#   - stt_stage_seconds{stage=...} histograms for decode, vad, diarize,
+#     queue_wait, upload, inference, postprocess, write, job_queue
+#   - counters for uploaded bytes, transcribed audio seconds, requests,
+#     retries and errors
+#   - gauges for server pool occupancy, read when scraped
+# exposed as Prometheus text (render(), GET /metrics of the job service or
+# start_metrics_server()), as JSON log lines (configure_json_log(), or the
+# STT_JSON_LOG environment variable) and, when OpenTelemetry is installed
+# and enable_tracing() was called, as spans.
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger("speech_to_text.metrics")
+logger.propagate = False
+_tracer = None
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class Metric:
+    """
+    Base class: one named metric with a value per combination of labels.
+    """
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = self.header()
+        for name, key, value in self.samples():
+            lines.append(f"{name}{_label_text(self.labelnames, key)} {_number(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self):
+        lines = self.header()
+        labelnames = self.labelnames + ("le",)
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in items:
+            # Bucket counts are cumulative already: every bound >= value was counted
+            for bound, bucket in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_label_text(labelnames, key + (f'{bound:g}',))} {bucket}")
+            lines.append(f"{self.name}_bucket{_label_text(labelnames, key + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    """
+    The metrics of this process plus collectors: callables run at scrape
+    time that return Metric objects, for values such as pool occupancy
+    that are cheaper to read than to keep up to date.
+    """
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.add(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=STAGE_BUCKETS):
+        return self.add(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("stt_stage_seconds", "Wall time spent per pipeline stage", ("stage",))
+UPLOAD_BYTES = REGISTRY.counter("stt_upload_bytes_total", "Request body bytes sent to whisper-server")
+AUDIO_SECONDS = REGISTRY.counter("stt_audio_seconds_total", "Seconds of audio sent to whisper-server")
+REQUESTS = REGISTRY.counter("stt_requests_total", "whisper-server inference requests", ("outcome",))
+RETRIES = REGISTRY.counter("stt_retries_total", "Inference requests sent again after a transient failure")
+ERRORS = REGISTRY.counter("stt_errors_total", "Failures per pipeline stage", ("stage",))
+JOBS = REGISTRY.counter("stt_jobs_total", "Job service jobs by final status", ("status",))
+
+render = REGISTRY.render
+
+# ------------------- server pools -------------------
+
+_pools = weakref.WeakSet()
+
+def track_pool(pool):
+    """
+    Report a server_pool.ServerPool's occupancy while it exists.
+    """
+    _pools.add(pool)
+
+def _collect_pools():
+    workers = Gauge("stt_pool_workers", "whisper-server workers by role and state", ("pool", "role", "state"))
+    threads = Gauge("stt_pool_threads", "Threads per whisper-server worker", ("pool",))
+    for pool in list(_pools):
+        name = f"{pool.active}:{pool.base_port}"
+        for key, count in pool.occupancy().items():
+            role, _, state = key.partition("_")
+            workers.set(count, pool=name, role=role, state=state)
+        threads.set(pool.threads_per_worker, pool=name)
+    return [workers, threads]
+
+REGISTRY.collectors.append(_collect_pools)
+
+# ------------------- logs and spans -------------------
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"ts": round(record.created, 3), "event": record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def configure_json_log(target=None):
+    """
+    Write one JSON object per event to `target`: a file path (appended),
+    "-" for stderr, or by default the STT_JSON_LOG environment variable.
+    Does nothing when no target is given.
+    """
+    target = target or os.environ.get("STT_JSON_LOG")
+    if not target:
+        return
+    handler = logging.StreamHandler(sys.stderr) if target == "-" else logging.FileHandler(target, encoding="utf-8")
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+def log_event(event, **fields):
+    if logger.handlers:
+        logger.info(event, extra={"fields": fields})
+
+def enable_tracing(name="speech-to-text"):
+    """
+    Emit a span per stage through the OpenTelemetry API; the exporter is
+    whatever the SDK was configured with (e.g. by opentelemetry-instrument).
+    Returns False when OpenTelemetry is not installed.
+    """
+    global _tracer
+    if trace is None:
+        return False
+    _tracer = trace.get_tracer(name)
+    return True
+
+# ------------------- recording -------------------
+
+def observe(stage_name, seconds, **fields):
+    """
+    Record a stage that was timed by the caller, e.g. from timestamps
+    taken on different threads.
+    """
+    STAGE_SECONDS.observe(seconds, stage=stage_name)
+    if _tracer is not None:
+        end = time.time_ns()
+        span = _tracer.start_span(stage_name, start_time=end - int(seconds * 1e9), attributes=fields)
+        span.end(end_time=end)
+    log_event("stage", stage=stage_name, seconds=round(seconds, 4), **fields)
+
+@contextmanager
+def stage(stage_name, **fields):
+    """
+    Time the enclosed block as one pipeline stage; failures are counted
+    in stt_errors_total.
+    """
+    span = _tracer.start_as_current_span(stage_name, attributes=fields) if _tracer is not None else None
+    if span is not None:
+        span.__enter__()
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        ERRORS.inc(stage=stage_name)
+        raise
+    finally:
+        seconds = time.perf_counter() - t0
+        STAGE_SECONDS.observe(seconds, stage=stage_name)
+        if span is not None:
+            span.__exit__(*sys.exc_info())
+        log_event("stage", stage=stage_name, seconds=round(seconds, 4), **fields)
+
+def timed(stage_name):
+    """
+    Decorator: time every call of the function as a stage.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# ------------------- endpoint -------------------
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """
+    Serve GET /metrics from a background thread; returns the server.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,285 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+from audio_io import audio_duration
+from server_pool import ServerPool, whisper_launchers
+from transcribe_batch import collect_inputs
+from whisper_server import DEFAULT_LANGUAGE, DEFAULT_MODEL, DEFAULT_THREADS, get_base_path, transcribe_audio
+
+QUANT_TYPES = ("q4_0", "q4_1", "q5_0", "q5_1", "q8_0")
+QUANTIZE_EXES = ("quantize.exe", "whisper-quantize.exe", "quantize")
+
+# ggml model variants: discovery, local quantization with the bundled
+# quantize.exe, and an accuracy/speed report used to pick a model that
+# meets a latency budget:
+#   python model_manager.py --list
+#   python model_manager.py --quantize ggml-large-v3-turbo.bin q5_0 q4_0
+#   python model_manager.py --evaluate --reference audio-samples/reference
+#   python model_manager.py --choose 600 --budget 120
+#
+# A reference set is a folder of audio files, each with a checked
+# transcript next to it (call.mp3 + call.txt).
+
+def models_dir(device="cpu"):
+    return os.path.join(get_base_path(), "Release", f"build_{device}", "models")
+
+def parse_model_name(filename):
+    """
+    (base, quantization) of a ggml model file name, e.g.
+    "ggml-large-v3-turbo-q8_0.bin" -> ("large-v3-turbo", "q8_0").
+    Unquantized models report "f16".
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    if stem.startswith("ggml-"):
+        stem = stem[len("ggml-"):]
+    match = re.match(r"(.+)-(q\d_\d|q\d_k|f16|f32)$", stem)
+    if match:
+        return match.group(1), match.group(2)
+    return stem, "f16"
+
+def discover_models(device="cpu", directory=None):
+    """
+    The ggml models installed for a device, smallest first, as dicts with
+    name, path, base, quantization and size_mb.
+    """
+    directory = directory or models_dir(device)
+    if not os.path.isdir(directory):
+        return []
+    models = []
+    for name in os.listdir(directory):
+        if not (name.startswith("ggml-") and name.endswith(".bin")):
+            continue
+        path = os.path.join(directory, name)
+        base, quantization = parse_model_name(name)
+        models.append({"name": name, "path": path, "base": base, "quantization": quantization,
+                       "size_mb": round(os.path.getsize(path) / 2 ** 20, 1)})
+    return sorted(models, key=lambda m: m["size_mb"])
+
+def quantized_name(source, quant_type):
+    base, _ = parse_model_name(source)
+    return f"ggml-{base}-{quant_type}.bin"
+
+def quantize_model(source, quant_type, device="cpu", log=print):
+    """
+    Write a quantized copy of an f16/f32 model next to it with the bundled
+    quantize.exe and return its file name. Existing variants are kept.
+    """
+    if quant_type not in QUANT_TYPES:
+        raise ValueError(f"Unknown quantization '{quant_type}' (use one of {', '.join(QUANT_TYPES)})")
+    if parse_model_name(source)[1] not in ("f16", "f32"):
+        # Re-quantizing stacks the rounding error of both formats
+        raise ValueError(f"{source} is already quantized; quantize from the f16 model instead")
+    directory = models_dir(device)
+    source_path = os.path.join(directory, os.path.basename(source))
+    if not os.path.isfile(source_path):
+        raise FileNotFoundError(f"Model not found: {source_path}")
+    output = quantized_name(source, quant_type)
+    output_path = os.path.join(directory, output)
+    if os.path.exists(output_path):
+        log(f"{output} already exists")
+        return output
+
+    build_dir = os.path.dirname(directory)
+    exe = next((os.path.join(build_dir, name) for name in QUANTIZE_EXES
+                if os.path.isfile(os.path.join(build_dir, name))), None)
+    if exe is None:
+        raise FileNotFoundError(f"No quantize executable in {build_dir}")
+    log(f"Quantizing {os.path.basename(source)} to {quant_type}...")
+    tmp_path = output_path + ".part"
+    creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform.startswith("win") else 0
+    completed = subprocess.run([exe, source_path, tmp_path, quant_type], capture_output=True, text=True,
+                               creationflags=creation_flags)
+    if completed.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise RuntimeError(f"quantize failed: {(completed.stderr or completed.stdout).strip()[-500:]}")
+    os.replace(tmp_path, output_path)
+    return output
+
+def normalize_words(text):
+    """
+    Lower-cased words without punctuation, for scoring.
+    """
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+def word_error_rate(reference, hypothesis):
+    """
+    Word-level edit distance divided by the reference length.
+    """
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, other in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (word != other))
+        previous = current
+    return previous[-1] / len(ref)
+
+def reference_set(patterns):
+    """
+    (audio_path, reference_text or None) for every audio file matched.
+    """
+    pairs = []
+    for path in collect_inputs(patterns):
+        text_path = os.path.splitext(path)[0] + ".txt"
+        reference = None
+        if os.path.isfile(text_path):
+            with open(text_path, "r", encoding="utf-8") as f:
+                reference = f.read()
+        pairs.append((path, reference))
+    return pairs
+
+def evaluate_model(model, pairs, pool, language=DEFAULT_LANGUAGE):
+    """
+    Transcribe the reference set one file at a time on a pool running
+    `model` and return its word error rate and speed.
+    """
+    with pool.worker() as worker:
+        transcribe_audio(pairs[0][0], model_path=model, host=worker.host, port=worker.port, language=language)
+
+    errors, words, seconds, audio_seconds = 0.0, 0, 0.0, 0.0
+    for path, reference in pairs:
+        t0 = time.perf_counter()
+        with pool.worker() as worker:
+            result = transcribe_audio(path, model_path=model, host=worker.host, port=worker.port, language=language)
+        seconds += time.perf_counter() - t0
+        audio_seconds += audio_duration(path)
+        if reference is not None:
+            count = len(normalize_words(reference))
+            errors += word_error_rate(reference, result.get("text", "")) * count
+            words += count
+    return {
+        # Word errors pooled over the whole set, so long files weigh more
+        "wer": round(errors / words, 4) if words else None,
+        "rtf": round(seconds / audio_seconds, 4) if audio_seconds else None,
+        "audio_seconds": round(audio_seconds, 1),
+        "files": len(pairs),
+        "evaluated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def evaluate(models, pairs, device="cpu", threads=DEFAULT_THREADS, language=DEFAULT_LANGUAGE, base_port=8090, log=print):
+    """
+    Start one server per model in turn and measure it on the reference
+    set. Returns {model name: report entry}.
+    """
+    entries = {}
+    for model in models:
+        pool = ServerPool({device: whisper_launchers(model=model)[device]}, active=device, size=1, spares=0,
+                          standby=False, base_port=base_port, total_threads=threads)
+        try:
+            with pool:
+                pool.wait_ready(timeout=600)
+                entry = evaluate_model(model, pairs, pool, language=language)
+        except (RuntimeError, TimeoutError) as e:
+            log(f"  {model}: failed ({e})")
+            continue
+        entries[model] = {**entry, "device": device, "threads": threads}
+        wer = "n/a" if entry["wer"] is None else f"{entry['wer']:.1%}"
+        log(f"  {model}: WER {wer}, RTF {entry['rtf']}")
+    return entries
+
+def default_report_path():
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "speech-to-text", "models.json")
+
+def load_report(device="cpu", path=None):
+    """
+    {model name: entry} measured for a device, empty when never evaluated.
+    """
+    try:
+        with open(path or default_report_path(), "r", encoding="utf-8") as f:
+            return json.load(f).get(device, {})
+    except (OSError, ValueError):
+        return {}
+
+def save_report(entries, device="cpu", path=None):
+    path = path or default_report_path()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        report = {}
+    report.setdefault(device, {}).update(entries)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+
+def choose_model(report, audio_seconds, latency_budget, available=None):
+    """
+    The most accurate model expected to transcribe `audio_seconds` of audio
+    within `latency_budget` seconds, or the fastest one when none fits.
+    `available` limits the choice to models that are loaded. Returns None
+    when no candidate has been measured.
+    """
+    candidates = {name: entry for name, entry in report.items()
+                  if entry.get("rtf") and (available is None or name in available)}
+    if not candidates:
+        return None
+    fitting = [name for name, entry in candidates.items() if entry["rtf"] * audio_seconds <= latency_budget]
+    if not fitting:
+        return min(candidates, key=lambda name: candidates[name]["rtf"])
+    unscored = float("inf")
+    return min(fitting, key=lambda name: (candidates[name]["wer"] if candidates[name].get("wer") is not None
+                                          else unscored, candidates[name]["rtf"]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage and compare ggml model variants.")
+    parser.add_argument("--device", choices=["cpu", "gpu"], default="cpu")
+    parser.add_argument("--list", action="store_true", help="show installed models and their measurements")
+    parser.add_argument("--quantize", nargs="+", metavar=("MODEL", "TYPE"),
+                        help=f"create quantized variants of an f16 model ({', '.join(QUANT_TYPES)})")
+    parser.add_argument("--evaluate", nargs="*", metavar="MODEL",
+                        help="measure WER and speed of the given models (default: all installed)")
+    parser.add_argument("--reference", nargs="+", default=[os.path.join(get_base_path(), "audio-samples")],
+                        help="reference audio files or folders; transcripts are the .txt files next to them")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS, help="server threads while evaluating")
+    parser.add_argument("-l", "--language", default=DEFAULT_LANGUAGE)
+    parser.add_argument("--choose", type=float, metavar="AUDIO_SECONDS",
+                        help="print the model to use for a recording of this length")
+    parser.add_argument("--budget", type=float, help="latency budget in seconds for --choose")
+    parser.add_argument("--report", help=f"report file (default: {default_report_path()})")
+    args = parser.parse_args(argv)
+
+    if args.quantize:
+        if len(args.quantize) < 2:
+            parser.error("--quantize needs a model and at least one type")
+        for quant_type in args.quantize[1:]:
+            print(quantize_model(args.quantize[0], quant_type, device=args.device))
+
+    if args.evaluate is not None:
+        models = args.evaluate or [m["name"] for m in discover_models(args.device)]
+        pairs = reference_set(args.reference)
+        if not models or not pairs:
+            parser.error("nothing to evaluate: no models installed or no reference audio found")
+        if not any(reference for _, reference in pairs):
+            print("No reference transcripts found; measuring speed only")
+        print(f"Evaluating {len(models)} model(s) on {len(pairs)} file(s)...")
+        save_report(evaluate(models, pairs, device=args.device, threads=args.threads, language=args.language),
+                    device=args.device, path=args.report)
+
+    if args.choose is not None:
+        if args.budget is None:
+            parser.error("--choose needs --budget")
+        model = choose_model(load_report(args.device, args.report), args.choose, args.budget)
+        print(model or f"No measured models; run --evaluate first (default: {DEFAULT_MODEL})")
+
+    if args.list or not (args.quantize or args.evaluate is not None or args.choose is not None):
+        report = load_report(args.device, args.report)
+        for model in discover_models(args.device):
+            entry = report.get(model["name"], {})
+            wer = "-" if entry.get("wer") is None else f"{entry['wer']:.1%}"
+            print(f"{model['name']:<40} {model['quantization']:<6} {model['size_mb']:>8.1f} MB  "
+                  f"WER {wer:>6}  RTF {entry.get('rtf', '-')}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import time
+import itertools
+import threading
+import weakref
+from contextlib import contextmanager
+
+import metrics
+
+INTERACTIVE = "interactive"
+NORMAL = "normal"
+BULK = "bulk"
+PRIORITIES = {INTERACTIVE: 0, NORMAL: 1, BULK: 2}
+
+# Decides which request gets the next free whisper-server. Long jobs are
+# already sent as ~2 minute parts (chunked_transcription.py), and every
+# part asks the scheduler for a worker on its own, so an interactive file
+# waits for at most one bulk part instead of a whole bulk job:
+#   scheduler = Scheduler(pool)
+#   transcribe_long_audio(path, scheduler.view(INTERACTIVE, audio_seconds=30), ...)
+
+WAIT_SECONDS = metrics.REGISTRY.histogram("stt_schedule_wait_seconds",
+                                          "Time a request waited for a worker, per priority class", ("priority",))
+_schedulers = weakref.WeakSet()
+
+def _collect_waiting():
+    waiting = metrics.Gauge("stt_schedule_waiting", "Requests waiting for a worker, per priority class", ("priority",))
+    totals = dict.fromkeys(PRIORITIES, 0)
+    for scheduler in list(_schedulers):
+        for priority, count in scheduler.waiting().items():
+            totals[priority] += count
+    for priority, count in totals.items():
+        waiting.set(count, priority=priority)
+    return [waiting]
+
+metrics.REGISTRY.collectors.append(_collect_waiting)
+
+def priority_rank(priority):
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}' (use one of {', '.join(PRIORITIES)})")
+    return PRIORITIES[priority]
+
+class Request:
+    """
+    A caller waiting for a worker.
+    """
+    def __init__(self, priority, deadline, audio_seconds, seq):
+        self.priority = priority
+        self.deadline = deadline
+        self.audio_seconds = audio_seconds
+        self.seq = seq
+        self.enqueued = time.perf_counter()
+
+    def rank(self, now):
+        """
+        Overdue requests first, then by priority class, earliest deadline,
+        shortest audio and arrival.
+        """
+        overdue = self.deadline is not None and self.deadline <= now
+        return (not overdue, priority_rank(self.priority),
+                self.deadline if self.deadline is not None else float("inf"), self.audio_seconds, self.seq)
+
+class Scheduler:
+    """
+    Priority- and deadline-aware dispatcher in front of a server pool
+    (server_pool.ServerPool or StaticPool). Whenever a worker is free it
+    goes to the best-ranked waiting request (see Request.rank).
+    """
+    def __init__(self, pool, poll_interval=0.2):
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self._waiting = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        _schedulers.add(self)
+
+    def _next(self, now):
+        return min(self._waiting, key=lambda request: request.rank(now))
+
+    def acquire(self, priority=NORMAL, deadline=None, audio_seconds=0.0, timeout=None):
+        """
+        Wait until this request is the best-ranked one and a worker is free.
+        `deadline` is a time.time() timestamp. Raises TimeoutError when no
+        worker was handed out within `timeout` seconds.
+        """
+        priority_rank(priority)
+        request = Request(priority, deadline, audio_seconds, next(self._seq))
+        give_up = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            self._waiting.append(request)
+            try:
+                while True:
+                    if self._next(time.time()) is request:
+                        try:
+                            worker = self.pool.acquire(timeout=0)
+                        except TimeoutError:
+                            worker = None
+                        if worker is not None:
+                            self._waiting.remove(request)
+                            self._cond.notify_all()
+                            waited = time.perf_counter() - request.enqueued
+                            WAIT_SECONDS.observe(waited, priority=priority)
+                            metrics.log_event("scheduled", priority=priority, seconds=round(waited, 4))
+                            return worker
+                    wait = self.poll_interval
+                    if give_up is not None:
+                        remaining = give_up - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError("No whisper-server worker became available")
+                        wait = min(wait, remaining)
+                    # Workers also become free through restarts and resizes,
+                    # which do not notify us
+                    self._cond.wait(wait)
+            except BaseException:
+                if request in self._waiting:
+                    self._waiting.remove(request)
+                    self._cond.notify_all()
+                raise
+
+    def release(self, worker):
+        self.pool.release(worker)
+        with self._cond:
+            self._cond.notify_all()
+
+    def waiting(self):
+        """
+        Number of waiting requests per priority class.
+        """
+        with self._cond:
+            counts = dict.fromkeys(PRIORITIES, 0)
+            for request in self._waiting:
+                counts[request.priority] += 1
+            return counts
+
+    def view(self, priority=NORMAL, deadline=None, audio_seconds=0.0):
+        """
+        A pool-like object (worker()/acquire()/release()/size/wait_ready())
+        whose requests are scheduled with the given class and deadline, to
+        pass wherever a pool is expected.
+        """
+        return ScheduledPool(self, priority, deadline, audio_seconds)
+
+class ScheduledPool:
+    def __init__(self, scheduler, priority, deadline, audio_seconds):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.deadline = deadline
+        self.audio_seconds = audio_seconds
+
+    @property
+    def size(self):
+        return self.scheduler.pool.size
+
+    def wait_ready(self, *args, **kwargs):
+        return self.scheduler.pool.wait_ready(*args, **kwargs)
+
+    def acquire(self, timeout=None):
+        return self.scheduler.acquire(self.priority, self.deadline, self.audio_seconds, timeout)
+
+    def release(self, worker):
+        self.scheduler.release(worker)
+
+    @contextmanager
+    def worker(self, timeout=None):
+        worker = self.acquire(timeout)
+        try:
+            yield worker
+        finally:
+            self.release(worker)
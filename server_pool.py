@@ -0,0 +1,703 @@
+import os
+import time
+import socket
+import threading
+from contextlib import contextmanager
+import requests
+
+import metrics
+from autotune import psutil
+from whisper_server import DEFAULT_MODEL, DEFAULT_THREADS, start_whisper_server
+
+STARTING = "starting"
+READY = "ready"
+BUSY = "busy"
+DEAD = "dead"
+FAILED = "failed"
+
+ACTIVE = "active"
+SPARE = "spare"
+STANDBY = "standby"
+
+HYBRID = "hybrid"
+# GPU servers of a hybrid pool listen from here up, clear of the CPU servers
+# (8080...), the calibration and benchmark pools (8090...) and the job
+# service's language and variant pools (8180..., 8580...)
+HYBRID_GPU_PORT = 8070
+
+def whisper_launchers(convert=False, model=DEFAULT_MODEL):
+    """
+    Launchers for the bundled CPU and GPU servers, keyed by device name.
+    A launcher is a callable (port, threads) -> subprocess.Popen.
+    Clients decode audio themselves (see audio_io), so by default the
+    servers run without --convert. `model` is a file name in the build's
+    models/ folder (see model_manager.discover_models()).
+    """
+    return {
+        "cpu": lambda port, threads: start_whisper_server(device="cpu", port=port, threads=threads, convert=convert,
+                                                          model=model),
+        "gpu": lambda port, threads: start_whisper_server(device="gpu", port=port, threads=threads, convert=convert,
+                                                          model=model),
+    }
+
+def check_ready(host, port, timeout=2):
+    """
+    Return True once a server answers on the port with its model loaded.
+    Servers without a /health route are ready as soon as they listen,
+    because whisper-server only starts listening after loading the model.
+    """
+    try:
+        response = requests.get(f"http://{host}:{port}/health", timeout=timeout)
+    except requests.RequestException:
+        return False
+    return response.status_code in (200, 404)
+
+def set_affinity(pid, cpus):
+    """
+    Pin a process to the given logical CPUs. Returns False where the
+    platform (or a missing psutil) does not allow it.
+    """
+    try:
+        if psutil is not None:
+            psutil.Process(pid).cpu_affinity(list(cpus))
+            return True
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(pid, cpus)
+            return True
+    except Exception:
+        # Process already gone, CPUs outside the allowed set, or no support (macOS)
+        pass
+    return False
+
+def port_is_free(host, port):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind((host, port))
+        except OSError:
+            return False
+    return True
+
+class ServerWorker:
+    """
+    One whisper-server child process and its restart bookkeeping.
+    """
+    def __init__(self, config, role, host, port, threads):
+        self.config = config
+        self.role = role
+        self.host = host
+        self.port = port
+        self.threads = threads
+        self.cpus = None
+        self.process = None
+        self.state = DEAD
+        self.started_at = None
+        self.ready_at = None
+        self.failures = 0
+        self.health_failures = 0
+        self.restart_at = 0.0
+        self.retire = False
+
+    def __repr__(self):
+        return f"<ServerWorker {self.config}:{self.port} {self.role} {self.state}>"
+
+class ServerPool:
+    """
+    Owns a set of whisper-server children for one active configuration
+    (e.g. "cpu"), plus ready-to-promote spares of that configuration and
+    one warm standby per other configuration.
+
+    Work is only routed to workers that passed the readiness check.
+    A background monitor restarts crashed or hung workers with exponential
+    backoff and promotes a warm spare in their place, so neither a crash nor
+    a CPU/GPU switch has to wait for a cold model load.
+
+    `affinity` optionally lists one set of logical CPUs per active worker
+    (see autotune.py); while the pool has that many active workers, each
+    one is pinned to its own set.
+    """
+    def __init__(self, launchers, active, size=1, spares=1, standby=True, host="127.0.0.1",
+                 base_port=8080, total_threads=DEFAULT_THREADS, ready_timeout=300,
+                 poll_interval=0.5, health_interval=5.0, max_backoff=60.0, max_failures=5, affinity=None):
+        self.launchers = launchers
+        self.active = active
+        self.size = size
+        self.spares = spares
+        self.standby = standby
+        self.host = host
+        self.base_port = base_port
+        self.total_threads = total_threads
+        self.ready_timeout = ready_timeout
+        self.poll_interval = poll_interval
+        self.health_interval = health_interval
+        self.max_backoff = max_backoff
+        self.max_failures = max_failures
+        self.affinity = affinity
+
+        self.workers = []
+        self._cond = threading.Condition()
+        self._stopping = threading.Event()
+        self._monitor = None
+        self._last_health = {}
+
+    # ------------------- lifecycle -------------------
+
+    def start(self):
+        """
+        Launch the configured workers and the monitor thread.
+        Returns immediately; use wait_ready() to block until work can be routed.
+        """
+        with self._cond:
+            self._reconcile()
+        metrics.track_pool(self)
+        self._monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+        self._monitor.start()
+        return self
+
+    def stop(self, timeout=10):
+        """
+        Stop the monitor and terminate every child process.
+        """
+        self._stopping.set()
+        if self._monitor is not None:
+            self._monitor.join(timeout)
+        with self._cond:
+            workers, self.workers = self.workers, []
+            self._cond.notify_all()
+        for worker in workers:
+            self._kill(worker)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def wait_ready(self, count=1, timeout=None):
+        """
+        Block until at least `count` active workers are ready.
+        Raises TimeoutError, or RuntimeError if the active configuration failed.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                ready = [w for w in self._role(ACTIVE) if w.state in (READY, BUSY)]
+                if len(ready) >= min(count, self.size):
+                    return
+                self._raise_if_failed()
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No ready '{self.active}' whisper-server after {timeout}s")
+                self._cond.wait(remaining if remaining is not None else 1.0)
+
+    # ------------------- routing -------------------
+
+    def acquire(self, timeout=None):
+        """
+        Wait for an idle, ready active worker and mark it busy.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                for worker in self._role(ACTIVE):
+                    if worker.state == READY and not worker.retire:
+                        worker.state = BUSY
+                        return worker
+                self._raise_if_failed()
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No whisper-server worker became available")
+                self._cond.wait(remaining if remaining is not None else 1.0)
+
+    def release(self, worker):
+        """
+        Return a worker obtained from acquire().
+        """
+        with self._cond:
+            if worker.state == BUSY:
+                worker.state = READY
+            if worker.retire:
+                self._remove(worker)
+            self._cond.notify_all()
+
+    @contextmanager
+    def worker(self, timeout=None):
+        """
+        Context manager around acquire()/release(); the wait is recorded
+        as the "queue_wait" stage.
+        """
+        with metrics.stage("queue_wait"):
+            worker = self.acquire(timeout)
+        try:
+            yield worker
+        finally:
+            self.release(worker)
+
+    # ------------------- reconfiguration -------------------
+
+    def switch(self, config):
+        """
+        Make `config` the active configuration. A warm standby of that
+        configuration is promoted at once; one of the old active workers is
+        kept as the standby for switching back.
+        """
+        if config not in self.launchers:
+            raise KeyError(f"Unknown server configuration '{config}'")
+        with self._cond:
+            if config == self.active:
+                return
+            previous, self.active = self.active, config
+            kept_standby = False
+            for worker in list(self.workers):
+                if worker.config == previous and worker.role in (ACTIVE, SPARE):
+                    if self.standby and not kept_standby and worker.state in (READY, BUSY, STARTING):
+                        worker.role = STANDBY
+                        kept_standby = True
+                    else:
+                        self._retire(worker)
+                elif worker.config == config and worker.role == STANDBY:
+                    worker.role = ACTIVE
+            self._reconcile()
+            self._cond.notify_all()
+
+    def resize(self, size):
+        """
+        Change the number of active workers.
+        """
+        with self._cond:
+            self.size = max(1, size)
+            self._reconcile()
+            self._cond.notify_all()
+
+    @property
+    def threads_per_worker(self):
+        return max(1, self.total_threads // self.size)
+
+    def ports(self):
+        """
+        Ports of the active workers that can currently take work.
+        """
+        with self._cond:
+            return [w.port for w in self._role(ACTIVE) if w.state in (READY, BUSY)]
+
+    def occupancy(self):
+        """
+        Snapshot of worker counts by role and state.
+        """
+        with self._cond:
+            counts = {}
+            for worker in self.workers:
+                key = f"{worker.role}_{worker.state}"
+                counts[key] = counts.get(key, 0) + 1
+            return counts
+
+    # ------------------- internals (call with the lock held) -------------------
+
+    def _role(self, role, config=None):
+        config = self.active if config is None else config
+        return [w for w in self.workers if w.role == role and w.config == config]
+
+    def _raise_if_failed(self):
+        active = self._role(ACTIVE)
+        if active and all(w.state == FAILED for w in active) and not any(w.state == READY for w in self._role(SPARE)):
+            raise RuntimeError(f"All '{self.active}' whisper-server workers failed to start")
+
+    def _next_port(self):
+        used = {w.port for w in self.workers}
+        port = self.base_port
+        while port in used or not port_is_free(self.host, port):
+            port += 1
+        return port
+
+    def _cpus_for(self, config, role):
+        """
+        The least used CPU set for a new active worker, or None when the
+        pool is not pinned at its current size.
+        """
+        if not self.affinity or role != ACTIVE or config != self.active or len(self.affinity) != self.size:
+            return None
+        used = [tuple(w.cpus) for w in self._role(ACTIVE, config) if w.cpus and not w.retire]
+        return min(self.affinity, key=lambda cpus: used.count(tuple(cpus)))
+
+    def _add(self, config, role):
+        worker = ServerWorker(config, role, self.host, self._next_port(), self.threads_per_worker)
+        worker.cpus = self._cpus_for(config, role)
+        self.workers.append(worker)
+        self._launch(worker)
+        return worker
+
+    def _launch(self, worker):
+        try:
+            worker.process = self.launchers[worker.config](worker.port, worker.threads)
+        except OSError:
+            # A missing or unrunnable build (e.g. no GPU build on this
+            # machine) counts as a failed start, retried with backoff
+            worker.process = None
+            self._on_exit(worker, time.time())
+            return
+        if worker.cpus:
+            # Pinned before the model load, so every compute thread inherits it
+            set_affinity(worker.process.pid, worker.cpus)
+        worker.state = STARTING
+        worker.started_at = time.time()
+        worker.ready_at = None
+        worker.health_failures = 0
+
+    def _kill(self, worker, wait=True):
+        process = worker.process
+        if process is not None and process.poll() is None:
+            try:
+                process.terminate()
+                if wait:
+                    process.wait(5)
+            except Exception:
+                try:
+                    process.kill()
+                except Exception:
+                    pass
+
+    def _remove(self, worker):
+        if worker in self.workers:
+            self.workers.remove(worker)
+        threading.Thread(target=self._kill, args=(worker,), daemon=True).start()
+
+    def _retire(self, worker):
+        if worker.state == BUSY:
+            worker.retire = True
+        else:
+            self._remove(worker)
+
+    def _reconcile(self):
+        """
+        Bring the worker set in line with size/spares/standby: promote ready
+        spares over dead actives, start missing workers and retire extras.
+        """
+        active = [w for w in self._role(ACTIVE) if not w.retire]
+        spares = [w for w in self._role(SPARE) if not w.retire]
+
+        for worker in active:
+            if worker.state in (DEAD, FAILED, STARTING):
+                ready_spare = next((s for s in spares if s.state == READY), None)
+                if ready_spare is not None:
+                    ready_spare.role, worker.role = ACTIVE, SPARE
+                    spares.remove(ready_spare)
+                    spares.append(worker)
+                    active[active.index(worker)] = ready_spare
+
+        while len(active) > self.size:
+            idle = next((w for w in reversed(active) if w.state != BUSY), active[-1])
+            active.remove(idle)
+            self._retire(idle)
+        while len(active) < self.size:
+            active.append(self._add(self.active, ACTIVE))
+
+        while len(spares) > self.spares:
+            self._retire(spares.pop())
+        while len(spares) < self.spares:
+            spares.append(self._add(self.active, SPARE))
+
+        for config in self.launchers:
+            if config == self.active:
+                continue
+            standby = [w for w in self._role(STANDBY, config) if not w.retire]
+            wanted = 1 if self.standby else 0
+            while len(standby) > wanted:
+                self._retire(standby.pop())
+            while len(standby) < wanted:
+                standby.append(self._add(config, STANDBY))
+
+    def _backoff(self, failures):
+        return min(self.max_backoff, 2 ** max(0, failures - 1))
+
+    def _on_exit(self, worker, now):
+        # A worker that ran fine for a while starts its backoff from scratch
+        if worker.ready_at is not None and now - worker.ready_at > 2 * self.max_backoff:
+            worker.failures = 0
+        worker.failures += 1
+        worker.state = FAILED if worker.failures >= self.max_failures else DEAD
+        worker.restart_at = now + self._backoff(worker.failures)
+
+    # ------------------- monitor -------------------
+
+    def _monitor_loop(self):
+        while not self._stopping.wait(self.poll_interval):
+            try:
+                self._tick()
+            except Exception:
+                # The monitor must outlive any single bad poll
+                pass
+
+    def _tick(self):
+        now = time.time()
+        with self._cond:
+            probe = []
+            for worker in list(self.workers):
+                if worker.state in (STARTING, READY, BUSY) and worker.process.poll() is not None:
+                    self._on_exit(worker, now)
+                elif worker.state == STARTING:
+                    if now - worker.started_at > self.ready_timeout:
+                        self._kill(worker, wait=False)
+                        self._on_exit(worker, now)
+                    else:
+                        probe.append(worker)
+                elif worker.state == READY and now - self._last_health.get(worker.port, 0) >= self.health_interval:
+                    probe.append(worker)
+                elif worker.state == DEAD and now >= worker.restart_at:
+                    self._launch(worker)
+            self._reconcile()
+            self._cond.notify_all()
+
+        results = [(worker, check_ready(self.host, worker.port)) for worker in probe]
+
+        with self._cond:
+            for worker, ok in results:
+                if worker not in self.workers:
+                    continue
+                self._last_health[worker.port] = now
+                if ok:
+                    worker.health_failures = 0
+                    if worker.state == STARTING:
+                        worker.state = READY
+                        worker.ready_at = time.time()
+                elif worker.state == READY:
+                    worker.health_failures += 1
+                    if worker.health_failures >= 3:
+                        # Alive but unresponsive: treat it like a crash
+                        self._kill(worker, wait=False)
+                        self._on_exit(worker, now)
+            self._reconcile()
+            self._cond.notify_all()
+
+class StaticPool:
+    """
+    Pool over already-running servers (host, port) that this process does
+    not manage. Offers the same worker()/acquire()/release() interface as
+    ServerPool, so transcription code can use either.
+    """
+    def __init__(self, endpoints):
+        self._free = list(endpoints)
+        self._cond = threading.Condition()
+        self.size = len(self._free)
+
+    def acquire(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._free, timeout):
+                raise TimeoutError("No whisper-server worker became available")
+            host, port = self._free.pop(0)
+            return StaticWorker(host, port)
+
+    def release(self, worker):
+        with self._cond:
+            self._free.append((worker.host, worker.port))
+            self._cond.notify()
+
+    @contextmanager
+    def worker(self, timeout=None):
+        with metrics.stage("queue_wait"):
+            worker = self.acquire(timeout)
+        try:
+            yield worker
+        finally:
+            self.release(worker)
+
+class StaticWorker:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+class HybridBackend:
+    """
+    One device's pool inside a HybridPool, with its measured speed.
+    """
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.seconds = None
+        self.requests = 0
+        self.running = {}
+        self.down_until = 0.0
+
+    def ready_count(self):
+        if hasattr(self.pool, "occupancy"):
+            counts = self.pool.occupancy()
+            return counts.get(f"{ACTIVE}_{READY}", 0) + counts.get(f"{ACTIVE}_{BUSY}", 0)
+        return self.pool.size
+
+class HybridPool:
+    """
+    Runs several pools side by side, e.g. {"gpu": ServerPool(...),
+    "cpu": ServerPool(...)}, behind the worker()/acquire()/release()
+    interface. Each pool's time per request is measured (moving average),
+    and a request goes to the pool where it is expected to finish first,
+    counting the requests already running or waiting there. A fast GPU
+    therefore takes most of the work while the CPU picks up parts it can
+    finish before the GPU would get to them, and the last parts of a file
+    are not left to the slow device.
+
+    Pools still loading their model are skipped, and a pool whose
+    servers all failed (no GPU, missing build) is retried after
+    `retry_seconds`, so the mode degrades to whichever devices work.
+    Routing assumes requests of similar length, such as the parts of
+    chunked_transcription.
+    """
+    def __init__(self, pools, smoothing=0.3, poll_interval=0.1, retry_seconds=60.0):
+        self.backends = [HybridBackend(name, pool) for name, pool in pools.items()]
+        self.smoothing = smoothing
+        self.poll_interval = poll_interval
+        self.retry_seconds = retry_seconds
+        self._waiting = {}
+        self._held = {}
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def size(self):
+        now = time.time()
+        return sum(b.pool.size for b in self.backends if b.down_until <= now) or 1
+
+    def start(self):
+        for backend in self.backends:
+            if hasattr(backend.pool, "start"):
+                backend.pool.start()
+        return self
+
+    def stop(self):
+        for backend in self.backends:
+            if hasattr(backend.pool, "stop"):
+                backend.pool.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def resize(self, size, name=None):
+        """
+        Resize one member pool (default: the last one, normally the CPU).
+        """
+        backend = self.backends[-1] if name is None else next(b for b in self.backends if b.name == name)
+        backend.pool.resize(size)
+
+    def wait_ready(self, count=1, timeout=None):
+        """
+        Block until `count` workers are ready across the pools, or until no
+        pool that is still loading is left. Raises RuntimeError when every
+        pool failed.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            ready = 0
+            loading = False
+            for backend in self.backends:
+                try:
+                    if hasattr(backend.pool, "wait_ready"):
+                        backend.pool.wait_ready(1, timeout=0)
+                except TimeoutError:
+                    loading = True
+                    continue
+                except RuntimeError:
+                    continue
+                ready += backend.ready_count()
+            if ready >= count or (ready and not loading):
+                return
+            if not ready and not loading:
+                raise RuntimeError("No whisper-server backend could be started")
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError(f"Only {ready} of {count} whisper-server worker(s) ready after {timeout}s")
+            time.sleep(self.poll_interval)
+
+    def speeds(self):
+        """
+        Measured seconds per request by backend (None until measured).
+        """
+        with self._cond:
+            return {b.name: b.seconds for b in self.backends}
+
+    def _expected_finish(self, backend, seq):
+        """
+        Seconds until a new request would finish on `backend`: its own
+        service time after the requests running there and those of
+        earlier waiters that chose it.
+        """
+        known = [b.seconds for b in self.backends if b.seconds is not None]
+        seconds = backend.seconds if backend.seconds is not None else (min(known) if known else 1.0)
+        ahead = sum(1 for other, name in self._waiting.items() if other < seq and name == backend.name)
+        queued = len(backend.running) + ahead - backend.pool.size + 1
+        return max(0, queued) * seconds / max(1, backend.pool.size) + seconds
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            self._seq += 1
+            seq = self._seq
+            self._waiting[seq] = None
+            try:
+                while True:
+                    now = time.time()
+                    available = [b for b in self.backends if b.down_until <= now]
+                    if not available:
+                        raise RuntimeError("All whisper-server backends failed to start")
+                    self._waiting[seq] = None
+                    for backend in sorted(available, key=lambda b: self._expected_finish(b, seq)):
+                        ahead = sum(1 for other, name in self._waiting.items() if other < seq and name == backend.name)
+                        if len(backend.running) + ahead >= backend.pool.size:
+                            # Waiting for the best backend beats starting on a slower one
+                            self._waiting[seq] = backend.name
+                            break
+                        try:
+                            worker = backend.pool.acquire(timeout=0)
+                        except TimeoutError:
+                            # Still loading its model
+                            continue
+                        except RuntimeError:
+                            backend.down_until = now + self.retry_seconds
+                            metrics.log_event("backend_down", backend=backend.name)
+                            continue
+                        backend.running[id(worker)] = time.perf_counter()
+                        self._held[id(worker)] = backend
+                        self._cond.notify_all()
+                        return worker
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("No whisper-server worker became available")
+                    self._cond.wait(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+            finally:
+                self._waiting.pop(seq, None)
+
+    def release(self, worker):
+        with self._cond:
+            backend = self._held.pop(id(worker))
+            # Back in its pool before waiters are woken, so they see it free
+            backend.pool.release(worker)
+            seconds = time.perf_counter() - backend.running.pop(id(worker))
+            backend.seconds = seconds if backend.seconds is None else \
+                (1 - self.smoothing) * backend.seconds + self.smoothing * seconds
+            backend.requests += 1
+            self._cond.notify_all()
+        metrics.log_event("backend_request", backend=backend.name, seconds=round(seconds, 4))
+
+    @contextmanager
+    def worker(self, timeout=None):
+        with metrics.stage("queue_wait"):
+            worker = self.acquire(timeout)
+        try:
+            yield worker
+        finally:
+            self.release(worker)
+
+def hybrid_pool(cpu_options, model=DEFAULT_MODEL, gpu_size=1, gpu_threads=4, base_port=8080,
+                gpu_base_port=HYBRID_GPU_PORT):
+    """
+    A HybridPool of a GPU pool (`gpu_size` servers using `gpu_threads`
+    host threads in total, on ports from `gpu_base_port`) and a CPU pool
+    (`cpu_options` from autotune.pool_options(), minus the GPU's threads,
+    on ports from `base_port`). Not started.
+    """
+    launchers = whisper_launchers(model=model)
+    cpu_threads = max(1, cpu_options["total_threads"] - gpu_threads)
+    return HybridPool({
+        "gpu": ServerPool(launchers, active="gpu", size=gpu_size, spares=0, standby=False, base_port=gpu_base_port,
+                          total_threads=gpu_threads),
+        "cpu": ServerPool(launchers, active="cpu", size=cpu_options["size"], spares=0, standby=False,
+                          base_port=base_port, total_threads=cpu_threads),
+    })
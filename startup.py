@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+# Cold-start measurement for the GUIs and their PyInstaller builds:
+#   python startup.py -- python app_cpp_cpu_gpu.py
+#   python startup.py --runs 5 --until ready -- dist/Bg-Audio-Transcriber/Bg-Audio-Transcriber.exe
+#
+# The app is started with STT_STARTUP_LOG pointing at a file. The app
+# writes the wall-clock time of each startup mark there ("imported" once
+# its modules are loaded, "window" once the window is drawn, "ready" once
+# inference is available) and quits after the mark named in
+# STT_STARTUP_EXIT. Times are reported from the moment the process was
+# spawned, so they include the interpreter start and, for a frozen build,
+# the bootloader unpacking the bundle.
+
+LOG_ENV = "STT_STARTUP_LOG"
+EXIT_ENV = "STT_STARTUP_EXIT"
+MARKS = ("imported", "window", "ready")
+
+_marks = {}
+
+def mark(name):
+    """
+    Record a startup mark (the first time only). Returns True when the app
+    runs in measurement mode and should quit now.
+    """
+    if name in _marks:
+        return False
+    _marks[name] = time.time()
+    log_path = os.environ.get(LOG_ENV)
+    if not log_path:
+        return False
+    with open(log_path, "w", encoding="utf-8") as f:
+        json.dump(_marks, f)
+    return os.environ.get(EXIT_ENV) == name
+
+def measure(command, until="ready", timeout=300):
+    """
+    Run `command` once in measurement mode; return {mark: seconds since spawn}.
+    """
+    fd, log_path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    env = dict(os.environ, **{LOG_ENV: log_path, EXIT_ENV: until})
+    try:
+        spawned = time.time()
+        proc = subprocess.Popen(command, env=env)
+        try:
+            proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            raise TimeoutError(f"No '{until}' mark within {timeout}s")
+        with open(log_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        marks = json.loads(text) if text else {}
+    finally:
+        os.remove(log_path)
+    if until not in marks:
+        raise RuntimeError(f"The app exited (code {proc.returncode}) before the '{until}' mark")
+    return {name: marks[name] - spawned for name in MARKS if name in marks}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure GUI cold-start time.")
+    parser.add_argument("command", nargs="+", help="how to start the app, e.g. python app_cpp_cpu_gpu.py")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--until", choices=MARKS[1:], default="ready", help="mark after which the app quits")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds allowed per run")
+    args = parser.parse_args(argv)
+
+    runs = []
+    for i in range(args.runs):
+        runs.append(measure(args.command, args.until, args.timeout))
+        print(f"run {i + 1}: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in runs[-1].items()))
+    for name in MARKS:
+        values = [run[name] for run in runs if name in run]
+        if values:
+            print(f"{name:>8}: median {statistics.median(values):.2f}s  min {min(values):.2f}s  max {max(values):.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
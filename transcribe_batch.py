@@ -0,0 +1,329 @@
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import argparse
+import threading
+
+import metrics
+from audio_io import audio_duration
+from autotune import ensure_settings, pool_options
+from language_routing import AUTO, detect_language
+from scheduler import BULK, PRIORITIES
+from chunked_transcription import transcribe_long_audio
+from whisper_server import DEFAULT_LANGUAGE, DEFAULT_MODEL, WINDOWED_MIN_SECONDS, cache_params, transcribe_windowed
+from server_pool import HYBRID, HybridPool, ServerPool, StaticPool, hybrid_pool, whisper_launchers
+from transcript_cache import TranscriptCache
+from transcript_writers import FORMATS, WRITERS, MultiWriter, segments_from_result
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".ogg", ".flac", ".m4a")
+MANIFEST_NAME = ".transcribe-manifest.jsonl"
+
+# Headless batch transcription:
+#   python transcribe_batch.py recordings/ "calls/2025-*/*.mp3" -o transcripts --start-servers 4
+#   python transcribe_batch.py recordings/ -o transcripts --servers 127.0.0.1:8080 127.0.0.1:8081
+#   python transcribe_batch.py recordings/ -o transcripts --job-service http://127.0.0.1:8000 --priority bulk
+
+def collect_inputs(patterns):
+    """
+    Expand directories (recursively) and glob patterns into a sorted list
+    of audio files.
+    """
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                for name in files:
+                    if name.lower().endswith(AUDIO_EXTENSIONS):
+                        found.add(os.path.abspath(os.path.join(root, name)))
+        else:
+            for path in glob.glob(pattern, recursive=True):
+                if os.path.isfile(path) and path.lower().endswith(AUDIO_EXTENSIONS):
+                    found.add(os.path.abspath(path))
+    return sorted(found)
+
+def output_path_for(audio_path, output_dir, common_root, extension=".txt"):
+    """
+    Mirror the input's location relative to common_root under output_dir,
+    or write next to the input when no output_dir is given.
+    """
+    stem = os.path.splitext(audio_path)[0]
+    if not output_dir:
+        return stem + extension
+    return os.path.join(output_dir, os.path.relpath(stem, common_root) + extension)
+
+def load_manifest(manifest_path):
+    """
+    Return the set of input paths already recorded as finished.
+    """
+    finished = set()
+    if not os.path.exists(manifest_path):
+        return finished
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short by an interruption
+                continue
+            if os.path.exists(entry.get("output", "")):
+                finished.add(entry["path"])
+    return finished
+
+class BatchStats:
+    """
+    Running throughput totals shared by the worker threads.
+    """
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def record(self, audio_seconds, busy_seconds):
+        with self.lock:
+            self.done += 1
+            self.audio_seconds += audio_seconds
+            self.busy_seconds += busy_seconds
+
+    def summary(self):
+        elapsed = max(time.time() - self.started, 1e-9)
+        files_per_hour = self.done * 3600 / elapsed
+        # Real-time factor: wall-clock seconds spent per second of audio
+        rtf = elapsed / self.audio_seconds if self.audio_seconds else 0.0
+        return (f"{self.done}/{self.total} done, {self.failed} failed | "
+                f"{files_per_hour:.1f} files/hour | {self.audio_seconds / 3600:.2f} h audio in "
+                f"{elapsed / 3600:.2f} h | RTF {rtf:.3f}")
+
+def run_batch(inputs, pool, output_dir=None, manifest_path=None, concurrency=1, formats=("txt",),
+              cache=None, diarize=False, language=DEFAULT_LANGUAGE, model=DEFAULT_MODEL, log=print,
+              job_client=None, priority=BULK, deadline=None):
+    """
+    Transcribe `inputs` through `pool` with at most `concurrency` requests in
+    flight, writing one file per input and format (see transcript_writers).
+    Segments are written as the parts of a file finish, to <output>.part
+    files that are renamed once the file is complete.
+    Finished files are appended to the manifest, so an interrupted
+    run skips them when started again. Duplicate recordings are answered
+    from `cache` when one is given. With diarize=True segments are labelled
+    with speakers. language="auto" detects each file's language first.
+    `model` names the model the pool's servers run. With a job_service
+    JobClient the files are submitted there instead (pool is unused), as
+    `priority` jobs due `deadline` seconds after submission, so a shared
+    service can put interactive requests ahead of them. Returns the
+    BatchStats.
+    """
+    common_root = os.path.commonpath([os.path.dirname(p) for p in inputs]) if inputs else ""
+    finished = load_manifest(manifest_path) if manifest_path else set()
+    pending = [p for p in inputs if p not in finished]
+    if finished:
+        log(f"Resuming: {len(inputs) - len(pending)} of {len(inputs)} files already transcribed")
+
+    stats = BatchStats(len(pending))
+    jobs = queue.Queue()
+    for path in pending:
+        jobs.put(path)
+
+    manifest_lock = threading.Lock()
+    manifest = open(manifest_path, "a", encoding="utf-8") if manifest_path else None
+
+    def worker_loop():
+        while True:
+            try:
+                audio_path = jobs.get_nowait()
+            except queue.Empty:
+                return
+            out_paths = [output_path_for(audio_path, output_dir, common_root, "." + fmt) for fmt in formats]
+            writer = None
+            try:
+                duration = audio_duration(audio_path)
+                os.makedirs(os.path.dirname(out_paths[0]) or ".", exist_ok=True)
+                writer = MultiWriter([WRITERS["." + fmt](out_path + ".part") for fmt, out_path in zip(formats, out_paths)])
+
+                def write_segments(part):
+                    with metrics.stage("write"):
+                        writer.write_all(segments_from_result({"segments": part}))
+
+                t0 = time.time()
+                params = cache_params(diarize=diarize)
+                result = cache.get(audio_path, model, language, params) if cache is not None else None
+                streamed = False
+                if result is None and job_client is not None:
+                    job_id = job_client.submit(audio_path, diarize=diarize, language=language, priority=priority,
+                                               deadline=deadline)
+                    status = job_client.wait(job_id)
+                    if status["status"] != "done":
+                        raise RuntimeError(status["error"] or f"job {status['status']}")
+                    result = job_client.result(job_id)
+                    if cache is not None:
+                        cache.put(audio_path, model, language, result, params)
+                elif result is None:
+                    file_language = detect_language(audio_path, pool, model)[0] if language == AUTO else language
+                    if duration > WINDOWED_MIN_SECONDS and not diarize:
+                        # Constant memory: one server works through the file window by window
+                        with pool.worker() as worker:
+                            result = transcribe_windowed(audio_path, model_path=model, host=worker.host,
+                                                         port=worker.port, language=file_language,
+                                                         on_segments=write_segments)
+                    else:
+                        result = transcribe_long_audio(audio_path, pool, model_path=model, language=file_language,
+                                                       diarize=diarize, on_segments=write_segments)
+                    streamed = True
+                    result["language"] = file_language
+                    if cache is not None:
+                        cache.put(audio_path, model, language, result, params)
+                busy = time.time() - t0
+
+                if not streamed:
+                    with metrics.stage("write"):
+                        writer.write_all(segments_from_result(result))
+                writer.close()
+                writer = None
+                for out_path in out_paths:
+                    os.replace(out_path + ".part", out_path)
+
+                stats.record(duration, busy)
+                if manifest is not None:
+                    entry = {"path": audio_path, "output": out_paths[-1], "outputs": out_paths,
+                             "audio_seconds": duration, "seconds": busy}
+                    with manifest_lock:
+                        manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                        manifest.flush()
+                log(f"[{stats.done}/{stats.total}] {audio_path} ({duration:.0f}s audio, {busy:.1f}s)")
+                metrics.log_event("file_done", path=audio_path, audio_seconds=duration, seconds=round(busy, 3))
+            except Exception as e:
+                if writer is not None:
+                    writer.close()
+                    for out_path in out_paths:
+                        try:
+                            os.remove(out_path + ".part")
+                        except OSError:
+                            pass
+                with stats.lock:
+                    stats.failed += 1
+                log(f"FAILED {audio_path}: {e}")
+                metrics.log_event("file_failed", path=audio_path, error=str(e))
+
+    threads = [threading.Thread(target=worker_loop, daemon=True) for _ in range(max(1, concurrency))]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # join() with a timeout keeps Ctrl+C responsive on Windows
+            while thread.is_alive():
+                thread.join(1.0)
+    finally:
+        if manifest is not None:
+            manifest.close()
+    return stats
+
+def parse_endpoint(value):
+    host, _, port = value.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe folders of audio files with whisper-server.")
+    parser.add_argument("inputs", nargs="+", help="audio files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", help="where to write transcripts (default: next to each input)")
+    parser.add_argument("-j", "--concurrency", type=int, help="requests in flight (default: number of servers)")
+    parser.add_argument("--manifest", help=f"resume manifest (default: <output-dir>/{MANIFEST_NAME})")
+    parser.add_argument("--servers", nargs="+", metavar="HOST:PORT", help="use already running servers")
+    parser.add_argument("--job-service", metavar="URL", help="submit the files to a running job_service.py instead")
+    parser.add_argument("--priority", choices=list(PRIORITIES), default=BULK,
+                        help="priority of the submitted jobs (--job-service; default: bulk)")
+    parser.add_argument("--deadline", type=float, metavar="SECONDS",
+                        help="each submitted job should finish this many seconds after it is queued (--job-service)")
+    parser.add_argument("--start-servers", type=int, metavar="N", help="start N managed servers (default: autotuned)")
+    parser.add_argument("--device", choices=["cpu", "gpu", HYBRID], default="cpu",
+                        help="hybrid runs CPU and GPU servers side by side, routing by measured speed")
+    parser.add_argument("--threads", type=int, help="total threads shared by the started servers (default: autotuned)")
+    parser.add_argument("-f", "--formats", nargs="+", choices=FORMATS, default=["txt"],
+                        help="transcript formats to write per input (default: txt)")
+    parser.add_argument("--diarize", action="store_true", help="label segments with speakers")
+    parser.add_argument("-l", "--language", default=DEFAULT_LANGUAGE,
+                        help=f"spoken language code, or 'auto' to detect it per file (default: {DEFAULT_LANGUAGE})")
+    parser.add_argument("-m", "--model", help=f"model file for the started servers (default: {DEFAULT_MODEL})")
+    parser.add_argument("--latency-budget", type=float, metavar="SECONDS",
+                        help="pick the most accurate measured model that transcribes the longest input in time")
+    parser.add_argument("--no-cache", action="store_true", help="always transcribe, ignoring the transcript cache")
+    parser.add_argument("--cache-dir", help="transcript cache location")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port while running")
+    parser.add_argument("--json-log", metavar="PATH", help="append per-stage timings as JSON lines ('-' for stderr)")
+    parser.add_argument("--trace", action="store_true", help="emit OpenTelemetry spans (needs opentelemetry-api)")
+    args = parser.parse_args(argv)
+
+    metrics.configure_json_log(args.json_log)
+    if args.trace and not metrics.enable_tracing():
+        print("OpenTelemetry is not installed; --trace ignored")
+    if args.metrics_port:
+        metrics.start_metrics_server(args.metrics_port)
+
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        parser.error("no audio files matched the given inputs")
+
+    if args.output_dir:
+        args.output_dir = os.path.abspath(args.output_dir)
+    manifest_path = args.manifest or os.path.join(args.output_dir or ".", MANIFEST_NAME)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    # Hybrid runs use the CPU calibration and measurements
+    device = "cpu" if args.device == HYBRID else args.device
+    model = args.model
+    if model is None and args.latency_budget:
+        from model_manager import choose_model, load_report
+        model = choose_model(load_report(device), max(audio_duration(path) for path in inputs), args.latency_budget)
+        print(f"Using {model} for a {args.latency_budget:.0f}s latency budget" if model else
+              "No model measurements yet (python model_manager.py --evaluate); using the default model")
+    model = model or DEFAULT_MODEL
+
+    job_client = None
+    if args.job_service:
+        from job_service import JobClient
+        job_client = JobClient(args.job_service)
+    if job_client is not None:
+        # The service's servers do the work
+        pool = None
+    elif args.servers:
+        pool = StaticPool([parse_endpoint(s) for s in args.servers])
+    else:
+        if args.start_servers and args.threads:
+            # Explicit settings replace the tuned ones, pinning included
+            options = {"size": args.start_servers, "total_threads": args.threads, "affinity": None}
+        else:
+            options = pool_options(ensure_settings(device, model))
+            if args.start_servers or args.threads:
+                options = {"size": args.start_servers or options["size"],
+                           "total_threads": args.threads or options["total_threads"], "affinity": None}
+        if args.device == HYBRID:
+            pool = hybrid_pool(options, model=model).start()
+        else:
+            pool = ServerPool(whisper_launchers(model=model), active=args.device, spares=0, standby=False,
+                              **options).start()
+        print(f"Waiting for {pool.size} {args.device.upper()} server(s) to load the model...")
+        pool.wait_ready(pool.size)
+
+    try:
+        stats = run_batch(inputs, pool, output_dir=args.output_dir, manifest_path=manifest_path,
+                          concurrency=args.concurrency or (pool.size if pool else 4), formats=args.formats,
+                          diarize=args.diarize, language=args.language, model=model, job_client=job_client,
+                          priority=args.priority, deadline=args.deadline,
+                          cache=None if args.no_cache else TranscriptCache(args.cache_dir))
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun the same command to resume.")
+        return 130
+    finally:
+        if isinstance(pool, (ServerPool, HybridPool)):
+            pool.stop()
+
+    print(stats.summary())
+    return 1 if stats.failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import atexit
+import argparse
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 90
+# A full eviction scan stats every entry, so it runs when the running size
+# estimate passes max_bytes or at most this often for the age limit
+EVICT_INTERVAL_SECONDS = 3600
+INDEX_SAVE_SECONDS = 30
+
+def default_cache_dir():
+    """
+    Per-user cache folder (%LOCALAPPDATA% on Windows, ~/.cache elsewhere).
+    """
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "speech-to-text", "transcripts")
+
+def hash_audio(audio_path, chunk_size=CHUNK_SIZE):
+    """
+    SHA-256 of the file contents, read in fixed-size chunks so large
+    recordings are never held in memory.
+    """
+    digest = hashlib.sha256()
+    with open(audio_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class TranscriptCache:
+    """
+    Persistent content-addressed store of transcription results.
+
+    The key combines a hash of the audio bytes with the model filename,
+    language and decode parameters, so renamed or re-uploaded copies of the
+    same recording hit the cache while any change to how it is decoded misses.
+    Entries are evicted by age and, least recently used first, by total size.
+    """
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(self.cache_dir, "file-hashes.json")
+        self._index = None
+        self._index_dirty = False
+        self._index_saved = 0.0
+        self._bytes = None
+        self._last_evict = 0.0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        atexit.register(self.flush)
+
+    # ------------------- keys -------------------
+
+    def audio_hash(self, audio_path):
+        """
+        Hash of the audio file, reusing the previous hash while the file's
+        size and modification time are unchanged.
+        """
+        path = os.path.abspath(audio_path)
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        with self._lock:
+            index = self._load_index()
+            known = index.get(path)
+            if known and known[:2] == stamp:
+                return known[2]
+        digest = hash_audio(path)
+        with self._lock:
+            index = self._load_index()
+            index[path] = stamp + [digest]
+            self._index_dirty = True
+            # Saved now and then rather than per file; flush() writes the rest
+            if time.time() - self._index_saved >= INDEX_SAVE_SECONDS:
+                self._save_index(index)
+        return digest
+
+    def make_key(self, audio_path, model, language, params=None):
+        payload = json.dumps({
+            "audio": self.audio_hash(audio_path),
+            "model": os.path.basename(model),
+            "language": language,
+            "params": params or {},
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    # ------------------- lookups -------------------
+
+    def get(self, audio_path, model, language, params=None):
+        """
+        Return the cached result for this audio and decode setup, or None.
+        """
+        path = self._entry_path(self.make_key(audio_path, model, language, params))
+        try:
+            # Expired by last access, the same clock evict() uses
+            if self.max_age and time.time() - os.stat(path).st_mtime > self.max_age:
+                self._unlink(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # The modification time doubles as the last-access time for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["result"]
+
+    def put(self, audio_path, model, language, result, params=None):
+        """
+        Store a result and evict old entries if the cache grew past its
+        limits (tracked with a running size, see EVICT_INTERVAL_SECONDS).
+        """
+        key = self.make_key(audio_path, model, language, params)
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            "created": time.time(),
+            "source": os.path.abspath(audio_path),
+            "model": os.path.basename(model),
+            "language": language,
+            "params": params or {},
+            "result": result,
+        }
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += os.path.getsize(path) - replaced
+            due = (self._bytes is None or (self.max_bytes and self._bytes > self.max_bytes)
+                   or time.time() - self._last_evict >= EVICT_INTERVAL_SECONDS)
+        if due:
+            self.evict()
+
+    def cached(self, audio_path, model, language, compute, params=None):
+        """
+        Return the cached result, or call compute() and cache what it returns.
+        """
+        result = self.get(audio_path, model, language, params)
+        if result is None:
+            result = compute()
+            self.put(audio_path, model, language, result, params)
+        return result
+
+    # ------------------- maintenance -------------------
+
+    def entries(self):
+        """
+        List (path, size, last_access) for every cached result.
+        """
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json") and root != self.cache_dir:
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    found.append((path, st.st_size, st.st_mtime))
+        return found
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            "cache_dir": self.cache_dir,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "oldest_access": min((t for _, _, t in entries), default=None),
+        }
+
+    def evict(self):
+        """
+        Drop entries not used within max_age, then the least recently used
+        ones until the cache fits in max_bytes, and forget the hashes of
+        files that no longer exist. Returns the number removed.
+        """
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        now = time.time()
+        removed = 0
+        total = sum(size for _, size, _ in entries)
+        for path, size, accessed in entries:
+            expired = self.max_age and now - accessed > self.max_age
+            if not expired and (not self.max_bytes or total <= self.max_bytes):
+                continue
+            if self._unlink(path):
+                removed += 1
+                total -= size
+        with self._lock:
+            self._bytes = total
+            self._last_evict = now
+            index = self._load_index()
+            missing = [path for path in index if not os.path.exists(path)]
+            for path in missing:
+                del index[path]
+            if missing or self._index_dirty:
+                self._save_index(index)
+        return removed
+
+    def flush(self):
+        """
+        Write pending file-hash index updates.
+        """
+        with self._lock:
+            if self._index_dirty:
+                self._save_index(self._load_index())
+
+    def purge(self, older_than_days=None):
+        """
+        Remove every entry, or only those not used for older_than_days.
+        Returns the number removed.
+        """
+        cutoff = time.time() - older_than_days * 86400 if older_than_days is not None else None
+        removed = 0
+        for path, _, accessed in self.entries():
+            if cutoff is None or accessed < cutoff:
+                removed += self._unlink(path)
+        if cutoff is None:
+            with self._lock:
+                self._index = {}
+                self._index_dirty = False
+                self._bytes = 0
+                self._unlink(self._index_path)
+        else:
+            with self._lock:
+                self._bytes = None
+        return removed
+
+    def _unlink(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self, index):
+        self._index_dirty = False
+        self._index_saved = time.time()
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self._index_path)
+        except OSError:
+            # The hash index only saves re-reading files; losing it is harmless
+            pass
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or purge the transcript cache.")
+    parser.add_argument("--cache-dir", help=f"cache location (default: {default_cache_dir()})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="show size and entry count")
+    sub.add_parser("list", help="list cached transcripts")
+    purge = sub.add_parser("purge", help="delete cached transcripts")
+    purge.add_argument("--older-than", type=float, metavar="DAYS", help="only entries unused for DAYS days")
+    args = parser.parse_args(argv)
+
+    cache = TranscriptCache(args.cache_dir)
+    if args.command == "stats":
+        for name, value in cache.stats().items():
+            print(f"{name}: {value}")
+    elif args.command == "list":
+        for path, size, accessed in sorted(cache.entries(), key=lambda e: e[2], reverse=True):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(accessed))
+            print(f"{when}  {size:>9}  {entry.get('model')}  {entry.get('language')}  {entry.get('source')}")
+    elif args.command == "purge":
+        print(f"Removed {cache.purge(args.older_than)} entries")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import tkinter as tk
+
+PAGE_PIECES = 500
+
+class TranscriptView:
+    """
+    Shows a growing transcript in a Tk Text widget at constant cost per update.
+
+    The full transcript lives in a Python list of pieces (segments or final
+    live phrases); the widget only ever holds one page of them. While the
+    last page is shown, new pieces are inserted at the end and the oldest
+    line is dropped once the page is full, so an append never touches the
+    rest of the text. Earlier pages are rebuilt on demand by page_up().
+    Call every method from the Tk thread.
+    """
+    def __init__(self, text_widget, page_pieces=PAGE_PIECES, separator="\n", on_page_change=None):
+        self.widget = text_widget
+        self.page_pieces = page_pieces
+        self.separator = separator
+        self.on_page_change = on_page_change or (lambda first, last, total: None)
+        self.pieces = []
+        self.first = 0
+        self.widget.tag_configure("partial", foreground="#888888")
+
+    @property
+    def following(self):
+        """
+        True while the newest piece is on screen.
+        """
+        return self.first + self._shown() >= len(self.pieces)
+
+    def _shown(self):
+        return min(self.page_pieces, len(self.pieces) - self.first)
+
+    def _at_bottom(self):
+        return self.widget.yview()[1] >= 0.999
+
+    def _notify(self):
+        self.on_page_change(self.first, self.first + self._shown(), len(self.pieces))
+
+    def _clear_partial(self):
+        if self.widget.tag_ranges("partial"):
+            self.widget.delete("partial.first", "partial.last")
+
+    def clear(self):
+        self.pieces = []
+        self.first = 0
+        self.widget.delete("1.0", tk.END)
+        self._notify()
+
+    def text(self):
+        return self.separator.join(self.pieces)
+
+    def append(self, piece):
+        piece = piece.strip()
+        if not piece:
+            return
+        following = self.following
+        stick = self._at_bottom()
+        self.pieces.append(piece)
+        if not following:
+            self._notify()
+            return
+
+        self._clear_partial()
+        if len(self.pieces) > 1:
+            self.widget.insert(tk.END + "-1c", self.separator)
+        self.widget.insert(tk.END + "-1c", piece)
+        if len(self.pieces) - self.first > self.page_pieces:
+            # Drop the oldest piece on the page (its text plus the separator)
+            self.widget.delete("1.0", f"1.0+{len(self.pieces[self.first]) + len(self.separator)}c")
+            self.first += 1
+        if stick:
+            self.widget.see(tk.END)
+        self._notify()
+
+    def set_partial(self, text):
+        """
+        Show provisional (grey) text after the last piece, replacing the previous one.
+        """
+        if not self.following:
+            return
+        self._clear_partial()
+        if text:
+            prefix = self.separator if self.pieces else ""
+            self.widget.insert(tk.END + "-1c", prefix + text, "partial")
+            self.widget.see(tk.END)
+
+    def show_page(self, first):
+        """
+        Rebuild the widget with the page starting at piece `first`.
+        """
+        self.first = max(0, min(first, max(0, len(self.pieces) - self.page_pieces)))
+        self.widget.delete("1.0", tk.END)
+        self.widget.insert("1.0", self.separator.join(self.pieces[self.first:self.first + self.page_pieces]))
+        self._notify()
+
+    def page_up(self):
+        self.show_page(self.first - self.page_pieces)
+        self.widget.see("1.0")
+
+    def page_down(self):
+        self.show_page(self.first + self.page_pieces)
+        if self.following:
+            self.widget.see(tk.END)
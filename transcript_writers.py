@@ -0,0 +1,212 @@
+import os
+import json
+import math
+
+# Timestamped transcript output. Writers stream each segment to disk as it
+# arrives, so memory use does not grow with the length of the recording:
+#   with open_writers("call", [".srt", ".vtt"]) as writer:
+#       for segment in segments_from_result(result):
+#           writer.write(segment)
+
+class Segment:
+    """
+    One timestamped piece of a transcript. Times are seconds from the start
+    of the original recording; confidence is in [0, 1] when the server
+    reported token probabilities, otherwise None. speaker is set when the
+    transcription ran with diarization.
+    """
+    def __init__(self, start, end, text, confidence=None, speaker=None):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.confidence = confidence
+        self.speaker = speaker
+
+    def __repr__(self):
+        return f"<Segment {self.start:.2f}-{self.end:.2f} {self.text[:30]!r}>"
+
+    def to_dict(self):
+        entry = {"start": round(self.start, 3), "end": round(self.end, 3), "text": self.text,
+                 "confidence": None if self.confidence is None else round(self.confidence, 4)}
+        if self.speaker is not None:
+            entry["speaker"] = self.speaker
+        return entry
+
+    def labelled_text(self):
+        """
+        The text prefixed with the speaker, e.g. "SPEAKER_1: Hello".
+        """
+        return f"{self.speaker}: {self.text}" if self.speaker else self.text
+
+def segment_confidence(segment):
+    """
+    Mean word probability of a verbose_json segment, or exp(avg_logprob)
+    when the server did not include per-word probabilities.
+    """
+    words = [w["probability"] for w in segment.get("words", []) if "probability" in w]
+    if words:
+        return sum(words) / len(words)
+    if "avg_logprob" in segment:
+        return math.exp(segment["avg_logprob"])
+    return None
+
+def segments_from_result(result, offset=0.0):
+    """
+    Segments of a server response (response_format=verbose_json), shifted by
+    `offset` seconds. A plain {"text": ...} result, e.g. from an older cache
+    entry, becomes a single segment covering the whole recording.
+    """
+    if "segments" not in result:
+        text = result.get("text", "").strip()
+        if not text:
+            return []
+        duration = result.get("duration") or result.get("audio_seconds") or 0.0
+        return [Segment(offset, offset + duration, text)]
+    return [
+        Segment(offset + s.get("start", 0.0), offset + s.get("end", 0.0), s.get("text", "").strip(),
+                segment_confidence(s), s.get("speaker"))
+        for s in result["segments"] if s.get("text", "").strip()
+    ]
+
+def format_timestamp(seconds, separator="."):
+    """
+    HH:MM:SS.mmm (SRT uses a comma before the milliseconds).
+    """
+    milliseconds = int(round(max(0.0, seconds) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+class SegmentWriter:
+    """
+    Base class: opens `path`, writes a header, then one entry per segment,
+    flushing after each so the file is usable while transcription runs.
+    """
+    extension = None
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path, "w", encoding="utf-8", newline="\n")
+        self.write_header()
+
+    def write_header(self):
+        pass
+
+    def format(self, segment):
+        raise NotImplementedError
+
+    def write(self, segment):
+        self.count += 1
+        self._file.write(self.format(segment))
+        self._file.flush()
+
+    def write_all(self, segments):
+        for segment in segments:
+            self.write(segment)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class TextWriter(SegmentWriter):
+    extension = ".txt"
+
+    def format(self, segment):
+        return segment.labelled_text() + "\n"
+
+class SrtWriter(SegmentWriter):
+    extension = ".srt"
+
+    def format(self, segment):
+        return (f"{self.count}\n{format_timestamp(segment.start, ',')} --> {format_timestamp(segment.end, ',')}\n"
+                f"{segment.labelled_text()}\n\n")
+
+class VttWriter(SegmentWriter):
+    extension = ".vtt"
+
+    def write_header(self):
+        self._file.write("WEBVTT\n\n")
+
+    def format(self, segment):
+        # WebVTT voice span for the speaker
+        text = f"<v {segment.speaker}>{segment.text}" if segment.speaker else segment.text
+        return f"{format_timestamp(segment.start)} --> {format_timestamp(segment.end)}\n{text}\n\n"
+
+class JsonLinesWriter(SegmentWriter):
+    extension = ".jsonl"
+
+    def format(self, segment):
+        return json.dumps(segment.to_dict(), ensure_ascii=False) + "\n"
+
+class TsvWriter(SegmentWriter):
+    """
+    start/end in integer milliseconds, as openai-whisper writes TSV.
+    """
+    extension = ".tsv"
+
+    def write_header(self):
+        self._file.write("start\tend\tspeaker\tconfidence\ttext\n")
+
+    def format(self, segment):
+        confidence = "" if segment.confidence is None else f"{segment.confidence:.4f}"
+        text = segment.text.replace("\t", " ").replace("\n", " ")
+        return (f"{int(round(segment.start * 1000))}\t{int(round(segment.end * 1000))}\t{segment.speaker or ''}\t"
+                f"{confidence}\t{text}\n")
+
+WRITERS = {cls.extension: cls for cls in (TextWriter, SrtWriter, VttWriter, JsonLinesWriter, TsvWriter)}
+FORMATS = tuple(ext.lstrip(".") for ext in WRITERS)
+
+def open_writer(path):
+    """
+    Writer for the format named by the file extension.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError(f"Unsupported transcript format '{extension}' (use one of {', '.join(WRITERS)})")
+    return WRITERS[extension](path)
+
+class MultiWriter:
+    """
+    Sends every segment to several writers, e.g. .srt and .vtt at once.
+    """
+    def __init__(self, writers):
+        self.writers = writers
+
+    def write(self, segment):
+        for writer in self.writers:
+            writer.write(segment)
+
+    def write_all(self, segments):
+        for segment in segments:
+            self.write(segment)
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_writers(stem, formats):
+    """
+    One writer per format ("srt" or ".srt") for <stem>.<format>.
+    """
+    writers = []
+    try:
+        for fmt in formats:
+            writers.append(open_writer(stem + "." + fmt.lstrip(".")))
+    except Exception:
+        for writer in writers:
+            writer.close()
+        raise
+    return MultiWriter(writers)
@@ -1,7 +1,5 @@
 import os
 import sys
-import torch
-import whisper
 import threading
 import webbrowser
 import ttkbootstrap as ttk
@@ -19,16 +17,70 @@ else:
 ffmpeg_path = os.path.join(project_dir, "ffmpeg", "bin")
 os.environ["PATH"] += os.pathsep + ffmpeg_path
 
+# Shared modules (transcript_cache, ...) live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import startup
+from transcript_cache import TranscriptCache
+from model_registry import ModelRegistry
+
+startup.mark("imported")
+
+transcript_cache = TranscriptCache()
+# Both bundled models fit together, so switching between them never reloads
+model_registry = ModelRegistry(memory_budget=12 * 1024 ** 3)
+
+# torch and whisper take seconds to import, so they are imported on a
+# background thread once the window is up; a transcription started
+# earlier waits for them
+backend_ready = threading.Event()
+backend = {}
+
 models_dir = os.path.join(project_dir, "models")
 available_models = {
     "Whisper-Large-v3 (slow & precise)": "large-v3.pt",
     "Whisper-Turbo-v3 (fast & less precise)": "large-v3-turbo.pt"
 }
+# "auto" lets Whisper detect the language from the first 30 seconds
+languages = ["bg", "en", "ru", "auto"]
+
+def load_backend():
+    """
+    Import torch and whisper off the Tk thread and pick the device.
+    """
+    try:
+        import torch
+        import whisper
+        from batched_transcription import BatchedTranscriber
+        backend["device"] = "cuda" if torch.cuda.is_available() else "cpu"
+    except Exception as e:
+        backend["error"] = e
+    backend_ready.set()
+
+def show_readiness():
+    """
+    Poll the background imports and show whether inference is available.
+    """
+    if not backend_ready.is_set():
+        label_ready.config(text="Loading PyTorch...", bootstyle="warning")
+        root.after(200, show_readiness)
+    elif "error" in backend:
+        label_ready.config(text=f"PyTorch unavailable: {backend['error']}", bootstyle="danger")
+    else:
+        label_ready.config(text=f"Ready ({backend['device'].upper()})", bootstyle="success")
+        if startup.mark("ready"):
+            root.destroy()
+
+def on_window_shown():
+    if startup.mark("window"):
+        root.destroy()
+        return
+    threading.Thread(target=load_backend, daemon=True).start()
+    show_readiness()
 
 def transcribe_file():
 
-    file_path = filedialog.askopenfilename(filetypes=[("Audio Files", "*.mp3 *.wav *.m4a")])
-    if not file_path:
+    file_paths = filedialog.askopenfilenames(filetypes=[("Audio Files", "*.mp3 *.wav *.m4a")])
+    if not file_paths:
         return
 
     selected_model = model_combobox.get()
@@ -38,22 +90,43 @@ def transcribe_file():
 
     model_filename = available_models[selected_model]
     model_path = os.path.join(models_dir, model_filename)
-
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    label_status.config(text=f"Preparing to load model '{selected_model}' on {device.upper()}, please wait...")
-    root.update()
+    language = language_combobox.get()
 
     def perform_transcription():
         try:
-
-            label_status.config(text="Loading model, please wait...")
-            root.update()
-            model = whisper.load_model(model_path, device=device)
-
-            label_status.config(text="Transcribing audio... Please wait.")
-            root.update()
-            result = model.transcribe(file_path, language="bg")
-            transcription = result["text"]
+            if not backend_ready.is_set():
+                label_status.config(text="Loading PyTorch, please wait...")
+                backend_ready.wait()
+            if "error" in backend:
+                raise backend["error"]
+            from batched_transcription import BatchedTranscriber
+            device = backend["device"]
+            label_status.config(text=f"Preparing to load model '{selected_model}' on {device.upper()}, please wait...")
+
+            results = {path: transcript_cache.get(path, model_filename, language) for path in file_paths}
+            missing = [path for path, result in results.items() if result is None]
+            if missing:
+                if not model_registry.is_loaded(model_path, device):
+                    label_status.config(text="Loading model, please wait...")
+                    root.update()
+                model = model_registry.get(model_path, device)
+
+                label_status.config(text="Transcribing audio... Please wait.")
+                root.update()
+                if len(missing) == 1:
+                    results[missing[0]] = model.transcribe(missing[0], language=None if language == "auto" else language)
+                else:
+                    # Several files: their 30-second windows share encoder/decoder passes
+                    transcriber = BatchedTranscriber(model, language=None if language == "auto" else language)
+                    results.update(transcriber.transcribe(missing))
+                for path in missing:
+                    transcript_cache.put(path, model_filename, language,
+                                         {"text": results[path]["text"], "language": results[path].get("language")})
+            if len(file_paths) == 1:
+                transcription = results[file_paths[0]]["text"]
+            else:
+                transcription = "\n\n".join(f"=== {os.path.basename(path)} ===\n{results[path]['text'].strip()}"
+                                             for path in file_paths)
 
             text_output.delete(1.0, END)
             text_output.insert(END, transcription)
@@ -107,7 +180,7 @@ root.grid_columnconfigure(0, weight=1)
 button_frame = ttk.Frame(root, padding=10)
 button_frame.grid(row=0, column=0, pady=5, sticky="ew")
 
-ttk.Button(button_frame, text="Select Audio File", command=transcribe_file, bootstyle=PRIMARY).pack(side='left', padx=5)
+ttk.Button(button_frame, text="Select Audio Files", command=transcribe_file, bootstyle=PRIMARY).pack(side='left', padx=5)
 ttk.Button(button_frame, text="Save Output", command=save_output, bootstyle=SUCCESS).pack(side='left', padx=5)
 ttk.Label(button_frame, text="Select Model:", bootstyle="inverse").pack(side='left', padx=5)
 
@@ -115,10 +188,18 @@ model_combobox = ttk.Combobox(button_frame, values=list(available_models.keys())
 model_combobox.pack(side='left', padx=5)
 model_combobox.set(list(available_models.keys())[0])  # Set first model as default
 
+ttk.Label(button_frame, text="Language:", bootstyle="inverse").pack(side='left', padx=5)
+language_combobox = ttk.Combobox(button_frame, values=languages, state="readonly", width=6)
+language_combobox.pack(side='left', padx=5)
+language_combobox.set(languages[0])
+
 status_font = tkFont.Font(family="Helvetica", size=12, weight="bold")
 label_status = ttk.Label(root, text="Status: Idle", font=status_font, bootstyle="info")
 label_status.grid(row=2, column=0, pady=5)
 
+label_ready = ttk.Label(button_frame, text="", bootstyle="warning")
+label_ready.pack(side='right', padx=5)
+
 text_frame = ttk.Frame(root, padding=10)
 text_frame.grid(row=1, column=0, sticky="nsew", padx=5)
 text_frame.grid_rowconfigure(0, weight=1)
@@ -143,4 +224,5 @@ github_dev_link = ttk.Label(link_frame, text="Developed by Metodi Simeonov", for
 github_dev_link.pack(pady=2)
 github_dev_link.bind("<Button-1>", open_github_dev_link)
 
+root.after_idle(on_window_shown)
 root.mainloop()
@@ -3,7 +3,7 @@
 
 a = Analysis(
     ['app.py'],
-    pathex=[],
+    pathex=['..'],
     binaries=[],
     datas=[
     ("E:/Dev/Projects/speech-to-text/.tts/Lib/site-packages/whisper/assets", "whisper/assets"),
@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import argparse
+import itertools
+import torch
+import whisper
+from whisper.audio import N_SAMPLES, SAMPLE_RATE
+from whisper.tokenizer import get_tokenizer
+
+from model_registry import load_whisper_checkpoint
+
+# Batched transcription for the PyTorch (openai-whisper) backend:
+#   python utils/batched_transcription.py clips/*.mp3 --model models/large-v3-turbo.pt --batch-size 16
+#
+# model.transcribe() runs the encoder on one 30-second window at a time.
+# Here 30-second windows are gathered from many files (or from the chunks
+# of one long file), their log-mel spectrograms are stacked into one
+# tensor, and the encoder and the greedy decoder run over the whole batch.
+# Windows are decoded independently (no previous-text conditioning), which
+# is what makes them batchable.
+
+BATCH_SIZE = 16
+TIME_PRECISION = 0.02
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+
+def file_windows(path):
+    """
+    Yield (offset_seconds, samples) 30-second windows of a file.
+    """
+    audio = whisper.load_audio(path)
+    for start in range(0, max(len(audio), 1), N_SAMPLES):
+        yield start / SAMPLE_RATE, audio[start:start + N_SAMPLES]
+
+def timestamped_segments(tokens, tokenizer, offset):
+    """
+    Split decoded tokens at timestamp tokens into segments with times on
+    the file's timeline. Text after the last timestamp becomes a segment
+    ending at the window end.
+    """
+    segments = []
+    start = None
+    text_tokens = []
+    for token in tokens:
+        if token >= tokenizer.timestamp_begin:
+            time_value = (token - tokenizer.timestamp_begin) * TIME_PRECISION
+            if start is None:
+                start = time_value
+            elif text_tokens:
+                segments.append({"start": offset + start, "end": offset + time_value,
+                                 "text": tokenizer.decode(text_tokens).strip()})
+                text_tokens = []
+                start = None
+            else:
+                start = time_value
+        elif token < tokenizer.eot:
+            text_tokens.append(token)
+    if text_tokens:
+        segments.append({"start": offset + (start or 0.0), "end": offset + N_SAMPLES / SAMPLE_RATE,
+                         "text": tokenizer.decode(text_tokens).strip()})
+    return [s for s in segments if s["text"]]
+
+class BatchedTranscriber:
+    """
+    Transcribes many files with the encoder and decoder running on batches
+    of up to `batch_size` 30-second windows. Each file gets its own result
+    ({"text", "segments", "language"}) as from model.transcribe().
+    language=None detects the language per window.
+    """
+    def __init__(self, model, batch_size=BATCH_SIZE, language=None, fp16=None):
+        self.model = model
+        self.batch_size = batch_size
+        self.language = language
+        self.fp16 = model.device.type != "cpu" if fp16 is None else fp16
+        self.tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages)
+
+    def _decode(self, batch):
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(samples), n_mels=self.model.dims.n_mels)
+            for _, _, samples in batch
+        ]).to(self.model.device)
+        options = whisper.DecodingOptions(task="transcribe", language=self.language, fp16=self.fp16,
+                                          without_timestamps=False)
+        with torch.inference_mode():
+            return whisper.decode(self.model, mels, options)
+
+    def transcribe(self, paths, progress=None):
+        """
+        Return {path: result} for every file. `progress(done)` is called
+        after each batch with the number of windows transcribed so far.
+        """
+        windows = {path: [] for path in paths}
+        languages = {path: {} for path in paths}
+        # Files are decoded as their windows are needed, so only about one
+        # batch of audio is held at a time
+        pending = ((path, offset, samples) for path in paths for offset, samples in file_windows(path))
+        done = 0
+        while True:
+            batch = list(itertools.islice(pending, self.batch_size))
+            if not batch:
+                break
+            for (path, offset, _), result in zip(batch, self._decode(batch)):
+                if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                    continue
+                windows[path].append(timestamped_segments(result.tokens, self.tokenizer, offset))
+                languages[path][result.language] = languages[path].get(result.language, 0) + 1
+            done += len(batch)
+            if progress is not None:
+                progress(done)
+
+        results = {}
+        for path in paths:
+            segments = [segment for part in windows[path] for segment in part]
+            language = max(languages[path], key=languages[path].get) if languages[path] else self.language
+            results[path] = {"text": " ".join(s["text"] for s in segments), "segments": segments,
+                             "language": language}
+        return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe many files with batched PyTorch inference.")
+    parser.add_argument("inputs", nargs="+", help="audio files")
+    parser.add_argument("--model", required=True, help="openai-whisper checkpoint (.pt) or model name")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="30-second windows per forward pass")
+    parser.add_argument("-l", "--language", help="language code (default: detect)")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("-o", "--output-dir", help="write <name>.txt per input here (default: next to each input)")
+    args = parser.parse_args(argv)
+
+    if os.path.isfile(args.model):
+        model = load_whisper_checkpoint(args.model, args.device)
+    else:
+        model = whisper.load_model(args.model, device=args.device)
+    transcriber = BatchedTranscriber(model, batch_size=args.batch_size, language=args.language)
+    started = time.time()
+    results = transcriber.transcribe(args.inputs, progress=lambda done: print(f"{done} windows"))
+    for path, result in results.items():
+        out_dir = args.output_dir or os.path.dirname(os.path.abspath(path))
+        os.makedirs(out_dir, exist_ok=True)
+        out_path = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0] + ".txt")
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(result["text"] + "\n")
+    print(f"{len(results)} file(s) in {time.time() - started:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_BUDGET_BYTES = 8 * 1024 ** 3
+
+def model_nbytes(model):
+    """
+    Memory held by a model's parameters and buffers.
+    """
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors if not t.is_sparse)
+
+def load_whisper_checkpoint(model_path, device, mmap=True):
+    """
+    Load an openai-whisper .pt checkpoint.
+
+    With mmap=True the checkpoint is memory-mapped and its tensors become
+    the model's parameters directly (load_state_dict(assign=True) on a model
+    built on the meta device). The checkpoint is never read into a private
+    in-memory copy next to the model: on GPU the weights go straight from
+    the mapped file to the device, on CPU only the fp32 model is allocated,
+    which cuts cold-start time and peak RAM. Falls back
+    to whisper.load_model() when the checkpoint or torch version does not
+    support it.
+    """
+    import torch
+    import whisper
+
+    if not mmap:
+        return whisper.load_model(model_path, device=device)
+
+    from whisper.model import ModelDimensions, Whisper
+
+    try:
+        checkpoint = torch.load(model_path, map_location="cpu", mmap=True, weights_only=True)
+        dims = ModelDimensions(**checkpoint["dims"])
+        with torch.device("meta"):
+            model = Whisper(dims)
+        model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+    except (TypeError, RuntimeError, KeyError):
+        # torch < 2.1, or a checkpoint written without the zip serialization
+        return whisper.load_model(model_path, device=device)
+
+    # Non-persistent buffers are not in the checkpoint; rebuild them as Whisper.__init__ does
+    n_ctx = dims.n_text_ctx
+    model.decoder.register_buffer("mask", torch.empty(n_ctx, n_ctx).fill_(-float("inf")).triu_(1), persistent=False)
+    all_heads = torch.zeros(dims.n_text_layer, dims.n_text_head, dtype=torch.bool)
+    all_heads[dims.n_text_layer // 2:] = True
+    model.register_buffer("alignment_heads", all_heads.to_sparse(), persistent=False)
+
+    if any(t.is_meta for t in list(model.parameters()) + list(model.buffers())):
+        return whisper.load_model(model_path, device=device)
+
+    if device == "cpu":
+        # Checkpoints store fp16 weights; CPU inference runs in fp32
+        model = model.float()
+    return model.to(device)
+
+class ModelRegistry:
+    """
+    Keeps loaded Whisper models resident between transcriptions.
+
+    Each (model file, device) pair is loaded once on first use and then
+    returned from memory. When loading another model would exceed the
+    memory budget, the least recently used models are released first, so
+    switching back and forth between models that fit together is free.
+    """
+    def __init__(self, memory_budget=DEFAULT_BUDGET_BYTES, mmap=True):
+        self.memory_budget = memory_budget
+        self.mmap = mmap
+        self._models = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def is_loaded(self, model_path, device):
+        with self._lock:
+            return (os.path.abspath(model_path), device) in self._models
+
+    def get(self, model_path, device):
+        """
+        Return the model, loading it first if it is not resident.
+        Concurrent callers asking for the same model share one load.
+        """
+        key = (os.path.abspath(model_path), device)
+        while True:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key]
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            loading.wait()
+
+        try:
+            # Make room before loading; fp16 checkpoints double in size as fp32 on CPU
+            estimate = os.path.getsize(model_path) * (2 if device == "cpu" else 1)
+            with self._lock:
+                self._evict_for(estimate, device)
+            model = load_whisper_checkpoint(model_path, device, mmap=self.mmap)
+            size = model_nbytes(model)
+            with self._lock:
+                self._evict_for(size, device)
+                self._models[key] = model
+                self._sizes[key] = size
+            return model
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    def _evict_for(self, size, device):
+        used = sum(self._sizes.values())
+        while self._models and used + size > self.memory_budget:
+            key, _ = self._models.popitem(last=False)
+            used -= self._sizes.pop(key)
+        if device == "cuda":
+            import torch
+            torch.cuda.empty_cache()
+
+    def unload(self, model_path=None, device=None):
+        """
+        Release one model, or every model when called without arguments.
+        """
+        with self._lock:
+            if model_path is None:
+                self._models.clear()
+                self._sizes.clear()
+            else:
+                key = (os.path.abspath(model_path), device)
+                self._models.pop(key, None)
+                self._sizes.pop(key, None)
@@ -0,0 +1,90 @@
+import os
+import json
+import struct
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stand-in for whisper-server when developing the server pool and clients
+# without the model or the Windows binaries:
+#   python utils/stub-whisper-server.py --port 8080 --load-seconds 3 --delay 0.5
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stub whisper-server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="simulated model load time (/health answers 503)")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds spent on each /inference request")
+    parser.add_argument("--crash-after", type=int, default=0, help="exit after this many requests (0 = never)")
+    parser.add_argument("--text", default="stub transcription")
+    parser.add_argument("--language", default="bulgarian", help="language reported to detect_language requests")
+    return parser.parse_args()
+
+args = parse_args()
+started = time.time()
+served = 0
+
+def wav_seconds(body):
+    """
+    Length of the 16 kHz mono PCM WAV inside a multipart body, or 0.
+    """
+    riff = body.find(b"RIFF")
+    data = body.find(b"data", riff)
+    if riff < 0 or data < 0:
+        return 0.0
+    return struct.unpack("<I", body[data + 4:data + 8])[0] / (16000 * 2)
+
+def stub_segments(seconds, step=10.0):
+    segments = []
+    start = 0.0
+    while start < seconds:
+        end = min(seconds, start + step)
+        segments.append({"id": len(segments), "start": start, "end": end, "text": f" {args.text} {len(segments)}",
+                         "avg_logprob": -0.1})
+        start = end
+    return segments
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *log_args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            if time.time() - started < args.load_seconds:
+                self.send_json(503, {"status": "loading model"})
+            else:
+                self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(200, {"status": "stub whisper-server"})
+
+    def do_POST(self):
+        global served
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.path != "/inference":
+            self.send_json(404, {"error": "not found"})
+            return
+        time.sleep(args.delay)
+        served += 1
+        if b'name="detect_language"' in body:
+            self.send_json(200, {"text": "", "detected_language": args.language, "detected_language_probability": 0.9})
+        elif b"verbose_json" in body:
+            segments = stub_segments(wav_seconds(body))
+            self.send_json(200, {"text": "".join(s["text"] for s in segments), "segments": segments})
+        else:
+            self.send_json(200, {"text": args.text})
+        if args.crash_after and served >= args.crash_after:
+            self.wfile.flush()
+            os._exit(1)
+
+ThreadingHTTPServer((args.host, args.port), StubHandler).serve_forever()
@@ -0,0 +1,175 @@
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from metrics import timed
+
+FRAME_SECONDS = 0.03
+PAD_SECONDS = 0.3
+MIN_SPEECH_SECONDS = 0.25
+MIN_SILENCE_SECONDS = 0.8
+GAP_SECONDS = 0.3
+
+# Optional model-based detector; the NumPy energy/zero-crossing detector is
+# used when it is not installed.
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+def _frames(samples, frame_len):
+    n_frames = len(samples) // frame_len
+    return samples[:n_frames * frame_len].astype(np.float32).reshape(n_frames, frame_len) / 32768.0
+
+def frame_energy_db(samples, frame_seconds=FRAME_SECONDS, sample_rate=SAMPLE_RATE):
+    """
+    Return the RMS level of consecutive non-overlapping frames in dBFS.
+    """
+    frames = _frames(samples, int(frame_seconds * sample_rate))
+    if len(frames) == 0:
+        return np.zeros(0, dtype=np.float32)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-6))
+
+def zero_crossing_rate(samples, frame_seconds=FRAME_SECONDS, sample_rate=SAMPLE_RATE):
+    """
+    Fraction of sign changes per frame.
+    """
+    frames = _frames(samples, int(frame_seconds * sample_rate))
+    if len(frames) == 0:
+        return np.zeros(0, dtype=np.float32)
+    signs = np.signbit(frames)
+    return np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+def energy_speech_frames(samples, frame_seconds=FRAME_SECONDS, sample_rate=SAMPLE_RATE, margin_db=12.0):
+    """
+    Mark frames as speech when they stand margin_db above the estimated
+    noise floor, or are slightly quieter but noisy in the way unvoiced
+    consonants (s, sh, f) are.
+    """
+    energy = frame_energy_db(samples, frame_seconds, sample_rate)
+    if len(energy) == 0:
+        return np.zeros(0, dtype=bool)
+    zcr = zero_crossing_rate(samples, frame_seconds, sample_rate)
+    noise_floor = np.percentile(energy, 10)
+    # Never call anything below -60 dBFS speech, even in a near-silent file
+    threshold = max(noise_floor + margin_db, -60.0)
+    voiced = energy > threshold
+    unvoiced = (energy > threshold - 6.0) & (zcr > 0.25)
+    return voiced | unvoiced
+
+def webrtc_speech_frames(samples, frame_seconds=FRAME_SECONDS, sample_rate=SAMPLE_RATE, aggressiveness=2):
+    """
+    Per-frame speech decisions from the WebRTC GMM voice detector.
+    """
+    if webrtcvad is None:
+        raise RuntimeError("webrtcvad is not installed (pip install webrtcvad)")
+    detector = webrtcvad.Vad(aggressiveness)
+    frame_len = int(frame_seconds * sample_rate)
+    n_frames = len(samples) // frame_len
+    data = np.ascontiguousarray(samples[:n_frames * frame_len], dtype=np.int16).tobytes()
+    step = frame_len * 2
+    return np.array([detector.is_speech(data[i * step:(i + 1) * step], sample_rate) for i in range(n_frames)], dtype=bool)
+
+def _runs(mask):
+    """
+    (start, end) frame index pairs of consecutive True values.
+    """
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(edges[::2], edges[1::2]))
+
+def detect_speech(samples, sample_rate=SAMPLE_RATE, method="energy", frame_seconds=FRAME_SECONDS,
+                  pad_seconds=PAD_SECONDS, min_speech_seconds=MIN_SPEECH_SECONDS,
+                  min_silence_seconds=MIN_SILENCE_SECONDS):
+    """
+    Return speech regions as (start_sample, end_sample) pairs.
+    Pauses shorter than min_silence_seconds are kept inside a region,
+    blips shorter than min_speech_seconds are dropped, and each region is
+    padded so word onsets and endings are not clipped.
+    """
+    if method == "webrtc":
+        mask = webrtc_speech_frames(samples, frame_seconds, sample_rate)
+    else:
+        mask = energy_speech_frames(samples, frame_seconds, sample_rate)
+
+    min_silence = int(min_silence_seconds / frame_seconds)
+    min_speech = int(min_speech_seconds / frame_seconds)
+    pad = int(pad_seconds / frame_seconds)
+
+    merged = []
+    for start, end in _runs(mask):
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    frame_len = int(frame_seconds * sample_rate)
+    regions = []
+    for start, end in merged:
+        if end - start < min_speech:
+            continue
+        start = int(max(0, start - pad) * frame_len)
+        end = int(min(len(samples), (end + pad) * frame_len))
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+class TimeMap:
+    """
+    Maps times in the compressed (speech-only) audio back to the original
+    recording. Each span is (compressed_start, original_start, length) in
+    seconds.
+    """
+    def __init__(self, spans=None):
+        self.spans = spans or []
+
+    def to_original(self, t):
+        """
+        Original-file time for compressed time t. Times in an inserted gap
+        are attached to the end of the preceding speech span.
+        """
+        if not self.spans:
+            return t
+        for compressed_start, original_start, length in reversed(self.spans):
+            if t >= compressed_start:
+                return original_start + min(t - compressed_start, length)
+        return self.spans[0][1]
+
+    def remap_segments(self, segments, start_key="start", end_key="end"):
+        """
+        Rewrite segment timestamps (seconds) in place to refer to the original file.
+        """
+        for segment in segments:
+            if start_key in segment:
+                segment[start_key] = self.to_original(segment[start_key])
+            if end_key in segment:
+                segment[end_key] = self.to_original(segment[end_key])
+        return segments
+
+@timed("vad")
+def remove_silence(samples, sample_rate=SAMPLE_RATE, method="energy", gap_seconds=GAP_SECONDS, regions=None):
+    """
+    Keep only the speech regions, joined by short silent gaps so sentence
+    boundaries survive. Returns (compressed_samples, TimeMap).
+    """
+    if regions is None:
+        regions = detect_speech(samples, sample_rate, method=method)
+    max_gap = int(gap_seconds * sample_rate)
+    pieces = []
+    spans = []
+    position = 0
+    previous_end = None
+    for start, end in regions:
+        if previous_end is not None:
+            # Never insert more silence than the original pause had
+            gap = min(max_gap, start - previous_end)
+            pieces.append(np.zeros(gap, dtype=np.int16))
+            position += gap
+        pieces.append(samples[start:end])
+        spans.append((position / sample_rate, start / sample_rate, (end - start) / sample_rate))
+        position += end - start
+        previous_end = end
+    compressed = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int16)
+    return compressed, TimeMap(spans)
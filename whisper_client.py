@@ -0,0 +1,186 @@
+import io
+import os
+import time
+import uuid
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+CHUNK_SIZE = 256 * 1024
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 3600
+RETRY_STATUSES = (502, 503, 504)
+
+class MultipartStream:
+    """
+    multipart/form-data body that reads the audio in chunks while it is sent.
+    The total length is known up front, so requests sends a Content-Length
+    header instead of buffering the file or falling back to chunked encoding.
+    """
+    def __init__(self, fields, file_field, filename, source, content_type="application/octet-stream",
+                 chunk_size=CHUNK_SIZE):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.chunk_size = chunk_size
+
+        self._owns_file = isinstance(source, (str, os.PathLike))
+        if self._owns_file:
+            self._file = open(source, "rb")
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            self._file = io.BytesIO(source)
+        else:
+            self._file = source
+        self._file_start = self._file.tell()
+        self._file.seek(0, os.SEEK_END)
+        file_length = self._file.tell() - self._file_start
+        self._file.seek(self._file_start)
+
+        head = b"".join(self._field(name, value) for name, value in fields.items())
+        head += (f"--{self.boundary}\r\n"
+                 f"Content-Disposition: form-data; name=\"{file_field}\"; filename=\"{filename}\"\r\n"
+                 f"Content-Type: {content_type}\r\n\r\n").encode("utf-8")
+        tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        self._parts = [io.BytesIO(head), (self._file, file_length), io.BytesIO(tail)]
+        self._length = len(head) + file_length + len(tail)
+        self._index = 0
+        self._file_remaining = file_length
+        # perf_counter() when the last byte was handed to the connection
+        self.sent_at = None
+
+    def _field(self, name, value):
+        return (f"--{self.boundary}\r\n"
+                f"Content-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+                f"{value}\r\n").encode("utf-8")
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length
+        out = []
+        while size > 0 and self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, tuple):
+                data = part[0].read(min(size, self._file_remaining)) if self._file_remaining else b""
+                self._file_remaining -= len(data)
+            else:
+                data = part.read(size)
+            if not data:
+                self._index += 1
+                continue
+            out.append(data)
+            size -= len(data)
+        if self._index >= len(self._parts) and self.sent_at is None:
+            self.sent_at = time.perf_counter()
+        return b"".join(out)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def rewind(self):
+        """
+        Reset to the beginning so the same body can be sent again on retry.
+        """
+        self._parts[0].seek(0)
+        self._parts[2].seek(0)
+        self._file.seek(self._file_start)
+        self._file_remaining = self._parts[1][1]
+        self._index = 0
+        self.sent_at = None
+
+    def close(self):
+        if self._owns_file:
+            self._file.close()
+
+class WhisperClient:
+    """
+    Client for one whisper-server endpoint with pooled keep-alive
+    connections, streaming uploads, timeouts and retries on transient
+    failures (connection errors and 502/503/504 answers).
+    """
+    def __init__(self, host="127.0.0.1", port=8080, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=3, backoff=0.5, pool_size=8):
+        self.base_url = f"http://{host}:{port}"
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+
+    def inference(self, audio, fields=None, filename=None, content_type="application/octet-stream"):
+        """
+        POST audio to /inference and return the decoded JSON.
+        `audio` is a path, bytes, or a seekable binary file object;
+        `fields` holds the other form fields (language, response_format, ...).
+        The time to send the body is recorded as the "upload" stage and the
+        wait for the answer as "inference", or "convert_inference" when the
+        server has to convert a non-WAV file with ffmpeg first.
+        """
+        if filename is None:
+            filename = os.path.basename(audio) if isinstance(audio, (str, os.PathLike)) else "audio.wav"
+        body = MultipartStream(fields or {}, "file", filename, audio, content_type)
+        server_stage = "inference" if content_type == "audio/wav" else "convert_inference"
+        started = time.perf_counter()
+        try:
+            response = self._post("/inference", body)
+        except Exception:
+            metrics.REQUESTS.inc(outcome="error")
+            metrics.ERRORS.inc(stage=server_stage)
+            raise
+        finally:
+            body.close()
+        answered = time.perf_counter()
+        sent = body.sent_at or answered
+        metrics.UPLOAD_BYTES.inc(len(body))
+        metrics.observe("upload", sent - started, endpoint=self.base_url, bytes=len(body))
+        metrics.observe(server_stage, answered - sent, endpoint=self.base_url, status=response.status_code)
+        if response.status_code == 200:
+            metrics.REQUESTS.inc(outcome="ok")
+            return response.json()
+        metrics.REQUESTS.inc(outcome="error")
+        metrics.ERRORS.inc(stage=server_stage)
+        raise RuntimeError(f"Server error: {response.status_code}, {response.text}")
+
+    def _post(self, path, body):
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.base_url + path, data=body, timeout=self.timeout,
+                                             headers={"Content-Type": body.content_type})
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+                # Read timeouts are not retried: the server may still be busy with the request
+                if attempt >= self.retries:
+                    raise
+            attempt += 1
+            metrics.RETRIES.inc()
+            time.sleep(self.backoff * 2 ** (attempt - 1))
+            body.rewind()
+
+    def get(self, path, timeout=None):
+        return self.session.get(self.base_url + path, timeout=timeout or self.timeout)
+
+    def close(self):
+        self.session.close()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(host="127.0.0.1", port=8080):
+    """
+    Shared WhisperClient per endpoint, so repeated calls reuse connections.
+    """
+    with _clients_lock:
+        client = _clients.get((host, port))
+        if client is None:
+            client = _clients[(host, port)] = WhisperClient(host, port)
+        return client
@@ -0,0 +1,236 @@
+import os
+import sys
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from autotune import physical_cores
+from audio_io import SAMPLE_RATE, WINDOW_SECONDS, audio_duration, audio_windows, load_audio, pcm_wav_payload, wav_bytes
+from diarization import assign_speakers, diarize as diarize_speakers
+from vad import remove_silence
+from whisper_client import get_client
+
+DEFAULT_MODEL = "ggml-large-v3-turbo-q8_0.bin"
+DEFAULT_THREADS = physical_cores()
+DEFAULT_LANGUAGE = "bg"
+# Longer recordings are sent window by window (see transcribe_windowed)
+WINDOWED_MIN_SECONDS = 1800
+PROMPT_WORDS = 32
+
+def get_base_path():
+    """
+    Return the folder holding the bundled Release/ and ffmpeg/ directories,
+    for both the source tree and the PyInstaller build.
+    """
+    if getattr(sys, 'frozen', False):
+        base_path = os.path.dirname(sys.executable)
+    else:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+
+    internal_path = os.path.join(base_path, "_internal")
+    if os.path.exists(internal_path):
+        base_path = internal_path
+    return base_path
+
+def add_ffmpeg_to_path(base_path):
+    """
+    Make the bundled ffmpeg visible to the server's --convert option.
+    """
+    ffmpeg_path = os.path.join(base_path, "ffmpeg", "bin")
+    if ffmpeg_path not in os.environ["PATH"].split(os.pathsep):
+        os.environ["PATH"] += os.pathsep + ffmpeg_path
+
+def start_whisper_server(device="cpu", port=8080, threads=DEFAULT_THREADS, convert=True,
+                         language=DEFAULT_LANGUAGE, model=DEFAULT_MODEL):
+    """
+    Start the Whisper server in a separate process (CPU or GPU).
+    With convert=False the server only accepts 16 kHz mono WAV, which is
+    what transcribe_audio() sends after decoding on the client.
+    `language` is only the server's default; every request names its own.
+    Returns the process object.
+    """
+    base_path = get_base_path()
+    if convert:
+        add_ffmpeg_to_path(base_path)
+
+    if device == "gpu":
+        exe_name = "whisper-server-gpu.exe"
+        build_folder = "build_gpu"
+        extra_args = ["--ov-e-device", "CUDA"]
+    else:
+        exe_name = "whisper-server-cpu.exe"
+        build_folder = "build_cpu"
+        extra_args = []
+
+    server_exe = os.path.join(base_path, "Release", build_folder, exe_name)
+    model_path = os.path.join(base_path, "Release", build_folder, "models", model)
+
+    cmd = [
+        server_exe,
+        "--host", "127.0.0.1",
+        "--port", str(port),
+        "-m", model_path,
+        "-t", str(threads),
+        "-l", language
+    ]
+
+    if convert:
+        cmd.append("--convert")
+    cmd.extend(extra_args)
+
+    creation_flags = 0
+    if sys.platform.startswith("win"):
+        creation_flags = subprocess.CREATE_NO_WINDOW
+
+    return subprocess.Popen(cmd, creationflags=creation_flags)
+
+def cache_params(vad=False, diarize=False):
+    """
+    Transcript cache parameters for the processing options that change a result.
+    """
+    params = {}
+    if vad:
+        params["vad"] = True
+    if diarize:
+        params["diarize"] = True
+    return params or None
+
+def transcribe_audio(audio_path, model_path=DEFAULT_MODEL, host="127.0.0.1", port=8080,
+                     language=DEFAULT_LANGUAGE, cache=None, decode=True, vad=False, diarize=False):
+    """
+    Send an audio file to the Whisper server for transcription.
+    The file is decoded to 16 kHz mono PCM here unless decode=False, in
+    which case the server must have been started with convert=True.
+    The result carries the server's timestamped segments (verbose_json).
+    With vad=True only the detected speech is sent, and segment
+    timestamps are mapped back to the original file.
+    With diarize=True each segment gets a "speaker" label (see diarization.py).
+    Recordings longer than WINDOWED_MIN_SECONDS are sent in windows so
+    neither side ever holds the whole decoded file (transcribe_windowed).
+    With a transcript_cache.TranscriptCache, a previously transcribed copy
+    of the same audio is answered from disk without contacting the server.
+    whisper-server always answers with the model it was started with, so
+    model_path must name that model: it keys the cache and is echoed in
+    the result.
+    """
+    def run():
+        if vad or diarize:
+            return transcribe_decoded(audio_path, model_path=model_path, host=host, port=port,
+                                      language=language, vad=vad, diarize=diarize)
+        if decode and audio_duration(audio_path) > WINDOWED_MIN_SECONDS:
+            return transcribe_windowed(audio_path, model_path=model_path, host=host, port=port, language=language)
+        audio = pcm_wav_payload(audio_path) if decode else audio_path
+        result = post_inference(audio, model_path=model_path, host=host, port=port, language=language,
+                                fields={"response_format": "verbose_json"})
+        result["model"] = model_path
+        return result
+
+    if cache is None:
+        return run()
+    return cache.cached(audio_path, model_path, language, run, params=cache_params(vad, diarize))
+
+def transcribe_windowed(audio_path, model_path=DEFAULT_MODEL, host="127.0.0.1", port=8080, language=DEFAULT_LANGUAGE,
+                        window_seconds=WINDOW_SECONDS, prompt_words=PROMPT_WORDS, on_segments=None):
+    """
+    Transcribe a recording of any length in constant memory. The file is
+    read in windows cut in pauses (audio_io.audio_windows) and each window
+    is a request of its own, prompted with the last words of the previous
+    window so sentences and spelling carry across the cut. The next window
+    is decoded while the current one is on the server. `on_segments(list)`
+    receives each window's segments as soon as the window is done.
+    """
+    texts, segments = [], []
+    prompt = ""
+    windows = audio_windows(audio_path, window_seconds)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        upcoming = executor.submit(next, windows, None)
+        try:
+            while True:
+                window = upcoming.result()
+                if window is None:
+                    break
+                upcoming = executor.submit(next, windows, None)
+                start, samples = window
+                fields = {"response_format": "verbose_json"}
+                if prompt:
+                    fields["prompt"] = prompt
+                result = post_inference(("window.wav", wav_bytes(samples), "audio/wav"), model_path=model_path,
+                                        host=host, port=port, language=language, fields=fields)
+                offset = start / SAMPLE_RATE
+                window_segments = [dict(s, start=s.get("start", 0.0) + offset, end=s.get("end", 0.0) + offset)
+                                   for s in result.get("segments", [])]
+                segments.extend(window_segments)
+                if on_segments is not None:
+                    on_segments(window_segments)
+                text = result.get("text", "").strip()
+                texts.append(text)
+                if text:
+                    prompt = " ".join(text.split()[-prompt_words:])
+        finally:
+            # The generator may only be closed once the prefetch is done with it
+            upcoming.cancel()
+            if not upcoming.cancelled():
+                upcoming.exception()
+            windows.close()
+    return {"text": " ".join(t for t in texts if t), "segments": segments, "windows": len(texts),
+            "model": model_path}
+
+def transcribe_speech_only(audio_path, model_path=DEFAULT_MODEL, host="127.0.0.1", port=8080, language=DEFAULT_LANGUAGE):
+    """
+    Drop silence and non-speech with the VAD pre-pass, transcribe what is
+    left and report segment times against the original recording.
+    """
+    return transcribe_decoded(audio_path, model_path=model_path, host=host, port=port, language=language, vad=True)
+
+def transcribe_decoded(audio_path, model_path=DEFAULT_MODEL, host="127.0.0.1", port=8080, language=DEFAULT_LANGUAGE,
+                       vad=False, diarize=False):
+    """
+    Decode the file once and use the same PCM for everything: the optional
+    VAD pre-pass, the server request and, with diarize=True, speaker
+    diarization, which runs on the CPU while the server transcribes.
+    """
+    samples = load_audio(audio_path)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        turns = executor.submit(diarize_speakers, samples) if diarize else None
+        speech, time_map = remove_silence(samples) if vad else (samples, None)
+        if len(speech) == 0:
+            result = {"text": "", "segments": []}
+        else:
+            payload = ("speech.wav" if vad else "audio.wav", wav_bytes(speech), "audio/wav")
+            result = post_inference(payload, model_path=model_path, host=host, port=port, language=language,
+                                    fields={"response_format": "verbose_json"})
+        turns = turns.result() if turns is not None else None
+        with metrics.stage("postprocess"):
+            if time_map is not None:
+                time_map.remap_segments(result.get("segments", []))
+                result["audio_seconds"] = len(samples) / SAMPLE_RATE
+                result["speech_seconds"] = len(speech) / SAMPLE_RATE
+            if turns is not None:
+                assign_speakers(result.get("segments", []), turns)
+    result["model"] = model_path
+    return result
+
+def post_inference(audio, model_path=DEFAULT_MODEL, host="127.0.0.1", port=8080, language=DEFAULT_LANGUAGE, fields=None):
+    """
+    POST an audio payload (a path, bytes, a binary file object or a
+    (filename, data, mime) tuple) to the server's /inference endpoint over
+    the shared keep-alive client and return the decoded JSON.
+    `fields` adds further form fields such as response_format.
+    """
+    filename, content_type = None, "application/octet-stream"
+    if isinstance(audio, tuple):
+        filename, audio, content_type = audio
+    fields = {
+        "model": model_path,
+        "language": language,
+        **(fields or {})
+    }
+    result = get_client(host, port).inference(audio, fields, filename=filename, content_type=content_type)
+    seconds = result.get("duration")
+    if seconds is None and content_type == "audio/wav":
+        # 16-bit mono PCM after the 44-byte header
+        size = len(audio) if isinstance(audio, (bytes, bytearray)) else os.path.getsize(audio)
+        seconds = max(0, size - 44) / (2 * SAMPLE_RATE)
+    if seconds:
+        metrics.AUDIO_SECONDS.inc(seconds)
+    return result